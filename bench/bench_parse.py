@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# Parse throughput of object lists: the output of kubectl get -o json, turned into table rows.
+# Compares the streaming JsonListStream with decoding the whole list by json.loads first.
+#
+#   ./bench/bench_parse.py --objects 100 1000 10000 100000 --output bench/results/parse.json
+#
+import argparse
+import json
+import subprocess
+import sys
+
+from bench_util import FAKE_KUBECTL, REPO_DIR, add_output_arg, fake_kubectl_env, measure, report, write_results
+
+sys.path.insert(0, REPO_DIR)
+import s9k  # pylint: disable=wrong-import-position
+
+
+def run_json_loads(data):
+    object_list = json.loads(data)
+    return s9k.make_object_table("pods", object_list["items"], True)
+
+
+def run_json_list_stream(data):
+    columns = s9k.get_list_columns("pods", True)
+    object_list = s9k.JsonListStream(columns.make_line)
+    object_list.feed_all(data)
+    return columns.titles, object_list.items
+
+
+def main():
+    parse = argparse.ArgumentParser(description="benchmark of parsing object lists")
+    parse.add_argument('--objects', type=int, nargs='+', default=[100, 1000, 10000, 100000], dest='objects',
+                       help='number of objects in the list')
+    parse.add_argument('--repeat', type=int, default=3, dest='repeat', help='runs per measurement, the best one counts')
+    add_output_arg(parse)
+    cmd = parse.parse_args()
+
+    results = []
+    for objects in cmd.objects:
+        data = subprocess.run([sys.executable, FAKE_KUBECTL, "get", "pods", "-A", "-o", "json"], env=fake_kubectl_env(objects),
+                              capture_output=True, check=True).stdout
+        for name, func in (("json_loads", run_json_loads), ("json_list_stream", run_json_list_stream)):
+            result = measure(lambda: func(data), cmd.repeat)
+            result.update({"benchmark": "parse_list", "implementation": name, "objects": objects, "bytes": len(data),
+                           "objects_per_second": objects / result["seconds"],
+                           "megabytes_per_second": len(data) / result["seconds"] / 1e6})
+            report(results, result)
+    write_results("parse", results, cmd.output)
+
+
+if __name__ == '__main__':
+    main()
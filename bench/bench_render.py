@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Compares the chunked HtmlTable renderer with the previous string concatenating implementation.
+#
+#   ./bench/bench_render.py --rows 20000
+#
+import argparse
+import os
+import sys
+
+from bench_util import REPO_DIR, add_output_arg, measure, report, write_results
+
+sys.path.insert(0, REPO_DIR)
+import s9k  # pylint: disable=wrong-import-position
+
+
+class LegacyHtmlTable:
+    # HtmlTable.make_html before the table was rendered in chunks.
+    def __init__(self, titles, parsed_lines):
+        self.titles = titles
+        self.parsed_lines = parsed_lines
+
+    def make_html(self, column_subset, link_cb):
+        ret = s9k.get_style_sheet()
+        ret += s9k.HtmlTable.make_sort_jscript()
+        ret += '<table class="js-sort-table"><thead><tr>'
+        for pos in range(len(self.titles)):
+            if column_subset is None or pos in column_subset:
+                ret += '<th align="left">{}</th>'.format(self.titles[pos])
+        ret += '</tr></thead>'
+        for line in self.parsed_lines:
+            ret += '<tr>'
+            for pos in range(len(self.titles)):
+                if column_subset is None or pos in column_subset:
+                    ret += '<td>{}</td>'.format(link_cb(line, pos))
+            ret += '</tr>\n'
+        ret += '</table>'
+        return ret
+
+
+def make_pod_table(rows):
+    titles = ["NAMESPACE", "NAME", "READY", "STATUS", "RESTARTS", "AGE", "IP", "NODE",
+              "NOMINATED NODE", "READINESS GATES", "LABELS"]
+    lines = []
+    for pos in range(rows):
+        lines.append([f"ns-{pos % 50}", f"app-5d9c8-{pos:06d}", "2/2", "Running", "0", "12d", f"10.1.{pos // 250}.{pos % 250}",
+                      f"node-{pos % 30}", "<none>", "<none>", f"app=app-{pos % 50},pod-template-hash=5d9c8"])
+    return titles, lines
+
+
+def legacy_link(line, title_pos):
+    return s9k.make_objectinfo_link("get-yaml", "pods", line[1], line[0], "true", s9k.NO_NAMESPACE, line[title_pos])
+
+
+def new_link(line):
+    return s9k.make_objectinfo_url("get-yaml", "pods", line[1], line[0], "true", s9k.NO_NAMESPACE)
+
+
+def run_legacy(titles, lines):
+    return [LegacyHtmlTable(titles, lines).make_html(None, legacy_link)]
+
+
+def run_chunked(titles, lines):
+    # the chunks are sent and dropped one by one, only keep their sizes.
+    return [len(chunk) for chunk in s9k.HtmlTable(titles, lines).render(None, new_link, False, None)]
+
+
+def main():
+    parse = argparse.ArgumentParser(description="benchmark of the html table rendering")
+    parse.add_argument('--rows', type=int, nargs='+', default=[1000, 20000], dest='rows', help='number of table rows')
+    parse.add_argument('--repeat', type=int, default=3, dest='repeat', help='runs per measurement, the best one counts')
+    add_output_arg(parse)
+    cmd = parse.parse_args()
+
+    # the renderer refers to the static files by their content hash.
+    s9k.static_files.load(os.path.join(REPO_DIR, "static-file"))
+
+    results = []
+    for rows in cmd.rows:
+        titles, lines = make_pod_table(rows)
+        for name, func in (("legacy", run_legacy), ("chunked", run_chunked)):
+            result = measure(lambda: func(titles, lines), cmd.repeat)
+            result.update({"benchmark": "render_table", "implementation": name, "rows": rows})
+            report(results, result)
+    write_results("render", results, cmd.output)
+
+
+if __name__ == '__main__':
+    main()
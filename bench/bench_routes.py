@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# End to end latency and memory of the s9k pages: starts s9k with the fake kubectl for each cluster size,
+# requests every route a few times and reads the resident set size of the server after each route.
+#
+#   ./bench/bench_routes.py --objects 100 10000 --requests 10 --output bench/results/routes.json
+#   ./bench/bench_routes.py --s9k-args="--watch-cache"
+#
+import argparse
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from bench_util import add_output_arg, fake_kubectl_env, free_port, report, start_s9k, write_results
+
+POD_NAME = "app-5d9c8-000001"
+POD_NAMESPACE = "ns-1"
+
+ROUTES = [
+    # name, path, post data
+    ("api_resources", "/", None),
+    ("list_pods", "/objectinstances/pods/true/-None", None),
+    ("list_pods_unpaged", "/objectinstances/pods/true/-None?limit=0", None),
+    ("list_pods_namespace", f"/objectinstances/pods/true/{POD_NAMESPACE}", None),
+    ("list_pods_label_selector", "/objectinstances/pods/true/-None?labelsel=app%3Dapp", None),
+    ("list_namespaces", "/objectinstances/namespaces/false/-None", None),
+    ("describe_pod", f"/objectinfo/describe/pods/{POD_NAME}/{POD_NAMESPACE}/true/-None", None),
+    ("get_yaml_pod", f"/objectinfo/get-yaml/pods/{POD_NAME}/{POD_NAMESPACE}/true/-None", None),
+    ("get_json_pod", f"/objectinfo/get-json/pods/{POD_NAME}/{POD_NAMESPACE}/true/-None", None),
+    ("logs_pod", f"/objectinfo/logs/pods/{POD_NAME}/{POD_NAMESPACE}/true/-None", None),
+    ("shell_attach_page", f"/shell-attach/true/{POD_NAME}/{POD_NAMESPACE}/main/-None", None),
+    ("static_file", "/static-file/css.css", None),
+    ("apply_object", "/editobj/apply",
+     {"edit": f"apiVersion: v1\nkind: Pod\nmetadata:\n  name: {POD_NAME}\n  namespace: {POD_NAMESPACE}\n"}),
+]
+
+
+def read_memory(pid):
+    # resident set size and its peak, in bytes
+    memory = {}
+    with open(f"/proc/{pid}/status") as file:
+        for line in file:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key, value = line.split(":")
+                memory[key] = int(value.split()[0]) * 1024
+    return memory.get("VmRSS", 0), memory.get("VmHWM", 0)
+
+
+def request(url, data):
+    if data is not None:
+        data = urllib.parse.urlencode(data).encode("utf-8")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, data, timeout=300) as response:
+            size = len(response.read())
+            status = response.status
+    except urllib.error.HTTPError as error:
+        size = len(error.read())
+        status = error.code
+    return time.perf_counter() - start, status, size
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parse = argparse.ArgumentParser(description="end to end benchmark of the s9k pages, with the fake kubectl")
+    parse.add_argument('--objects', type=int, nargs='+', default=[100, 10000], dest='objects',
+                       help='number of pods in the fake cluster')
+    parse.add_argument('--requests', type=int, default=10, dest='requests', help='requests per route')
+    parse.add_argument('--routes', type=str, nargs='+', default=[], dest='routes',
+                       help='names of the routes to measure (default: all)')
+    parse.add_argument('--s9k-args', type=str, default='', dest='s9k_args', help='more command line options of s9k')
+    add_output_arg(parse)
+    cmd = parse.parse_args()
+
+    results = []
+    for objects in cmd.objects:
+        port = free_port()
+        process, startup_seconds = start_s9k(port, fake_kubectl_env(objects), cmd.s9k_args)
+        try:
+            rss, peak_rss = read_memory(process.pid)
+            report(results, {"benchmark": "startup", "objects": objects, "seconds": startup_seconds,
+                             "rss_bytes": rss, "peak_rss_bytes": peak_rss})
+
+            for name, path, data in ROUTES:
+                if cmd.routes and name not in cmd.routes:
+                    continue
+                url = f"http://127.0.0.1:{port}{path}"
+                first_seconds, status, size = request(url, data)
+                latencies = [request(url, data)[0] for _ in range(cmd.requests)]
+                rss, peak_rss = read_memory(process.pid)
+                report(results, {"benchmark": "route", "route": name, "objects": objects, "status": status,
+                                 "response_bytes": size, "first_seconds": first_seconds,
+                                 "p50_seconds": percentile(latencies, 0.5), "p95_seconds": percentile(latencies, 0.95),
+                                 "max_seconds": max(latencies), "rss_bytes": rss, "peak_rss_bytes": peak_rss})
+        finally:
+            process.kill()
+            process.wait()
+    write_results("routes", results, cmd.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# Throughput and keystroke latency of the terminal relay (/wssh): starts s9k with the fake kubeexec, prints
+# a large output in the attached "shell" and types single characters. Also the time to attach a terminal
+# and the memory of the kubeexec processes per open session. Needs websocket-client.
+#
+#   ./bench/bench_terminal.py --megabytes 1 16 --output bench/results/terminal.json
+#
+# Attaching with a kubeexec process for each session, as before the kubeexec daemon:
+#
+#   ./bench/bench_terminal.py --s9k-args="--exec-per-session"
+#
+# To measure a version before the binary relay, check it out somewhere and use the json protocol:
+#
+#   git worktree add /tmp/s9k-old <revision>
+#   ./bench/bench_terminal.py --s9k-dir /tmp/s9k-old --protocol json
+#
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import websocket
+
+from bench_util import FAKE_KUBEEXEC, REPO_DIR, add_output_arg, fake_kubectl_env, free_port, report, start_s9k, \
+    write_results
+
+PROMPT = b"$ "
+CONNECT = {"pod_name": "app-5d9c8-000001", "pod_namespace": "ns-1", "container_name": "main"}
+ACK_BYTES = 65536
+
+
+class TerminalClient:
+    # the part of wspty.js that talks to the server, for both protocols.
+    def __init__(self, url, protocol, timeout):
+        self.protocol = protocol
+        self.connection = websocket.create_connection(url, timeout=timeout)
+        self.connection.send(json.dumps(CONNECT))
+        if protocol == "json":
+            # the json relay doesn't see a message that arrived in the same read as the one before.
+            time.sleep(0.2)
+        self.send_control({"cols": 80, "rows": 24})
+        self.unacknowledged = 0
+
+    def send_control(self, control):
+        self.connection.send(json.dumps(control))
+
+    def send(self, data):
+        if self.protocol == "json":
+            self.connection.send(json.dumps({"data": data.decode("utf-8")}))
+        else:
+            self.connection.send_binary(data)
+
+    def receive(self):
+        opcode, data = self.connection.recv_data()
+        if opcode == websocket.ABNF.OPCODE_TEXT:
+            message = json.loads(data)
+            if "error" in message:
+                raise RuntimeError(message["error"])
+            return message.get("data", "").encode("utf-8")
+        self.unacknowledged += len(data)
+        if self.unacknowledged >= ACK_BYTES:
+            self.send_control({"ack": self.unacknowledged})
+            self.unacknowledged = 0
+        return data
+
+    def read_until(self, size, suffix):
+        # reads at least size bytes, until the output ends with suffix.
+        output = b""
+        total = 0
+        while total < size or not output.endswith(suffix):
+            data = self.receive()
+            total += len(data)
+            output = (output + data)[-len(suffix) - 64:]
+        return total
+
+    def close(self):
+        self.connection.close()
+
+
+def measure_output(client, size):
+    # the relay before the binary one could stall with output left in its buffer, until the next keystroke.
+    start = time.perf_counter()
+    client.send("cat {}\r".format(size).encode("utf-8"))
+    try:
+        received = client.read_until(size, PROMPT)
+    except websocket.WebSocketTimeoutException:
+        return None, 0
+    seconds = time.perf_counter() - start
+    return seconds, received
+
+
+def measure_keystrokes(client, count):
+    latencies = []
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            client.send(b"x")
+            client.read_until(1, b"x")
+            latencies.append(time.perf_counter() - start)
+        # clear the line of x-es
+        client.send(b"\r")
+        client.read_until(1, PROMPT)
+    except websocket.WebSocketTimeoutException:
+        return None, None
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+
+def measure_attach(url, count, timeout):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        client = TerminalClient(url, "binary", timeout)
+        client.read_until(1, PROMPT)
+        latencies.append(time.perf_counter() - start)
+        client.close()
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+
+def child_processes(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as file:
+            for child in file.read().split():
+                children.append(int(child))
+                children.extend(child_processes(int(child)))
+    return children
+
+
+def read_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def measure_session_memory(url, pid, count, timeout):
+    # resident memory of all processes below s9k (the kubeexec processes), with count terminals open.
+    clients = []
+    try:
+        for _ in range(count):
+            client = TerminalClient(url, "binary", timeout)
+            client.read_until(1, PROMPT)
+            clients.append(client)
+        return sum(read_rss(child) for child in child_processes(pid))
+    finally:
+        for client in clients:
+            client.close()
+
+
+def make_s9k_dir(s9k_dir, temp_dir):
+    # s9k runs the kubeexec next to s9k.py: link s9k and its static files into a directory with the fake kubeexec.
+    for name in ("s9k.py", "static-file"):
+        os.symlink(os.path.join(os.path.abspath(s9k_dir), name), os.path.join(temp_dir, name))
+    os.symlink(FAKE_KUBEEXEC, os.path.join(temp_dir, "kubeexec"))
+    return temp_dir
+
+
+def main():
+    parse = argparse.ArgumentParser(description="benchmark of the terminal relay, with the fake kubeexec")
+    parse.add_argument('--megabytes', type=float, nargs='+', default=[1, 16], dest='megabytes',
+                       help='size of the output that is printed in the terminal')
+    parse.add_argument('--keystrokes', type=int, default=100, dest='keystrokes', help='characters typed')
+    parse.add_argument('--attaches', type=int, default=20, dest='attaches',
+                       help='terminals attached one after the other, to measure the time of attaching (binary protocol)')
+    parse.add_argument('--sessions', type=int, default=10, dest='sessions',
+                       help='terminals open at the same time, to measure the memory of kubeexec (binary protocol)')
+    parse.add_argument('--protocol', type=str, default='binary', choices=['binary', 'json'], dest='protocol',
+                       help='protocol of the relay: binary frames, or json lines (before the binary relay)')
+    parse.add_argument('--s9k-dir', type=str, default=REPO_DIR, dest='s9k_dir', help='directory with the s9k to measure')
+    parse.add_argument('--timeout', type=float, default=30, dest='timeout',
+                       help='seconds without output after which the relay counts as stalled')
+    parse.add_argument('--s9k-args', type=str, default='', dest='s9k_args', help='more command line options of s9k')
+    add_output_arg(parse)
+    cmd = parse.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        port = free_port()
+        # the log is written to the temporary directory, older versions don't have --log-file.
+        process, _ = start_s9k(port, fake_kubectl_env(100), cmd.s9k_args, make_s9k_dir(cmd.s9k_dir, temp_dir), None)
+        url = f"ws://127.0.0.1:{port}/wssh"
+        try:
+            if cmd.protocol == "binary" and cmd.attaches > 0:
+                p50, p95 = measure_attach(url, cmd.attaches, cmd.timeout)
+                report(results, {"benchmark": "terminal_attach", "s9k_args": cmd.s9k_args, "attaches": cmd.attaches,
+                                 "p50_seconds": p50, "p95_seconds": p95})
+            if cmd.protocol == "binary" and cmd.sessions > 0:
+                rss = measure_session_memory(url, process.pid, cmd.sessions, cmd.timeout)
+                report(results, {"benchmark": "terminal_sessions", "s9k_args": cmd.s9k_args,
+                                 "sessions": cmd.sessions, "kubeexec_rss_bytes": rss,
+                                 "rss_bytes_per_session": rss / cmd.sessions})
+
+            client = TerminalClient(url, cmd.protocol, cmd.timeout)
+            client.read_until(1, PROMPT)
+
+            for megabytes in cmd.megabytes:
+                size = int(megabytes * 1024 * 1024)
+                seconds, received = measure_output(client, size)
+                if seconds is None:
+                    report(results, {"benchmark": "terminal_output", "protocol": cmd.protocol, "bytes": size,
+                                     "stalled": True})
+                    break
+                report(results, {"benchmark": "terminal_output", "protocol": cmd.protocol, "bytes": size,
+                                 "received_bytes": received, "seconds": seconds,
+                                 "megabytes_per_second": size / seconds / 1e6})
+            else:
+                p50, p95 = measure_keystrokes(client, cmd.keystrokes)
+                report(results, {"benchmark": "terminal_keystroke", "protocol": cmd.protocol,
+                                 "keystrokes": cmd.keystrokes, "p50_seconds": p50, "p95_seconds": p95,
+                                 "stalled": p50 is None})
+            client.close()
+        finally:
+            process.kill()
+            process.wait()
+    write_results("terminal", results, cmd.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# Helpers shared by the benchmarks: measurements and the result files.
+#
+# Every benchmark prints one json object per measurement. With --output the results are also written
+# to a json file together with the git revision, so that the numbers of two versions can be compared:
+#
+#   ./bench/bench_routes.py --output bench/results/routes-$(git rev-parse --short HEAD).json
+#
+import datetime
+import json
+import os
+import platform
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+FAKE_KUBECTL = os.path.join(REPO_DIR, "fake", "fake_kubectl.py")
+FAKE_KUBEEXEC = os.path.join(REPO_DIR, "fake", "fake_kubeexec.py")
+# the log of the s9k under test, outside of the source tree
+S9K_LOG = os.path.join(tempfile.gettempdir(), "s9k-bench.log")
+
+
+def add_output_arg(parse):
+    parse.add_argument('--output', '-o', type=str, default='', dest='output',
+                       help='write the results as json to this file')
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def report(results, result):
+    results.append(result)
+    print(json.dumps(result), flush=True)
+
+
+def write_results(benchmark, results, output):
+    if output == "":
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    document = {
+        "benchmark": benchmark,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "results": results,
+    }
+    with open(output, "w") as file:
+        json.dump(document, file, indent=2)
+
+
+def measure(func, repeat):
+    # the best time of a few runs, and the peak of memory allocated by python during one run.
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def fake_kubectl_env(pods, log_lines=1000):
+    env = dict(os.environ)
+    env["FAKE_KUBECTL_PODS"] = str(pods)
+    env["FAKE_KUBECTL_LOG_LINES"] = str(log_lines)
+    return env
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_s9k(port, env, s9k_args, s9k_dir=REPO_DIR, log_file=S9K_LOG):
+    # starts s9k with the fake kubectl, returns the process once it accepts connections and the time that took.
+    # Without log_file s9k writes s9k.log in s9k_dir (versions before --log-file).
+    cmd = [sys.executable, os.path.join(s9k_dir, "s9k.py"), "--command", FAKE_KUBECTL, "--port", str(port)] + \
+        shlex.split(s9k_args)
+    if log_file is not None:
+        cmd += ["--log-file", log_file]
+    process = subprocess.Popen(cmd, cwd=s9k_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    start = time.perf_counter()
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return process, time.perf_counter() - start
+        except OSError:
+            if process.poll() is not None or time.perf_counter() - start > 120:
+                process.kill()
+                raise RuntimeError("s9k did not start: {}".format(" ".join(cmd)))
+            time.sleep(0.05)
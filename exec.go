@@ -9,12 +9,17 @@ import (
 	"context"
 	"fmt"
 	"flag"
+	"sync"
 	"path/filepath"
 	"encoding/json"
+	"encoding/binary"
+	"net"
 	"net/http"
+	"time"
 	"k8s.io/client-go/rest"
 	"k8s.io/client-go/tools/remotecommand"
 	"k8s.io/client-go/tools/clientcmd"
+	"k8s.io/client-go/transport/spdy"
 	"k8s.io/client-go/kubernetes"
 	"k8s.io/apimachinery/pkg/runtime/schema"
 
@@ -32,6 +37,8 @@ type TermConnectPayload struct {
 	Namespace     string `json:"pod_namespace"`
 	PodName       string `json:"pod_name"`
 	ContainerName string `json:"container_name"`
+	// the kubeconfig context of the pod, empty for the context of the -context flag
+	Context       string `json:"context"`
 }
 
 type TermSizePayload struct {
@@ -39,9 +46,12 @@ type TermSizePayload struct {
 	Rows    int `json:"rows"`
 }
 
-type DataPayload struct {
-	Data string `json:"data"`
-}
+// after the connect command, stdin carries frames: one byte frame type, the length of the payload
+// (four bytes, big endian) and the payload.
+const (
+	FrameData   = 'd' // input for the terminal
+	FrameResize = 'r' // columns and rows of the terminal, two bytes each (big endian)
+)
 
 
 func HomeDir() string {
@@ -63,14 +73,9 @@ func DefaultConfigFile() (string, bool) {
 	return "", false
 }
 
-func NewExecRequest(config *rest.Config, p TermConnectPayload) *rest.Request {
-
-	rest, err := rest.RESTClientFor(config)
-	if err != nil {
-		log.Fatal("can't get rest client: ", err)
-	}
+func NewExecRequest(restClient *rest.RESTClient, p TermConnectPayload) *rest.Request {
 
-	req := rest.
+	req := restClient.
 		Post().
 		Namespace(p.Namespace).
 		Resource("pods").
@@ -111,92 +116,74 @@ func readConnectCmd(reader *bufio.Reader) (*TermConnectPayload, error) {
 type  StdinReader struct {
 	reader *bufio.Reader
 	resizeChannel chan TermSizePayload
-	resizePayload *TermSizePayload
-	dataPayload *DataPayload
 	bufferToSend []byte
-	bufferToSendPos int
+	closeOnce sync.Once
 }
 
 func NewStdinReader(reader *bufio.Reader) (*StdinReader) {
 	return &StdinReader{reader: reader, //bufio.NewReader(os.Stdin),
-						resizeChannel: make(chan TermSizePayload),
-						resizePayload: &TermSizePayload{},
-						dataPayload: &DataPayload{},
-						bufferToSend: nil,
-						bufferToSendPos: -1}
+						resizeChannel: make(chan TermSizePayload, 1),
+						bufferToSend: nil}
 }
 
 func (r *StdinReader) Read(rdata []byte) (int, error) {
 
-	if r.bufferToSend == nil {
-		if err := r.readMore(); err != nil {
+	for len(r.bufferToSend) == 0 {
+		if err := r.readFrame(); err != nil {
+			// no more resize messages: ends the goroutine of the stream that waits for them.
+			r.closeOnce.Do(func() { close(r.resizeChannel) })
 			return  0, err
 		}
 	}
 
-	remainingLen := len(r.bufferToSend) - r.bufferToSendPos
-	if remainingLen  <= len(rdata) {
-		ncopied := copy(rdata, r.bufferToSend[r.bufferToSendPos:])
-		r.bufferToSend = nil
-
-		if DebugOn {
-			log.Printf("copied %d", ncopied)
-		}
-		return ncopied, nil
-	}
-
-	toCopy := len(rdata)
-	copy(rdata, r.bufferToSend[r.bufferToSendPos: r.bufferToSendPos+toCopy])
-	r.bufferToSendPos+=toCopy
+	ncopied := copy(rdata, r.bufferToSend)
+	r.bufferToSend = r.bufferToSend[ncopied:]
 
 	if DebugOn {
-		log.Printf("copied (short-buffer) %d", toCopy)
+		log.Printf("copied %d", ncopied)
 	}
-	return  toCopy, io.ErrShortBuffer
+	return ncopied, nil
 }
 
-func (r *StdinReader) readMore() error {
-	for {
-		jsonString, err := r.reader.ReadString('\n')
-		if err != nil {
-			return err
-		}
+func (r *StdinReader) readFrame() error {
+	var header [5]byte
+	if _, err := io.ReadFull(r.reader, header[:]); err != nil {
+		return err
+	}
 
+	payload := make([]byte, binary.BigEndian.Uint32(header[1:]))
+	if _, err := io.ReadFull(r.reader, payload); err != nil {
+		return err
+	}
+
+	switch header[0] {
+	case FrameData:
+		r.bufferToSend = payload
 		if DebugOn {
-			log.Print("json: ", jsonString)
+			log.Printf("data message: %v", r.bufferToSend)
 		}
-
-		// the beauty of golang json parsing ....
-		r.resizePayload.Rows = -1
-		r.resizePayload.Columns = -1
-
-		err = json.Unmarshal([]byte(jsonString), &r.resizePayload)
-		if err != nil {
-			return err
+	case FrameResize:
+		if len(payload) != 4 {
+			return fmt.Errorf("bad resize frame, length: %d", len(payload))
 		}
-
-		if r.resizePayload.Rows != -1 && r.resizePayload.Columns != -1 {
-			resizeMsg := *r.resizePayload
-			if DebugOn {
-				log.Printf("send resiz msg to channel cols: %d rows: %d", resizeMsg.Columns, resizeMsg.Rows)
+		resizeMsg := TermSizePayload{Columns: int(binary.BigEndian.Uint16(payload[0:2])), Rows: int(binary.BigEndian.Uint16(payload[2:4]))}
+		if DebugOn {
+			log.Printf("send resiz msg to channel cols: %d rows: %d", resizeMsg.Columns, resizeMsg.Rows)
+		}
+		select {
+		case r.resizeChannel <- resizeMsg:
+		default:
+			// the last size was not taken yet, only the newest one counts.
+			select {
+			case <-r.resizeChannel:
+			default:
 			}
 			r.resizeChannel <- resizeMsg
-			continue
 		}
-
-		err = json.Unmarshal([]byte(jsonString), &r.dataPayload)
-		if err != nil {
-			return err
-		}
-		r.bufferToSend = []byte(r.dataPayload.Data)
-		r.bufferToSendPos = 0
-
-		if DebugOn {
-			log.Printf("data message: %v", r.bufferToSend)
-		}
-
-		return nil
+	default:
+		return fmt.Errorf("unknown frame type: %d", header[0])
 	}
+	return nil
 }
 
 type TerminalSizeQueueImp struct {
@@ -204,7 +191,10 @@ type TerminalSizeQueueImp struct {
 }
 
 func (r *TerminalSizeQueueImp) Next() *remotecommand.TerminalSize {
-	resizeMsg := <-r.resizeChannel
+	resizeMsg, ok := <-r.resizeChannel
+	if !ok {
+		return nil
+	}
 
 	ret := &remotecommand.TerminalSize{Width: uint16(resizeMsg.Columns), Height: uint16(resizeMsg.Rows)}
 
@@ -214,30 +204,41 @@ func (r *TerminalSizeQueueImp) Next() *remotecommand.TerminalSize {
 	return ret
 }
 
+// the terminal output goes to stdout (or to the connection of the session) as it is,
+// s9k sends it to the browser in binary websocket frames.
 type DataWriter struct {
-	dataPayload *DataPayload
+	mutex sync.Mutex
+	out io.Writer
 }
 
-func NewDataWriter() *DataWriter {
-	return &DataWriter{dataPayload: &DataPayload{}}
+func NewDataWriter(out io.Writer) *DataWriter {
+	return &DataWriter{out: out}
 }
 
 func (r *DataWriter) Write(data []byte) (n int, err error) {
 
-	r.dataPayload.Data = string(data)
-	jsonData,_ := json.Marshal(r.dataPayload)
+	r.mutex.Lock()
+	defer r.mutex.Unlock()
 
 	if DebugOn {
-		log.Printf("out-data: %s", string(jsonData))
+		log.Printf("out-data: %d bytes", len(data))
 	}
-	fmt.Printf("%s\n", string(jsonData))
-	return len(data), nil
+	return r.out.Write(data)
 }
 
-func makeConfig(kubeconfig string)  (*rest.Config, error) {
-	restConfig, err := clientcmd.BuildConfigFromFlags("", kubeconfig)
+func makeConfig(kubeconfig string, contextName string)  (*rest.Config, error) {
+	var restConfig *rest.Config
+	var err error
+	if contextName == "" {
+		restConfig, err = clientcmd.BuildConfigFromFlags("", kubeconfig)
+	} else {
+		loadingRules := clientcmd.NewDefaultClientConfigLoadingRules()
+		loadingRules.ExplicitPath = kubeconfig
+		overrides := &clientcmd.ConfigOverrides{CurrentContext: contextName}
+		restConfig, err = clientcmd.NewNonInteractiveDeferredLoadingClientConfig(loadingRules, overrides).ClientConfig()
+	}
 	if err != nil {
-		log.Fatal(err)
+		return nil, err
 	}
 
 	// vodoo, i like kkkkubernetes. (from: pkg/cmd/util/kubectl_match_version.go in kubectl)
@@ -258,75 +259,116 @@ func makeConfig(kubeconfig string)  (*rest.Config, error) {
 	return restConfig, err
 }
 
-func checkIfPodExists(restConfig *rest.Config, termConnectPayload  *TermConnectPayload) error {
+func checkIfPodExists(clientset *kubernetes.Clientset, termConnectPayload  *TermConnectPayload) error {
 
-	clientset, err := kubernetes.NewForConfig(restConfig)
-	if err != nil {
-		log.Fatal(err)
-	}
-	_, err = clientset.CoreV1().Pods(termConnectPayload.Namespace).Get(context.TODO(), termConnectPayload.PodName, metav1.GetOptions{})
+	_, err := clientset.CoreV1().Pods(termConnectPayload.Namespace).Get(context.TODO(), termConnectPayload.PodName, metav1.GetOptions{})
 	if err != nil {
 		return err
 	}
 	return nil
 }
 
-func setLogFile() (*os.File) {
-	file, err := os.OpenFile("info.log", os.O_CREATE|os.O_APPEND|os.O_WRONLY, 0644)
-    if err != nil {
-        log.Fatal(err)
-    }
+// what all sessions share: the rest client and the clientset keep their connection to the api server,
+// the spdy round tripper is built once from the config.
+type ExecClient struct {
+	restClient *rest.RESTClient
+	clientset  *kubernetes.Clientset
+	transport  http.RoundTripper
+	upgrader   spdy.Upgrader
+}
 
-    log.SetOutput(file)
+func NewExecClient(restConfig *rest.Config) (*ExecClient, error) {
+	restClient, err := rest.RESTClientFor(restConfig)
+	if err != nil {
+		return nil, fmt.Errorf("can't get rest client: %v", err)
+	}
+	clientset, err := kubernetes.NewForConfig(restConfig)
+	if err != nil {
+		return nil, err
+	}
+	transport, upgrader, err := spdy.RoundTripperFor(restConfig)
+	if err != nil {
+		return nil, err
+	}
+	return &ExecClient{restClient: restClient, clientset: clientset, transport: transport, upgrader: upgrader}, nil
+}
 
-	return file
+// the clients of the kubeconfig contexts, each one is made for the first session of its context.
+type ExecClients struct {
+	kubeconfig     string
+	defaultContext string
+	mutex          sync.Mutex
+	clients        map[string]*ExecClient
 }
 
-func main() {
+func NewExecClients(kubeconfig string, defaultContext string) *ExecClients {
+	return &ExecClients{kubeconfig: kubeconfig, defaultContext: defaultContext, clients: make(map[string]*ExecClient)}
+}
 
-	/*
-	file := setLogFile()
-	defer file.Close()
-	*/
+func (c *ExecClients) Get(contextName string) (*ExecClient, error) {
+	if contextName == "" {
+		contextName = c.defaultContext
+	}
 
-	defaultConfig, _ := DefaultConfigFile()
-	kubeconfig := flag.String("kubeconfig", defaultConfig, "absolute path to the kubeconfig file")
-	flag.Parse()
+	c.mutex.Lock()
+	defer c.mutex.Unlock()
 
-	restConfig, err := makeConfig(*kubeconfig)
+	if client, ok := c.clients[contextName]; ok {
+		return client, nil
+	}
+	restConfig, err := makeConfig(c.kubeconfig, contextName)
 	if err != nil {
-		log.Fatal("Can't create rest config", err)
+		return nil, fmt.Errorf("can't create rest config: %v", err)
 	}
+	client, err := NewExecClient(restConfig)
+	if err != nil {
+		return nil, err
+	}
+	c.clients[contextName] = client
+	return client, nil
+}
+
+// runs one terminal session: reads the connect command from in, then the frames with the input of the terminal.
+func (c *ExecClients) RunSession(in io.Reader, out io.Writer) error {
 
-	inReader := bufio.NewReader(os.Stdin)
+	inReader := bufio.NewReader(in)
 	termConnectPayload, err := readConnectCmd(inReader)
 	if err != nil {
-		log.Fatal("can't read command def", err)
+		return fmt.Errorf("can't read command def: %v", err)
 	}
 
 	if termConnectPayload.PodName == "" {
-		log.Fatal("no podname defined in connect command")
+		return fmt.Errorf("no podname defined in connect command")
 	}
 
 	if DebugOn {
-		log.Printf("pod_name: %s namespace: %s container: %s", termConnectPayload.PodName, termConnectPayload.Namespace, termConnectPayload.ContainerName)
+		log.Printf("pod_name: %s namespace: %s container: %s context: %s", termConnectPayload.PodName, termConnectPayload.Namespace, termConnectPayload.ContainerName, termConnectPayload.Context)
 	}
 
-	err = checkIfPodExists(restConfig, termConnectPayload)
+	client, err := c.Get(termConnectPayload.Context)
 	if err != nil {
-		log.Fatalf("pod %s namespace %s does not exist.", termConnectPayload.PodName, termConnectPayload.Namespace)
+		return err
 	}
+	return client.Exec(termConnectPayload, inReader, out)
+}
 
-	req := NewExecRequest(restConfig, *termConnectPayload)
+func (c *ExecClient) Exec(termConnectPayload *TermConnectPayload, inReader *bufio.Reader, out io.Writer) error {
 
-	exec, err := remotecommand.NewSPDYExecutor(restConfig, http.MethodPost, req.URL())
+	err := checkIfPodExists(c.clientset, termConnectPayload)
 	if err != nil {
-		log.Fatal("failed to create spdy executor", err)
+		return fmt.Errorf("pod %s namespace %s does not exist.", termConnectPayload.PodName, termConnectPayload.Namespace)
+	}
+
+	req := NewExecRequest(c.restClient, *termConnectPayload)
+
+	exec, err := remotecommand.NewSPDYExecutorForTransports(c.transport, c.upgrader, http.MethodPost, req.URL())
+	if err != nil {
+		return fmt.Errorf("failed to create spdy executor: %v", err)
 	}
 
 	stdinReader := NewStdinReader(inReader)
 	terminalSizeQueue := TerminalSizeQueueImp{resizeChannel: stdinReader.resizeChannel}
-	dataWriter := NewDataWriter()
+	dataWriter := NewDataWriter(out)
 
 	var rawTerm = true
 
@@ -341,7 +383,83 @@ func main() {
 					TerminalSizeQueue: &terminalSizeQueue,
 				})
 	if err != nil {
-		log.Fatalf("stream error: %v", err)
+		return fmt.Errorf("stream error: %v", err)
+	}
+	return nil
+}
+
+// daemon mode: s9k starts one kubeexec that runs all terminal sessions, each session is a connection
+// to the unix socket, with the same protocol as stdin/stdout of a kubeexec for a single session.
+// Errors are written to the terminal of the session.
+func (c *ExecClients) Serve(socketPath string) {
+	os.Remove(socketPath)
+	listener, err := net.Listen("unix", socketPath)
+	if err != nil {
+		log.Fatal("can't listen: ", err)
+	}
+	go exitWithParent()
+
+	for {
+		conn, err := listener.Accept()
+		if err != nil {
+			log.Fatal("accept failed: ", err)
+		}
+		go func() {
+			defer conn.Close()
+			if err := c.RunSession(conn, conn); err != nil {
+				log.Print(err)
+				fmt.Fprintf(conn, "\r\nkubeexec: %v\r\n", err)
+			}
+		}()
+	}
+}
+
+// the daemon doesn't outlive s9k, also if s9k was killed.
+func exitWithParent() {
+	parent := os.Getppid()
+	for os.Getppid() == parent {
+		time.Sleep(time.Second)
+	}
+	os.Exit(0)
+}
+
+func setLogFile() (*os.File) {
+	file, err := os.OpenFile("info.log", os.O_CREATE|os.O_APPEND|os.O_WRONLY, 0644)
+    if err != nil {
+        log.Fatal(err)
+    }
+
+    log.SetOutput(file)
+
+	return file
+}
+
+func main() {
+
+	/*
+	file := setLogFile()
+	defer file.Close()
+	*/
+
+	defaultConfig, _ := DefaultConfigFile()
+	kubeconfig := flag.String("kubeconfig", defaultConfig, "absolute path to the kubeconfig file")
+	contextName := flag.String("context", "", "kubeconfig context of the sessions that don't name one (default: the current context)")
+	daemonSocket := flag.String("daemon", "", "run all terminal sessions of s9k, that connect to this unix socket")
+	flag.Parse()
+
+	execClients := NewExecClients(*kubeconfig, *contextName)
+
+	if *daemonSocket != "" {
+		// the client of the default context is ready before the first session.
+		if _, err := execClients.Get(""); err != nil {
+			log.Print(err)
+		}
+		execClients.Serve(*daemonSocket)
+	}
+
+	err := execClients.RunSession(os.Stdin, os.Stdout)
+	if err != nil {
+		log.Fatal(err)
 	}
 	log.Print("exit")
 	os.Exit(0)
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# A fake kubernetes api server with synthetic objects, for running s9k --backend api without a cluster.
+#
+#   ./fake/fake_apiserver.py --port 8001 --pods 1000 --kubeconfig /tmp/fake-kube/config
+#   ./s9k.py --backend api --kubeconfig /tmp/fake-kube
+#
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESOURCES = {
+    # name -> (group version, kind, namespaced, short names)
+    "namespaces": ("v1", "Namespace", False, ["ns"]),
+    "nodes": ("v1", "Node", False, ["no"]),
+    "pods": ("v1", "Pod", True, ["po"]),
+    "services": ("v1", "Service", True, ["svc"]),
+    "configmaps": ("v1", "ConfigMap", True, ["cm"]),
+    "deployments": ("apps/v1", "Deployment", True, ["deploy"]),
+    "replicasets": ("apps/v1", "ReplicaSet", True, ["rs"]),
+}
+
+CREATION_TIMESTAMP = "2024-01-01T00:00:00Z"
+CREATION_TIME = 1704067200
+
+
+def format_log_time(nanos):
+    # RFC3339Nano like the kubelet writes it: trailing zeros of the fraction are dropped
+    fraction = "{:09d}".format(nanos % 1000000000).rstrip("0")
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(nanos // 1000000000)) + \
+        ("." + fraction if fraction else "") + "Z"
+
+
+def make_log_line(name, line_pos, timestamps, nanos=None):
+    # line_pos seconds after the creation, and a part of a second that differs by pod, so that the lines of
+    # several pods interleave; with timestamps the time is in front, like kubectl logs --timestamps.
+    line = "{}Z {} log line {}\n".format(CREATION_TIMESTAMP[:-1], name, line_pos)
+    if not timestamps:
+        return line
+    if nanos is None:
+        millis = int(hashlib.sha256(name.encode("utf-8")).hexdigest()[:6], 16) % 1000
+        nanos = (CREATION_TIME + line_pos) * 1000000000 + millis * 1000000
+    return format_log_time(nanos) + " " + line
+
+
+def make_owner_reference(resource, namespace, name):
+    group_version, kind, _, _ = RESOURCES[resource]
+    return {"apiVersion": group_version, "kind": kind, "name": name, "uid": f"{resource}-{namespace}-{name}",
+            "controller": True}
+
+
+def make_object(resource, namespace, name, labels):
+    group_version, kind, _, _ = RESOURCES[resource]
+    metadata = {"name": name, "uid": f"{resource}-{namespace}-{name}", "labels": labels,
+                "creationTimestamp": CREATION_TIMESTAMP}
+    if namespace is not None:
+        metadata["namespace"] = namespace
+    obj = {"apiVersion": group_version, "kind": kind, "metadata": metadata, "spec": {}, "status": {}}
+    if resource == "pods":
+        # owned by the replica set of the namespace, mounts its config map
+        obj["metadata"]["ownerReferences"] = [make_owner_reference("replicasets", namespace, "app-5d9c8")]
+        obj["spec"]["containers"] = [{"name": "main", "image": "nginx:1.25"}, {"name": "sidecar", "image": "envoy:1.28"}]
+        obj["spec"]["volumes"] = [{"name": "config", "configMap": {"name": "config"}}]
+        obj["status"] = {"phase": "Running", "podIP": "10.0.0.1",
+                         "containerStatuses": [{"name": "main", "ready": True, "restartCount": 0},
+                                               {"name": "sidecar", "ready": True, "restartCount": 1}]}
+    if resource == "deployments":
+        obj["metadata"]["ownerReferences"] = []
+        obj["spec"] = {"replicas": 3, "selector": {"matchLabels": labels},
+                       "template": {"spec": {"volumes": [{"name": "config", "configMap": {"name": "config"}}]}}}
+    if resource == "replicasets":
+        obj["metadata"]["ownerReferences"] = [make_owner_reference("deployments", namespace, "app")]
+        obj["status"] = {"replicas": 3, "readyReplicas": 3, "updatedReplicas": 3, "availableReplicas": 3}
+    if resource == "services":
+        obj["spec"] = {"type": "ClusterIP", "clusterIP": "10.96.0.10", "selector": labels,
+                       "ports": [{"port": 80, "protocol": "TCP"}]}
+    if resource == "configmaps":
+        obj["data"] = {"settings.conf": "key=value\nother=value\n"}
+    return obj
+
+
+def generate_objects(resource, num_pods, num_namespaces, num_nodes):
+    # the synthetic objects of one resource type, in the order of a list response.
+    if resource == "namespaces":
+        for ns_pos in range(num_namespaces):
+            yield make_object("namespaces", None, f"ns-{ns_pos}", {})
+    elif resource == "nodes":
+        for node_pos in range(num_nodes):
+            yield make_object("nodes", None, f"node-{node_pos}", {"kubernetes.io/os": "linux"})
+    elif resource == "pods":
+        for pod_pos in range(num_pods):
+            namespace = f"ns-{pod_pos % num_namespaces}"
+            pod = make_object("pods", namespace, f"app-5d9c8-{pod_pos:06d}", {"app": "app", "pod-pos": str(pod_pos)})
+            pod["spec"]["nodeName"] = f"node-{pod_pos % num_nodes}"
+            yield pod
+    else:
+        name = {"configmaps": "config", "replicasets": "app-5d9c8"}.get(resource, "app")
+        labels = {} if resource == "configmaps" else {"app": "app"}
+        for ns_pos in range(num_namespaces):
+            yield make_object(resource, f"ns-{ns_pos}", name, dict(labels))
+
+
+class FakeCluster:
+    def __init__(self, num_pods, num_namespaces, num_nodes, log_lines):
+        self.lock = threading.Condition()
+        self.resource_version = 1
+        self.events = []  # (resource version, resource name, event)
+        self.objects = {name: {} for name in RESOURCES}  # resource name -> (namespace, name) -> object
+        self.log_lines = log_lines
+
+        for resource in RESOURCES:
+            for obj in generate_objects(resource, num_pods, num_namespaces, num_nodes):
+                self.add(resource, obj)
+
+    def add(self, resource, obj, event_type=None):
+        with self.lock:
+            self.resource_version += 1
+            obj["metadata"]["resourceVersion"] = str(self.resource_version)
+            key = (obj["metadata"].get("namespace"), obj["metadata"]["name"])
+            self.objects[resource][key] = obj
+            if event_type is not None:
+                self.events.append((self.resource_version, resource, {"type": event_type, "object": obj}))
+                self.lock.notify_all()
+
+    def delete(self, resource, key):
+        with self.lock:
+            obj = self.objects[resource].pop(key)
+            self.resource_version += 1
+            obj["metadata"]["resourceVersion"] = str(self.resource_version)
+            self.events.append((self.resource_version, resource, {"type": "DELETED", "object": obj}))
+            self.lock.notify_all()
+
+    def churn(self, interval):
+        # keeps modifying pods, so that watches have something to report.
+        counter = 0
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                pods = list(self.objects["pods"].values())
+            if not pods:
+                continue
+            pod = json.loads(json.dumps(pods[counter % len(pods)]))
+            pod["metadata"]["labels"]["churn"] = str(counter)
+            self.add("pods", pod, "MODIFIED")
+            counter += 1
+
+    def list(self, resource, namespace, label_selector):
+        with self.lock:
+            items = [obj for key, obj in sorted(self.objects[resource].items(), key=lambda entry: (entry[0][0] or "", entry[0][1]))
+                     if namespace is None or key[0] == namespace]
+            resource_version = str(self.resource_version)
+        if label_selector:
+            wanted = dict(term.split("=", 1) for term in label_selector.split(",") if "=" in term)
+            items = [obj for obj in items if all(obj["metadata"]["labels"].get(key) == value for key, value in wanted.items())]
+        return items, resource_version
+
+
+METRICS_PATTERN = re.compile(r"^/apis/metrics.k8s.io/v1beta1(?:/namespaces/(?P<namespace>[^/]+))?/(?P<resource>pods|nodes)$")
+
+
+def make_usage(name, now, scale):
+    # the usage of an object, like metrics-server reports it: a level that differs by object, and a wave with a
+    # period of an hour
+    seed = int(hashlib.sha256(name.encode("utf-8")).hexdigest()[:8], 16)
+    wave = (1 + math.sin(now * 2 * math.pi / 3600 + seed)) / 2
+    return {"cpu": "{}n".format(int((10 + seed % 200 + 100 * wave) * scale * 1000000)),
+            "memory": "{}Ki".format(int((64 + seed % 512 + 32 * wave) * scale * 1024))}
+
+
+def make_metrics_list(resource, objects):
+    # PodMetricsList or NodeMetricsList of the metrics api
+    now = time.time()
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))
+    items = []
+    for obj in objects:
+        metadata = {key: value for key, value in obj["metadata"].items() if key in ("name", "namespace", "labels")}
+        item = {"metadata": metadata, "timestamp": timestamp, "window": "30s"}
+        if resource == "pods":
+            item["containers"] = [{"name": container["name"],
+                                   "usage": make_usage(metadata["name"] + "/" + container["name"], now, 1)}
+                                  for container in obj["spec"]["containers"]]
+        else:
+            item["usage"] = make_usage(metadata["name"], now, 20)
+        items.append(item)
+    kind = "PodMetricsList" if resource == "pods" else "NodeMetricsList"
+    return {"kind": kind, "apiVersion": "metrics.k8s.io/v1beta1", "metadata": {}, "items": items}
+
+
+def page_items(items, query, list_metadata):
+    # limit/continue chunking, the continue token is the encoded offset of the next item.
+    offset = 0
+    if query.get("continue"):
+        offset = int(base64.b64decode(query["continue"]).decode("ascii"))
+    if not query.get("limit"):
+        return items[offset:]
+    end = offset + int(query["limit"])
+    if end < len(items):
+        list_metadata["continue"] = base64.b64encode(str(end).encode("ascii")).decode("ascii")
+        list_metadata["remainingItemCount"] = len(items) - end
+    return items[offset:end]
+
+
+def make_table(resource, items, include_object):
+    columns = [{"name": "Name", "type": "string", "priority": 0}]
+    if resource == "pods":
+        columns += [{"name": name, "type": "string", "priority": priority} for name, priority in
+                    [("Ready", 0), ("Status", 0), ("Restarts", 0), ("Age", 0), ("IP", 1), ("Node", 1),
+                     ("Nominated Node", 1), ("Readiness Gates", 1)]]
+    else:
+        columns += [{"name": "Age", "type": "string", "priority": 0}]
+
+    rows = []
+    for obj in items:
+        if resource == "pods":
+            cells = [obj["metadata"]["name"], "2/2", obj["status"]["phase"], 1, "1d", obj["status"]["podIP"],
+                     obj["spec"].get("nodeName"), None, None]
+        else:
+            cells = [obj["metadata"]["name"], "1d"]
+        row = {"cells": cells}
+        if include_object == "Metadata":
+            row["object"] = {"kind": "PartialObjectMetadata", "apiVersion": "meta.k8s.io/v1", "metadata": obj["metadata"]}
+        rows.append(row)
+    return {"kind": "Table", "apiVersion": "meta.k8s.io/v1", "metadata": {}, "columnDefinitions": columns, "rows": rows}
+
+
+PATH_PATTERN = re.compile(r"^/(?:api/v1|apis/(?P<group>[^/]+)/v1)(?:/namespaces/(?P<namespace>[^/]+))?/(?P<resource>[^/]+)(?:/(?P<name>[^/]+))?(?:/(?P<subresource>[^/]+))?$")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cluster = None
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_discovery(self, obj):
+        # discovery documents have an ETag, like those of the aggregated discovery of a real api server.
+        body = json.dumps(obj).encode("utf-8")
+        etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, text):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def not_found(self):
+        self.send_json({"kind": "Status", "status": "Failure", "reason": "NotFound", "code": 404}, 404)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        if url.path == "/api":
+            return self.send_json({"kind": "APIVersions", "versions": ["v1"]})
+        if url.path == "/apis":
+            return self.send_discovery({"kind": "APIGroupList", "groups": [
+                {"name": "apps", "versions": [{"groupVersion": "apps/v1", "version": "v1"}],
+                 "preferredVersion": {"groupVersion": "apps/v1", "version": "v1"}}]})
+        if url.path in ("/api/v1", "/apis/apps/v1"):
+            group_version = url.path.split("/", 2)[2]
+            return self.send_discovery({"kind": "APIResourceList", "groupVersion": group_version, "resources": [
+                {"name": name, "kind": kind, "namespaced": namespaced, "shortNames": short_names,
+                 "verbs": ["get", "list", "watch"]}
+                for name, (resource_group_version, kind, namespaced, short_names) in RESOURCES.items()
+                if resource_group_version == group_version]})
+
+        match = METRICS_PATTERN.match(url.path)
+        if match is not None:
+            items, _ = self.cluster.list(match.group("resource"), match.group("namespace"), query.get("labelSelector"))
+            return self.send_json(make_metrics_list(match.group("resource"), items))
+
+        match = PATH_PATTERN.match(url.path)
+        if match is None or match.group("resource") not in RESOURCES:
+            return self.not_found()
+        resource, namespace, name = match.group("resource"), match.group("namespace"), match.group("name")
+
+        if name is not None:
+            obj = self.cluster.objects[resource].get((namespace, name))
+            if obj is None:
+                return self.not_found()
+            if match.group("subresource") == "log":
+                return self.send_logs(obj, query)
+            return self.send_json(obj)
+
+        if query.get("watch") in ("true", "1"):
+            return self.send_watch(resource, namespace, int(query.get("resourceVersion") or 0))
+
+        items, resource_version = self.cluster.list(resource, namespace, query.get("labelSelector"))
+        list_metadata = {"resourceVersion": resource_version}
+        items = page_items(items, query, list_metadata)
+        if "as=Table" in self.headers.get("Accept", ""):
+            table = make_table(resource, items, query.get("includeObject"))
+            table["metadata"] = list_metadata
+            return self.send_json(table)
+
+        group_version, kind, _, _ = RESOURCES[resource]
+        return self.send_json({"kind": kind + "List", "apiVersion": group_version,
+                               "metadata": list_metadata,
+                               "items": [{key: value for key, value in obj.items() if key not in ("kind", "apiVersion")}
+                                         for obj in items]})
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        match = PATH_PATTERN.match(url.path)
+        if match is None or match.group("resource") not in RESOURCES or match.group("name") is None:
+            return self.not_found()
+        resource, key = match.group("resource"), (match.group("namespace"), match.group("name"))
+        obj = self.cluster.objects[resource].get(key)
+        if obj is None:
+            return self.not_found()
+        if query.get("dryRun") != "All":
+            self.cluster.delete(resource, key)
+        return self.send_json(obj)
+
+    def send_logs(self, obj, query):
+        timestamps = query.get("timestamps") == "true"
+        lines = [make_log_line(obj["metadata"]["name"], line_pos, timestamps) for line_pos in range(self.cluster.log_lines)]
+        if "tailLines" in query:
+            lines = lines[-int(query["tailLines"]):]
+        return self.send_text("".join(lines))
+
+    def send_watch(self, resource, namespace, resource_version):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        pos = 0
+        try:
+            while True:
+                with self.cluster.lock:
+                    while pos == len(self.cluster.events):
+                        self.cluster.lock.wait(30)
+                    events = self.cluster.events[pos:]
+                    pos = len(self.cluster.events)
+                for event_version, event_resource, event in events:
+                    if event_version <= resource_version or event_resource != resource:
+                        continue
+                    if namespace is not None and event["object"]["metadata"].get("namespace") != namespace:
+                        continue
+                    self.send_chunk(json.dumps(event).encode("utf-8") + b"\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def write_kubeconfig(path, port):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    kubeconfig = {
+        "apiVersion": "v1", "kind": "Config", "current-context": "fake",
+        "clusters": [{"name": "fake", "cluster": {"server": f"http://127.0.0.1:{port}"}}],
+        "users": [{"name": "fake", "user": {"token": "fake-token"}}],
+        "contexts": [{"name": "fake", "context": {"cluster": "fake", "user": "fake"}}],
+    }
+    with open(path, "w") as file:
+        json.dump(kubeconfig, file, indent=2)
+
+
+def parse_cmd_line():
+    parse = argparse.ArgumentParser(description="fake kubernetes api server with synthetic objects")
+    parse.add_argument('--port', '-p', type=int, default=8001, dest='port', help='listening port')
+    parse.add_argument('--pods', type=int, default=100, dest='pods', help='number of pods')
+    parse.add_argument('--namespaces', type=int, default=10, dest='namespaces', help='number of namespaces')
+    parse.add_argument('--nodes', type=int, default=3, dest='nodes', help='number of nodes')
+    parse.add_argument('--log-lines', type=int, default=1000, dest='log_lines', help='number of log lines per pod')
+    parse.add_argument('--churn', type=float, default=0, dest='churn', help='modify a pod every that many seconds (0 - never)')
+    parse.add_argument('--kubeconfig', '-f', type=str, default='', dest='kubeconfig',
+                       help='write a json kubeconfig for this server to this file')
+    return parse.parse_args()
+
+
+def main():
+    cmd = parse_cmd_line()
+
+    Handler.cluster = FakeCluster(cmd.pods, cmd.namespaces, cmd.nodes, cmd.log_lines)
+    if cmd.kubeconfig != "":
+        write_kubeconfig(cmd.kubeconfig, cmd.port)
+    if cmd.churn > 0:
+        threading.Thread(target=Handler.cluster.churn, args=(cmd.churn,), daemon=True).start()
+
+    server = ThreadingHTTPServer(("127.0.0.1", cmd.port), Handler)
+    server.daemon_threads = True
+    print(f"fake api server listening on http://127.0.0.1:{cmd.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# A fake kubectl with synthetic objects, for running s9k and its benchmarks without a cluster.
+#
+#   FAKE_KUBECTL_PODS=10000 ./s9k.py --command ./fake/fake_kubectl.py
+#
+# The size of the fake cluster is set by environment variables, s9k passes them on to its commands:
+#   FAKE_KUBECTL_PODS (100), FAKE_KUBECTL_NAMESPACES (10), FAKE_KUBECTL_NODES (3),
+#   FAKE_KUBECTL_LOG_LINES (1000) - log lines per pod, FAKE_KUBECTL_DELAY (0) - seconds before each command returns.
+#   FAKE_KUBECTL_CONTEXTS (fake) - comma separated context names, the first one is the current context; every
+#   context has the same objects. FAKE_KUBECTL_CONTEXT_DELAYS - more seconds for some contexts: <context>=<seconds>,..
+#
+# Supports the commands that s9k runs: api-resources, get (-o json|yaml|wide|name|jsonpath|go-template, --raw
+# for discovery, lists, objects and watches, -f - for a List of objects), describe, logs, apply, delete (one object
+# or a List, objects that don't exist fail) and config (current-context, get-contexts). get --raw also answers
+# the pod and node lists of the metrics api.
+import json
+import os
+import re
+import sys
+import time
+import urllib.parse
+
+from fake_apiserver import METRICS_PATTERN, RESOURCES, CREATION_TIMESTAMP, generate_objects, make_log_line, \
+    make_metrics_list, page_items
+
+NUM_PODS = int(os.environ.get("FAKE_KUBECTL_PODS", "100"))
+NUM_NAMESPACES = int(os.environ.get("FAKE_KUBECTL_NAMESPACES", "10"))
+NUM_NODES = int(os.environ.get("FAKE_KUBECTL_NODES", "3"))
+LOG_LINES = int(os.environ.get("FAKE_KUBECTL_LOG_LINES", "1000"))
+DELAY = float(os.environ.get("FAKE_KUBECTL_DELAY", "0"))
+CONTEXTS = os.environ.get("FAKE_KUBECTL_CONTEXTS", "fake").split(",")
+CONTEXT_DELAYS = {name: float(delay) for name, delay in \
+                  (entry.split("=") for entry in os.environ.get("FAKE_KUBECTL_CONTEXT_DELAYS", "").split(",") if entry)}
+
+SHORT_NAMES = {short_name: name for name, (_, _, _, short_names) in RESOURCES.items() for short_name in short_names}
+PATH_PATTERN = re.compile(r"^/(?:api/v1|apis/(?P<group>[^/]+)/v1)(?:/namespaces/(?P<namespace>[^/]+))?/(?P<resource>[^/]+)(?:/(?P<name>[^/]+))?$")
+
+
+class Args:
+    # the command line of kubectl: positional arguments and options
+    def __init__(self, argv):
+        self.positional = []
+        self.options = {}
+        pos = 0
+        while pos < len(argv):
+            arg = argv[pos]
+            if arg in ("-A", "--all-namespaces", "-w", "--watch", "--show-labels", "-f", "--follow", "--timestamps"):
+                self.options[arg.lstrip("-")] = "true"
+            elif arg.startswith("--") and "=" in arg:
+                key, value = arg[2:].split("=", 1)
+                self.options[key] = value
+            elif arg.startswith("-") and arg != "-" and pos + 1 < len(argv):
+                self.options[arg.lstrip("-")] = argv[pos + 1]
+                pos += 1
+            else:
+                self.positional.append(arg)
+            pos += 1
+
+    def get(self, *names):
+        for name in names:
+            if name in self.options:
+                return self.options[name]
+        return None
+
+
+def fail(message):
+    sys.stderr.write("error: {}\n".format(message))
+    sys.exit(1)
+
+
+def resource_name(name):
+    name = name.split(".")[0]
+    name = SHORT_NAMES.get(name, name)
+    if name not in RESOURCES and name + "s" in RESOURCES:
+        name += "s"
+    if name not in RESOURCES:
+        fail('the server doesn\'t have a resource type "{}"'.format(name))
+    return name
+
+
+def list_objects(resource, namespace, label_selector):
+    for obj in generate_objects(resource, NUM_PODS, NUM_NAMESPACES, NUM_NODES):
+        if namespace is not None and obj["metadata"].get("namespace", namespace) != namespace:
+            continue
+        if label_selector:
+            wanted = dict(term.split("=", 1) for term in label_selector.split(",") if "=" in term)
+            if any(obj["metadata"]["labels"].get(key) != value for key, value in wanted.items()):
+                continue
+        yield obj
+
+
+def get_object(resource, namespace, name):
+    if not RESOURCES[resource][2]:
+        namespace = None
+    for obj in generate_objects(resource, NUM_PODS, NUM_NAMESPACES, NUM_NODES):
+        if obj["metadata"]["name"] == name and obj["metadata"].get("namespace") == namespace:
+            return obj
+    return fail('{} "{}" not found'.format(resource, name))
+
+
+def write_list(objects, indent, list_fields):
+    # writes the items one by one, like a big list coming from kubectl.
+    out = sys.stdout
+    out.write('{\n    "apiVersion": "v1",\n    "items": [')
+    separator = "\n"
+    for obj in objects:
+        out.write(separator)
+        out.write(json.dumps(obj, indent=indent))
+        separator = ",\n"
+    out.write("\n    ],\n")
+    out.write('    "kind": "List",\n    "metadata": {}\n}}\n'.format(json.dumps(list_fields)))
+
+
+def write_wide_table(resource, objects, show_namespace, show_labels):
+    titles = ["NAME", "AGE"]
+    if resource == "pods":
+        titles = ["NAME", "READY", "STATUS", "RESTARTS", "AGE", "IP", "NODE", "NOMINATED NODE", "READINESS GATES"]
+    if show_namespace:
+        titles.insert(0, "NAMESPACE")
+    if show_labels:
+        titles.append("LABELS")
+
+    rows = []
+    for obj in objects:
+        metadata = obj["metadata"]
+        row = [metadata["name"], "1d"]
+        if resource == "pods":
+            row = [metadata["name"], "2/2", obj["status"]["phase"], "1", "1d", obj["status"]["podIP"],
+                   obj["spec"]["nodeName"], "<none>", "<none>"]
+        if show_namespace:
+            row.insert(0, metadata.get("namespace", ""))
+        if show_labels:
+            row.append(",".join(f"{key}={value}" for key, value in metadata["labels"].items()) or "<none>")
+        rows.append(row)
+
+    widths = [max([len(title)] + [len(row[pos]) for row in rows]) + 3 for pos, title in enumerate(titles)]
+    for row in [titles] + rows:
+        sys.stdout.write("".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() + "\n")
+
+
+def write_yaml(obj, indent=""):
+    # good enough for the synthetic objects
+    for key, value in obj.items():
+        if isinstance(value, dict) and value:
+            sys.stdout.write(f"{indent}{key}:\n")
+            write_yaml(value, indent + "  ")
+        elif isinstance(value, list) and value:
+            sys.stdout.write(f"{indent}{key}:\n")
+            for item in value:
+                if isinstance(item, dict):
+                    lines = []
+                    for item_key, item_value in item.items():
+                        lines.append(f"{item_key}: {json.dumps(item_value)}")
+                    sys.stdout.write(f"{indent}- " + f"\n{indent}  ".join(lines) + "\n")
+                else:
+                    sys.stdout.write(f"{indent}- {json.dumps(item)}\n")
+        else:
+            sys.stdout.write(f"{indent}{key}: {json.dumps(value)}\n")
+
+
+def get_raw(path):
+    url = urllib.parse.urlsplit(path)
+    query = dict(urllib.parse.parse_qsl(url.query))
+
+    if url.path == "/api":
+        return print(json.dumps({"kind": "APIVersions", "versions": ["v1"]}))
+    if url.path == "/apis":
+        return print(json.dumps({"kind": "APIGroupList", "groups": [
+            {"name": "apps", "versions": [{"groupVersion": "apps/v1", "version": "v1"}],
+             "preferredVersion": {"groupVersion": "apps/v1", "version": "v1"}}]}))
+    if url.path in ("/api/v1", "/apis/apps/v1"):
+        group_version = url.path.split("/", 2)[2]
+        return print(json.dumps({"kind": "APIResourceList", "groupVersion": group_version, "resources": [
+            {"name": name, "kind": kind, "namespaced": namespaced, "shortNames": short_names,
+             "verbs": ["get", "list", "watch"]}
+            for name, (resource_group_version, kind, namespaced, short_names) in RESOURCES.items()
+            if resource_group_version == group_version]}))
+
+    match = METRICS_PATTERN.match(url.path)
+    if match is not None:
+        return print(json.dumps(make_metrics_list(match.group("resource"), list_objects(
+            match.group("resource"), match.group("namespace"), query.get("labelSelector")))))
+
+    match = PATH_PATTERN.match(url.path)
+    if match is None or match.group("resource") not in RESOURCES:
+        return fail("the server could not find the requested resource")
+    resource, namespace, name = match.group("resource"), match.group("namespace"), match.group("name")
+
+    if name is not None:
+        return print(json.dumps(get_object(resource, namespace, name)))
+
+    if query.get("watch") in ("true", "1"):
+        # no changes in a fake cluster; bookmarks keep the watch alive until s9k closes it.
+        while True:
+            print(json.dumps({"type": "BOOKMARK", "object": {"kind": RESOURCES[resource][1],
+                                                             "metadata": {"resourceVersion": "2"}}}), flush=True)
+            time.sleep(30)
+
+    list_metadata = {"resourceVersion": "1"}
+    items = page_items(list(list_objects(resource, namespace, query.get("labelSelector"))), query, list_metadata)
+    group_version, kind, _, _ = RESOURCES[resource]
+    return print(json.dumps({"kind": kind + "List", "apiVersion": group_version, "metadata": list_metadata,
+                             "items": [{key: value for key, value in obj.items() if key not in ("kind", "apiVersion")}
+                                       for obj in items]}))
+
+
+def read_objects():
+    # the objects of -f -: json (one object or a List) or the yaml of one object.
+    text = sys.stdin.read()
+    try:
+        obj = json.loads(text)
+    except json.JSONDecodeError:
+        kind = re.search(r"^kind:\s*(\S+)", text, re.MULTILINE)
+        name = re.search(r"^\s+name:\s*(\S+)", text, re.MULTILINE)
+        if kind is None or name is None:
+            return fail("error validating data: kind or name not set")
+        return [{"kind": kind.group(1), "metadata": {"name": name.group(1)}}]
+    return obj.get("items", [obj])
+
+
+def find_object(item):
+    resource = resource_name(item["kind"].lower())
+    name = item["metadata"]["name"]
+    namespace = item["metadata"].get("namespace") if RESOURCES[resource][2] else None
+    for obj in generate_objects(resource, NUM_PODS, NUM_NAMESPACES, NUM_NODES):
+        if obj["metadata"]["name"] == name and obj["metadata"].get("namespace") == namespace:
+            return resource, obj
+    return resource, None
+
+
+def get_files():
+    # kubectl get -f -: the objects that were found, errors for the others.
+    found = []
+    exit_code = 0
+    for item in read_objects():
+        resource, obj = find_object(item)
+        if obj is None:
+            sys.stderr.write('Error from server (NotFound): {} "{}" not found\n'.format(resource, item["metadata"]["name"]))
+            exit_code = 1
+        else:
+            found.append(obj)
+    if len(found) == 1:
+        print(json.dumps(found[0], indent=4))
+    elif found:
+        write_list(found, 4, {"resourceVersion": ""})
+    sys.exit(exit_code)
+
+
+def get(args):
+    if args.get("raw") is not None:
+        return get_raw(args.get("raw"))
+    if args.positional == ["-"]:
+        return get_files()
+    if not args.positional:
+        return fail("you must specify the type of resource to get")
+
+    resource = resource_name(args.positional[0])
+    namespaced = RESOURCES[resource][2]
+    all_namespaces = args.get("A", "all-namespaces") is not None
+    namespace = args.get("n", "namespace") or "default"
+    if not namespaced or all_namespaces:
+        namespace = None
+    output = args.get("o", "output") or ""
+
+    if len(args.positional) > 1:
+        obj = get_object(resource, namespace, args.positional[1])
+        if output == "json":
+            return print(json.dumps(obj, indent=4))
+        if output == "yaml":
+            return write_yaml(obj)
+        if output.startswith("jsonpath"):
+            # the only jsonpath that s9k uses: names of the containers of a pod
+            return sys.stdout.write(" ".join(container["name"] for container in obj["spec"].get("containers", [])))
+        return write_wide_table(resource, [obj], False, False)
+
+    objects = list_objects(resource, namespace, args.get("l", "selector"))
+    if output == "json":
+        return write_list(objects, 4, {"resourceVersion": ""})
+    if output == "name":
+        for obj in objects:
+            print("{}/{}".format(resource[:-1], obj["metadata"]["name"]))
+        return None
+    if output.startswith("go-template"):
+        # the only template that s9k uses: one name per line
+        for obj in objects:
+            print(obj["metadata"]["name"])
+        return None
+    return write_wide_table(resource, list(objects), all_namespaces and namespaced, args.get("show-labels") is not None)
+
+
+def api_resources():
+    rows = [["NAME", "SHORTNAMES", "APIVERSION", "NAMESPACED", "KIND"]]
+    for name, (group_version, kind, namespaced, short_names) in RESOURCES.items():
+        rows.append([name, ",".join(short_names), group_version, "true" if namespaced else "false", kind])
+    widths = [max(len(row[pos]) for row in rows) + 3 for pos in range(len(rows[0]))]
+    for row in rows:
+        print("".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def describe(args):
+    resource = resource_name(args.positional[0])
+    obj = get_object(resource, args.get("n", "namespace") or "default", args.positional[1])
+    metadata = obj["metadata"]
+    print("Name:         {}".format(metadata["name"]))
+    print("Namespace:    {}".format(metadata.get("namespace", "")))
+    print("Labels:       {}".format("\n              ".join(f"{key}={value}" for key, value in metadata["labels"].items())
+                                    or "<none>"))
+    print("Annotations:  <none>")
+    print("Created:      {}".format(CREATION_TIMESTAMP))
+    for container in obj["spec"].get("containers", []):
+        print("Container {}:\n  Image:  {}\n  State:  Running".format(container["name"], container["image"]))
+    print("Events:       <none>")
+
+
+def logs(args):
+    name = args.positional[0].split("/")[-1]
+    tail = int(args.get("tail") or -1)
+    start = 0 if tail < 0 else max(0, LOG_LINES - tail)
+    timestamps = args.get("timestamps") is not None
+    out = sys.stdout
+    for line_pos in range(start, LOG_LINES):
+        out.write(make_log_line(name, line_pos, timestamps))
+    out.flush()
+    if args.get("f", "follow") is not None:
+        line_pos = LOG_LINES
+        while True:
+            time.sleep(1)
+            out.write(make_log_line(name, line_pos, timestamps, time.time_ns()))
+            out.flush()
+            line_pos += 1
+
+
+def apply_or_delete(verb):
+    # the objects are not kept, only the output of -o name is written. Deleting an object that doesn't exist
+    # fails, kubectl goes on with the other objects.
+    exit_code = 0
+    for item in read_objects():
+        if verb == "delete" and find_object(item)[1] is None:
+            sys.stderr.write('Error from server (NotFound): error when deleting "STDIN": {} "{}" not found\n'.format(
+                resource_name(item["kind"].lower()), item["metadata"]["name"]))
+            exit_code = 1
+            continue
+        print("{}/{}{}".format(item["kind"].lower(), item["metadata"]["name"], " deleted" if verb == "delete" else ""))
+    sys.exit(exit_code)
+
+
+def config(args):
+    if args.positional[:1] == ["current-context"]:
+        print(CONTEXTS[0])
+    elif args.positional[:1] == ["get-contexts"] and args.get("o", "output") == "name":
+        print("\n".join(CONTEXTS))
+    else:
+        fail("unknown config command")
+
+
+def main():
+    context = CONTEXTS[0]
+    for arg in sys.argv[1:]:
+        if arg.startswith("--context="):
+            context = arg[len("--context="):]
+    if context not in CONTEXTS:
+        return fail('context was not found for specified context: {}'.format(context))
+    args = Args([arg for arg in sys.argv[1:] if not arg.startswith(("--kubeconfig", "--context"))])
+    if not args.positional:
+        return fail("no command")
+    delay = DELAY + CONTEXT_DELAYS.get(context, 0)
+    if delay > 0:
+        time.sleep(delay)
+
+    verb = args.positional.pop(0)
+    if verb == "config":
+        return config(args)
+    if verb == "api-resources":
+        return api_resources()
+    if verb == "get":
+        return get(args)
+    if verb == "describe":
+        return describe(args)
+    if verb == "logs":
+        return logs(args)
+    if verb in ("apply", "delete"):
+        return apply_or_delete(verb)
+    return fail('unknown command "{}" for "kubectl"'.format(verb))
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except BrokenPipeError:
+        pass
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# A fake kubeexec for the terminal benchmark: a "shell" that runs in the attached terminal without a cluster.
+#
+#   ln -s $PWD/fake/fake_kubeexec.py kubeexec
+#
+# Commands of the shell: cat <bytes> - prints that many bytes of text, exit - ends the session, other lines are
+# echoed back as an error. The prompt "$ " has no trailing newline, like the prompt of a real shell.
+#
+# Speaks both protocols of the relay: binary frames on stdin and raw output on stdout, or the json lines
+# ({"data": ..}) that s9k used before; the protocol is detected from the first message after the connect line.
+#
+# With -daemon <socket path> it runs each session that connects to the unix socket in a thread, like the
+# daemon mode of kubeexec, and exits when its parent process is gone.
+import json
+import os
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+# the api server sends the output of exec in frames of this size
+CHUNK_SIZE = 32768
+PROMPT = b"$ "
+LINE = b"0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789abcdefghijklm\r\n"
+
+
+class Terminal:
+    def __init__(self, stdin, write_output):
+        self.stdin = stdin
+        self.write_output = write_output
+        self.json_lines = False
+        self.line = b""
+
+    def write(self, data):
+        for pos in range(0, len(data), CHUNK_SIZE):
+            chunk = data[pos:pos + CHUNK_SIZE]
+            if self.json_lines:
+                chunk = json.dumps({"data": chunk.decode("utf-8")}).encode("utf-8") + b"\n"
+            self.write_output(chunk)
+
+    def read_input(self):
+        # the keyboard input of the next message, b"" for control messages, None at the end.
+        if self.json_lines:
+            line = self.stdin.readline()
+            if not line:
+                return None
+            return json.loads(line).get("data", "").encode("utf-8")
+        header = self.stdin.read(5)
+        if len(header) < 5:
+            return None
+        frame_type, length = struct.unpack(">cI", header)
+        payload = self.stdin.read(length)
+        return payload if frame_type == b"d" else b""
+
+    def run_command(self, line):
+        args = line.decode("utf-8", "replace").split()
+        if len(args) == 0:
+            return True
+        if args[0] == "exit":
+            return False
+        if args[0] == "cat" and len(args) == 2 and args[1].isdigit():
+            size = int(args[1])
+            self.write((LINE * (size // len(LINE) + 1))[:size])
+        else:
+            self.write("sh: {}: not found\r\n".format(args[0]).encode("utf-8"))
+        return True
+
+    def run(self):
+        self.stdin.readline()  # the connect command
+        # the browser sends the size of the terminal right after connecting.
+        self.json_lines = self.stdin.peek(1)[:1] == b"{"
+        self.write(PROMPT)
+        while True:
+            data = self.read_input()
+            if data is None:
+                return
+            for char in data:
+                char = bytes([char])
+                if char in (b"\r", b"\n"):
+                    self.write(b"\r\n")
+                    if not self.run_command(self.line):
+                        return
+                    self.line = b""
+                    self.write(PROMPT)
+                else:
+                    self.line += char
+                    self.write(char)
+
+
+class SessionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        Terminal(self.rfile, self.request.sendall).run()
+
+
+def exit_with_parent():
+    parent = os.getppid()
+    while os.getppid() == parent:
+        time.sleep(1)
+    os._exit(0)
+
+
+def serve(socket_path):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, SessionHandler)
+    server.daemon_threads = True
+    threading.Thread(target=exit_with_parent, daemon=True).start()
+    server.serve_forever()
+
+
+def write_stdout(data):
+    os.write(1, data)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == "-daemon":
+        serve(sys.argv[2])
+    else:
+        Terminal(sys.stdin.buffer, write_stdout).run()
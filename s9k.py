@@ -2,47 +2,221 @@
 import logging
 import shlex
 import argparse
+import array
+import html
 import os
+import json
+import time
+import codecs
+import datetime
+import collections
+import gzip
+import bisect
+import hashlib
+import heapq
+import itertools
+import math
+import mimetypes
+import operator
+import re
+import base64
+import tempfile
+import shutil
+import signal
+import struct
+import sys
+import http.client
+import urllib.parse
+import zlib
+
+import gevent
+import gevent.event
+import gevent.local
+import gevent.os
+import gevent.pool
+import gevent.server
+import gevent.socket
+import gevent.ssl
 
 from geventwebsocket import WebSocketError
 from geventwebsocket.handler import WebSocketHandler
 from gevent import pywsgi
 from gevent.select import select
-from gevent.subprocess import Popen, PIPE
+from gevent.subprocess import Popen, PIPE, DEVNULL, TimeoutExpired
+from gevent import monkey
+
+# bottle.request and bottle.response are thread locals; all requests run in greenlets of one thread,
+# so these have to be local to the greenlet, or concurrent requests overwrite each other's status and headers.
+monkey.patch_thread()
 
 import bottle
-from bottle.ext.websocket import GeventWebSocketServer
 from bottle.ext.websocket import websocket
 
 ERROR_MESSAGE_NO_DATA = "The server failed to get the requested command."
 NO_NAMESPACE = "-None"
 
-def read_static_file(file_name):
-    file_name = "./static-file/{}".format(file_name)
-    with open(file_name, "r") as file:
-        return file.read()
+class StaticFile:
+    # file types that are compressed already
+    no_gzip_extensions = (".png", ".jpg", ".jpeg", ".gif", ".ico", ".gz", ".woff", ".woff2")
+
+    def __init__(self, name, data):
+        self.data = data
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type == "application/javascript":
+            self.content_type += "; charset=UTF-8"
+        self.digest = hashlib.sha256(data).hexdigest()[:16]
+
+        self.gzip_data = None
+        if not name.endswith(self.no_gzip_extensions):
+            gzip_data = gzip.compress(data, 9, mtime=0)
+            if len(gzip_data) < len(data) * 0.9:
+                self.gzip_data = gzip_data
+
+
+class StaticFiles:
+    # the files in static-file/ are read once, at startup. Pages refer to them by urls that include
+    # the hash of the content, these can be cached by the browser forever.
+    def __init__(self):
+        self.files = {}
+        self.version = ""  # changes with the content of any file, the ETags of the pages include it
+
+    def load(self, static_dir):
+        for root, _, file_names in os.walk(static_dir):
+            for file_name in file_names:
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                with open(path, "rb") as file:
+                    self.files[name] = StaticFile(name, file.read())
+        self.version = hashlib.sha256("".join(sorted(static_file.digest for static_file in self.files.values())). \
+                                      encode("utf-8")).hexdigest()[:16]
+        logging.info("loaded %d static files", len(self.files))
+
+    def get(self, name):
+        return self.files.get(name)
+
+    def url(self, name):
+        static_file = self.files.get(name)
+        if static_file is None:
+            return "/static-file/" + name
+        return "/static/{}/{}".format(static_file.digest, name)
+
+    def make_response(self, name, immutable):
+        static_file = self.files.get(name)
+        if static_file is None:
+            logging.warning("static file not found: %s", name)
+            return bottle.HTTPResponse("404", 404)
+
+        etag = '"{}"'.format(static_file.digest)
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Content-Type": static_file.content_type}
+        if immutable:
+            headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            headers["Cache-Control"] = "no-cache"
 
-    print("!! 404 {}".format(file_name))
-    return "404"
+        if etag in bottle.request.headers.get("If-None-Match", ""):
+            return bottle.HTTPResponse(status=304, headers=headers)
+
+        body = static_file.data
+        if static_file.gzip_data is not None and "gzip" in bottle.request.headers.get("Accept-Encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            body = static_file.gzip_data
+        return bottle.HTTPResponse(body, 200, headers)
+
+
+static_files = StaticFiles()
+
+
+def read_static_file(file_name):
+    static_file = static_files.get(file_name)
+    if static_file is None:
+        logging.warning("static file not found: %s", file_name)
+        return "404"
+    return static_file.data.decode("utf-8")
 
 
 def get_style_sheet():
-    return read_static_file("css.css")
+    return '<link rel="stylesheet" href="{}"/>'.format(static_files.url("css.css"))
+
+
+def get_script(file_name):
+    return '<script src="{}"></script>'.format(static_files.url(file_name))
 
 
-def make_objectinstance_link(oname, namespaced, current_ns, title):
-    return f"<a href=\"/objectinstances/{oname}/{namespaced}/{current_ns}\">{title}</a>"
+def make_objectinstance_url(cluster, oname, namespaced, current_ns):
+    return f"{cluster.url_prefix}/objectinstances/{oname}/{namespaced}/{current_ns}"
 
 
-def make_objectinfo_link(screentype, otype, instancename, namespace, isnamespaced, current_ns, title, typeof="objectinfo"):
-    return f"<a href=\"/{typeof}/{screentype}/{otype}/{instancename}/{namespace}/{isnamespaced}/{current_ns}\">{title}</a>"
+def make_objectinstance_link(cluster, oname, namespaced, current_ns, title):
+    return f"<a href=\"{make_objectinstance_url(cluster, oname, namespaced, current_ns)}\">{title}</a>"
+
+
+def make_bulk_url(cluster, oname):
+    return "{}/bulk/{}".format(cluster.url_prefix, oname)
+
+
+def make_fanout_url(oname, namespaced, current_ns):
+    return f"/fanout/{oname}/{namespaced}/{current_ns}"
+
+
+def make_objectinfo_url(cluster, screentype, otype, instancename, namespace, isnamespaced, current_ns, \
+                        typeof="objectinfo"):
+    return f"{cluster.url_prefix}/{typeof}/{screentype}/{otype}/{instancename}/{namespace}/{isnamespaced}/{current_ns}"
+
+
+def make_objectinfo_link(cluster, screentype, otype, instancename, namespace, isnamespaced, current_ns, title, \
+                         typeof="objectinfo"):
+    url = make_objectinfo_url(cluster, screentype, otype, instancename, namespace, isnamespaced, current_ns, typeof)
+    return f"<a href=\"{url}\">{title}</a>"
 
 class Params:
     context_arg=""
+    # the default context, its pages have no context in their url (empty: the current context of the kubeconfig)
+    context_name = ""
+    # more contexts that are served, besides the default one
+    context_names = []
     kubeconfig_file = ""
+    kubeconfig_path = ""
+    # kubectl and the kubeconfig, without the context
     command_name = "kubectl"
+    backend_name = "kubectl"
+    # the fan-out list shows the clusters that answered within this number of seconds
+    fanout_timeout = 30
     cert_file = "cert.pem"
     key_file = "key.pem"
+    watch_cache = False
+    cache_idle_timeout = 300
+    cache_sync_timeout = 30
+    # results of read only kubectl commands are reused for this number of seconds, other verbs are never cached.
+    command_cache_ttl = {"get": 2, "describe": 5, "api-resources": 300}
+    command_cache_max_bytes = 64 * 1024 * 1024
+    # the api resources are discovered again after this number of seconds (0 - only at startup)
+    discovery_refresh_interval = 300
+    discovery_snapshot_dir = "~/.cache/s9k"
+    log_page_lines = 1000
+    # the log screen goes back this number of pages: page n reads (n + 1) * log_page_lines lines of the log.
+    max_log_pages = 10
+    # the aggregated log of a label selector shows the logs of at most this number of pods
+    max_log_pods = 20
+    list_page_size = 500
+    max_commands = 16
+    max_queued_commands = 64
+    # a live list page gets the changes of its objects every this number of seconds
+    live_update_interval = 1
+    # cpu and memory of pods and nodes are sampled every this number of seconds (0 - not sampled), the samples of
+    # this number of hours are kept.
+    usage_interval = 300
+    usage_history = 24
+    # generated pages are compressed with this zlib level (0 - not compressed), if they have at least this size
+    compress_level = 6
+    compress_min_size = 1024
+    # bulk apply/delete: objects per kubectl command, and batches that run at the same time
+    bulk_batch_size = 50
+    bulk_concurrency = 4
+    # kubectl processes that run longer than this number of seconds are killed.
+    command_timeouts = {"get": 60, "describe": 60, "api-resources": 60, "logs": 60, "apply": 300, "delete": 300}
+    default_command_timeout = 120
+    # read only commands, these are killed when the browser closes the connection before the result is there.
+    cancellable_verbs = {"get", "describe", "api-resources", "logs", "explain"}
 
     def __init__(self):
         pass
@@ -50,11 +224,62 @@ class Params:
     def set_config(self, kubeconfig_cmd, kubeconfig_dir, kubeconfig_context_name):
         self.command_name = kubeconfig_cmd
         if kubeconfig_dir != "":
-            self.kubeconfig_file = " --kubeconfig={}/config".format(kubeconfig_dir)
+            self.kubeconfig_path = "{}/config".format(kubeconfig_dir)
+            self.kubeconfig_file = " --kubeconfig={}".format(self.kubeconfig_path)
             self.command_name += self.kubeconfig_file
         if kubeconfig_context_name != "":
+            self.context_name = kubeconfig_context_name
             self.context_arg = " --context={}".format(kubeconfig_context_name)
-            self.command_name += self.context_arg
+
+    def set_contexts(self, context_names, fanout_timeout):
+        # comma separated names, or "all" for all contexts of the kubeconfig
+        if context_names == "all":
+            run_command = RunCommand(self.command_name + " config get-contexts -o name", True)
+            if run_command.exit_code != 0:
+                logging.error("can't list the kubeconfig contexts: %s", make_error_message(run_command))
+            self.context_names = [line.decode("utf-8").strip() for line in run_command.lines if line.strip()]
+        else:
+            self.context_names = [name.strip() for name in context_names.split(",") if name.strip()]
+        self.fanout_timeout = fanout_timeout
+
+    def set_backend(self, backend_name):
+        self.backend_name = backend_name
+
+    def set_cache_config(self, watch_cache, cache_idle_timeout, command_cache_mb):
+        self.watch_cache = watch_cache
+        self.cache_idle_timeout = cache_idle_timeout
+        self.command_cache_max_bytes = command_cache_mb * 1024 * 1024
+
+    def set_discovery_config(self, discovery_refresh_interval, discovery_snapshot_dir):
+        self.discovery_refresh_interval = discovery_refresh_interval
+        self.discovery_snapshot_dir = discovery_snapshot_dir
+
+    def set_page_sizes(self, log_page_lines, list_page_size, max_log_pages):
+        self.log_page_lines = log_page_lines
+        self.max_log_pages = max(1, max_log_pages)
+        self.list_page_size = list_page_size
+
+    def set_command_limits(self, max_commands, max_queued_commands):
+        self.max_commands = max(1, max_commands)
+        self.max_queued_commands = max_queued_commands
+
+    def set_compression(self, compress_level, compress_min_size):
+        self.compress_level = min(max(0, compress_level), 9)
+        self.compress_min_size = compress_min_size
+
+    def set_max_log_pods(self, max_log_pods):
+        self.max_log_pods = max(1, max_log_pods)
+
+    def set_live_update_interval(self, live_update_interval):
+        self.live_update_interval = max(0.1, live_update_interval)
+
+    def set_usage_sampling(self, usage_interval, usage_history):
+        self.usage_interval = max(0, usage_interval)
+        self.usage_history = max(1, usage_history)
+
+    def set_bulk_limits(self, bulk_batch_size, bulk_concurrency):
+        self.bulk_batch_size = max(1, bulk_batch_size)
+        self.bulk_concurrency = max(1, bulk_concurrency)
 
     def set_cert_files(self, key_file, cert_file):
         self.cert_file = cert_file
@@ -64,34 +289,663 @@ class Params:
 params = Params()
 
 
-def get_home_link(current_ns):
-    return f"<a href='/{current_ns}'>Home</a>&nbsp;"
+class Histogram:
+    # prometheus histogram; a list of bucket counts per combination of label values.
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}  # label values -> [bucket counts..., count of +Inf bucket], sum
+
+    def observe(self, value, *label_values):
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = [[0] * (len(self.buckets) + 1), 0]
+            self.values[label_values] = entry
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for label_values, (counts, total) in list(self.values.items()):
+            labels = format_metric_labels(self.label_names, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append('{}_bucket{{{}le="{}"}} {}'.format(self.name, labels + "," if labels else "", bound, cumulative))
+            cumulative += counts[-1]
+            lines.append('{}_bucket{{{}le="+Inf"}} {}'.format(self.name, labels + "," if labels else "", cumulative))
+            lines.append("{}_sum{{{}}} {}".format(self.name, labels, total))
+            lines.append("{}_count{{{}}} {}".format(self.name, labels, cumulative))
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}  # label values -> count
+
+    def inc(self, *label_values):
+        self.values[label_values] = self.values.get(label_values, 0) + 1
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} counter")
+        for label_values, value in list(self.values.items()):
+            lines.append("{}{{{}}} {}".format(self.name, format_metric_labels(self.label_names, label_values), value))
+
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+
+    def inc(self):
+        self.value += 1
+
+    def dec(self):
+        self.value -= 1
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} gauge")
+        lines.append(f"{self.name} {self.value}")
+
+
+def format_metric_labels(label_names, label_values):
+    return ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) \
+                    for name, value in zip(label_names, label_values))
+
+
+TIME_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+SIZE_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864]
+
+
+class Metrics:
+    # counters of the server, shown by /metrics. Updating them is a dictionary lookup and an addition,
+    # there are no locks as everything runs in the greenlets of one thread.
+    def __init__(self):
+        self.command_seconds = Histogram("s9k_command_seconds", "wall time of kubectl commands", \
+                                         ["route", "resource", "verb"], TIME_BUCKETS)
+        self.command_exit_codes = Counter("s9k_command_exit_codes_total", "exit codes of kubectl commands", \
+                                          ["verb", "code"])
+        self.commands_in_flight = Gauge("s9k_commands_in_flight", "kubectl commands that are running now")
+        self.commands_queued = Gauge("s9k_commands_queued", "kubectl commands that wait for a free slot")
+        self.commands_stopped = Counter("s9k_commands_stopped_total", \
+                                        "kubectl commands that were refused, timed out or cancelled", ["verb", "reason"])
+        self.api_request_seconds = Histogram("s9k_apiserver_request_seconds", "time of api server requests", \
+                                             ["route", "resource", "method", "code"], TIME_BUCKETS)
+        self.parse_seconds = Histogram("s9k_parse_seconds", "time of turning object lists into table rows", \
+                                       ["route", "resource"], TIME_BUCKETS)
+        self.render_seconds = Histogram("s9k_render_seconds", "time of rendering html tables", \
+                                        ["route", "resource"], TIME_BUCKETS)
+        self.request_seconds = Histogram("s9k_request_seconds", "time of http requests, until the response is sent", \
+                                         ["route", "resource"], TIME_BUCKETS)
+        self.response_bytes = Histogram("s9k_response_bytes", "size of http responses", ["route", "resource"], \
+                                        SIZE_BUCKETS)
+        self.websocket_sessions = Counter("s9k_websocket_sessions_total", "websocket sessions", ["route"])
+        self.websocket_sessions_open = Gauge("s9k_websocket_sessions_open", "websocket sessions that are open now")
+        # route and resource type of the request that the current greenlet works for
+        self.context = gevent.local.local()
+
+    def set_context(self, route, resource):
+        self.context.route = route
+        self.context.resource = resource
+
+    def get_context(self):
+        # greenlets that are not serving a request (prefetch, watch cache) are in the background route
+        return getattr(self.context, "route", "background"), getattr(self.context, "resource", "")
+
+    def observe(self, histogram, value):
+        histogram.observe(value, *self.get_context())
+
+    def timed_chunks(self, histogram, chunks):
+        # time spent in a generator of response chunks, without the time of sending the chunks.
+        total = 0
+        start = time.perf_counter()
+        try:
+            for chunk in chunks:
+                total += time.perf_counter() - start
+                yield chunk
+                start = time.perf_counter()
+            total += time.perf_counter() - start
+        finally:
+            self.observe(histogram, total)
+
+    def make_text(self):
+        lines = []
+        for metric in (self.command_seconds, self.command_exit_codes, self.commands_in_flight, self.commands_queued, \
+                       self.commands_stopped, self.api_request_seconds, \
+                       self.parse_seconds, self.render_seconds, self.request_seconds, self.response_bytes, \
+                       self.websocket_sessions, self.websocket_sessions_open):
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def get_home_link(cluster, current_ns):
+    if cluster.url_prefix == "":
+        return f"<a href='/{current_ns}'>Home</a>&nbsp;"
+    return f"<a href='{cluster.url_prefix}/{current_ns}'>Home</a>&nbsp;[{html.escape(cluster.context_name)}]&nbsp;"
+
+
+def get_command_args(command_line):
+    # the arguments after kubectl, the kubeconfig and the context
+    args = shlex.split(command_line)[len(shlex.split(params.command_name)):]
+    if len(args) != 0 and args[0].startswith("--context="):
+        return args[1:]
+    return args
+
+
+class CommandCache:
+    # results of read only commands, keyed by command line and standard input.
+    # Identical commands that are started while the first one is still running wait for its result,
+    # instead of running kubectl once more.
+    def __init__(self):
+        self.entries = collections.OrderedDict()  # key -> (expiration time, resource, result)
+        self.in_flight = {}  # key -> gevent.event.AsyncResult
+        self.invalidated = set()  # keys of running commands that were invalidated
+        self.size = 0
+        # in a worker process of --workers mode: the cache process of the master, shared by all workers.
+        self.shared = None
+
+    def run(self, command_line, pipe_as_input, run_func):
+        verb, resource = CommandCache.parse_command(command_line)
+        ttl = params.command_cache_ttl.get(verb, 0)
+        if ttl == 0 or params.command_cache_max_bytes == 0:
+            return run_func(command_line, pipe_as_input)
+        if self.shared is not None:
+            return self.shared.run(command_line, pipe_as_input, run_func)
+
+        key = (command_line, pipe_as_input)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self.entries.move_to_end(key)
+                return entry[2]
+            self.remove(key)
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            command_scheduler.join(key)
+            return pending.get()
+
+        pending = gevent.event.AsyncResult()
+        self.in_flight[key] = pending
+        try:
+            result = run_func(command_line, pipe_as_input)
+        except Exception as exc:
+            del self.in_flight[key]
+            self.invalidated.discard(key)
+            pending.set_exception(exc)
+            raise
+        del self.in_flight[key]
+        pending.set(result)
+
+        # the result may be outdated if the object was changed while the command was running.
+        if key in self.invalidated:
+            self.invalidated.discard(key)
+        elif result[0] == 0:
+            self.add(key, time.time() + ttl, resource, result)
+        return result
+
+    def add(self, key, expires, resource, result):
+        result_size = len(result[1]) + len(result[2])
+        if result_size > params.command_cache_max_bytes:
+            return
+        self.entries[key] = (expires, resource, result)
+        self.size += result_size
+        while self.size > params.command_cache_max_bytes:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        _, _, result = self.entries.pop(key)
+        self.size -= len(result[1]) + len(result[2])
+
+    def invalidate(self, resource=None):
+        # drop the cached results for a resource type, or everything if the type is not known.
+        if self.shared is not None:
+            self.shared.invalidate(resource)
+            return
+        for key, entry in list(self.entries.items()):
+            if resource is None or entry[1] == resource:
+                self.remove(key)
+        for key in self.in_flight:
+            if resource is None or CommandCache.parse_command(key[0])[1] == resource:
+                self.invalidated.add(key)
+
+    @staticmethod
+    def parse_command(command_line):
+        # returns the kubectl verb and the resource type argument after it (if any)
+        args = get_command_args(command_line)
+        if len(args) == 0:
+            return None, None
+        # raw requests are used by the object cache, these must not return stale data.
+        if "--raw" in args or "--watch" in args or "-w" in args:
+            return None, None
+        for arg in args[1:]:
+            if not arg.startswith("-"):
+                return args[0], arg
+        return args[0], None
+
+
+command_cache = CommandCache()
+
+
+def send_frames(sock, *frames):
+    # messages between the workers and the cache process: each part is prefixed by its length
+    sock.sendall(b"".join(struct.pack(">I", len(frame)) + frame for frame in frames))
+
+
+def recv_frame(sock_file):
+    header = sock_file.read(4)
+    if len(header) < 4:
+        raise EOFError("connection closed")
+    size = struct.unpack(">I", header)[0]
+    frame = sock_file.read(size)
+    if len(frame) < size:
+        raise EOFError("connection closed")
+    return frame
+
+
+class SharedCacheServer:
+    # runs in the master process of --workers mode: the workers send their read only commands here,
+    # so that the command cache and the single flight of identical commands covers all workers.
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.server = None
+
+    def start(self):
+        listener = gevent.socket.socket(gevent.socket.AF_UNIX, gevent.socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+        listener.listen(128)
+        self.server = gevent.server.StreamServer(listener, self.handle)
+        self.server.start()
+
+    def close(self):
+        self.server.close()
+
+    def handle(self, sock, _address):
+        sock_file = sock.makefile("rb")
+        try:
+            while True:
+                request = json.loads(recv_frame(sock_file))
+                body = recv_frame(sock_file)
+                if request["op"] == "run":
+                    command_line = request["command"]
+                    # only kubectl is run on behalf of the workers.
+                    if not command_line.startswith(params.command_name):
+                        send_frames(sock, json.dumps({"error": "not a kubectl command"}).encode("utf-8"))
+                        continue
+                    pipe_as_input = body.decode("utf-8") if request["has_input"] else None
+                    # the worker closes the connection if its browser went away.
+                    command_scheduler.set_request(request["priority"], sock)
+                    try:
+                        exit_code, output, error_out = command_cache.run(command_line, pipe_as_input, RunCommand.execute)
+                    except bottle.HTTPError as err:
+                        send_frames(sock, json.dumps({"error": err.body, "status": err.status_code}).encode("utf-8"))
+                        continue
+                    send_frames(sock, json.dumps({"exit_code": exit_code}).encode("utf-8"), output, error_out)
+                else:
+                    command_cache.invalidate(request.get("resource"))
+                    send_frames(sock, b"{}")
+        except (EOFError, OSError, ValueError, KeyError):
+            pass
+        finally:
+            sock_file.close()
+            sock.close()
+
+
+class SharedCacheClient:
+    # the command cache of a worker process; keeps a pool of idle connections to the cache process.
+    # if the cache process can't be reached then the command is run by the worker itself.
+    max_idle_connections = 16
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.idle_connections = []
+
+    def connect(self):
+        sock = gevent.socket.socket(gevent.socket.AF_UNIX, gevent.socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        return sock, sock.makefile("rb")
+
+    @staticmethod
+    def close_connection(connection):
+        connection[1].close()
+        connection[0].close()
+
+    def call(self, request, body, num_frames):
+        # returns the response header and the frames that follow it, or None if the request failed.
+        while True:
+            reused = len(self.idle_connections) != 0
+            connection = self.idle_connections.pop() if reused else None
+            try:
+                if connection is None:
+                    connection = self.connect()
+                send_frames(connection[0], json.dumps(request).encode("utf-8"), body)
+                if not command_scheduler.wait_for_reply(connection[0]):
+                    self.close_connection(connection)
+                    raise CommandScheduler.make_error("the request was cancelled")
+                header = json.loads(recv_frame(connection[1]))
+                if "status" in header:
+                    self.idle_connections.append(connection)
+                    raise bottle.HTTPError(header["status"], header["error"], **{"Retry-After": "1"})
+                if "error" in header:
+                    logging.error("shared cache error: %s", header["error"])
+                    self.close_connection(connection)
+                    return None, None
+                frames = [recv_frame(connection[1]) for _ in range(num_frames)]
+                break
+            except (EOFError, OSError, ValueError) as err:
+                if connection is not None:
+                    self.close_connection(connection)
+                if not reused:
+                    logging.error("shared cache failed: %s", err)
+                    return None, None
+
+        if len(self.idle_connections) < self.max_idle_connections:
+            self.idle_connections.append(connection)
+        else:
+            self.close_connection(connection)
+        return header, frames
+
+    def run(self, command_line, pipe_as_input, run_func):
+        request = {"op": "run", "command": command_line, "has_input": pipe_as_input is not None, \
+                   "priority": command_scheduler.get_request()[0]}
+        header, frames = self.call(request, (pipe_as_input or "").encode("utf-8"), 2)
+        if header is None:
+            return run_func(command_line, pipe_as_input)
+        return header["exit_code"], frames[0], frames[1]
+
+    def invalidate(self, resource):
+        self.call({"op": "invalidate", "resource": resource}, b"", 0)
+
+
+class CommandJob:
+    def __init__(self, key, verb, priority, peer):
+        self.key = key
+        self.verb = verb
+        self.priority = priority
+        # sockets of the clients that wait for the result; nobody is watched for background work.
+        self.peers = [peer] if peer is not None else []
+        self.detached = peer is None or verb not in params.cancellable_verbs
+        self.entry = None
+        self.admitted = gevent.event.AsyncResult()
+        self.process = None
+        self.cancelled = False
+
+
+class CommandScheduler:
+    # runs the kubectl processes, at most params.max_commands at the same time. The others wait in a priority
+    # queue: detail pages come before lists, lists before background work. If too many commands are waiting then
+    # the request with the lowest priority gets a 503 at once. Processes that run longer than the deadline of
+    # their verb are killed, and so are read only commands of requests that were abandoned by the browser.
+    background_priority = 3
+    cancel_check_interval = 1
+    stream_chunk_size = 65536
+
+    def __init__(self):
+        self.running = 0
+        self.queue = []  # heap of [priority, sequence number, job]
+        self.sequence = 0
+        self.jobs = {}  # (command line, standard input) -> job
+        # priority and client socket of the request that the current greenlet works for
+        self.context = gevent.local.local()
+
+    def set_request(self, priority, peer):
+        # commands of the same priority run in the order of their requests, so that a request that already
+        # ran some of its commands is not refused in favour of a newer one.
+        self.context.priority = priority
+        self.context.peer = peer
+        self.context.sequence = self.next_sequence()
+
+    def get_request(self):
+        return getattr(self.context, "priority", self.background_priority), getattr(self.context, "peer", None)
+
+    def next_sequence(self):
+        self.sequence += 1
+        return self.sequence
+
+    @staticmethod
+    def make_error(message):
+        return bottle.HTTPError(503, message, **{"Retry-After": "1"})
+
+    def run(self, command_line, pipe_as_input, verb, consume_output=None):
+        key = (command_line, pipe_as_input)
+        priority, peer = self.get_request()
+        job = CommandJob(key, verb, priority, peer)
+        self.jobs[key] = job
+        watcher = None if job.detached else gevent.spawn(self.watch_peers, job)
+        try:
+            self.admit(job)
+            try:
+                if job.cancelled:
+                    raise self.make_error("the request was cancelled")
+                return self.run_process(job, command_line, pipe_as_input, consume_output)
+            finally:
+                self.release()
+        finally:
+            if watcher is not None:
+                watcher.kill(block=False)
+            if self.jobs.get(key) is job:
+                del self.jobs[key]
+
+    def join(self, key):
+        # another request waits for the result of the same command.
+        job = self.jobs.get(key)
+        if job is None or job.detached:
+            return
+        peer = self.get_request()[1]
+        if peer is None:
+            job.detached = True
+        else:
+            job.peers.append(peer)
+
+    def admit(self, job):
+        if self.running < params.max_commands:
+            self.running += 1
+            return
+
+        if len(self.queue) >= params.max_queued_commands:
+            # refuse the request with the lowest priority, background work can't be refused.
+            candidates = [entry for entry in self.queue if entry[0] < self.background_priority]
+            lowest = max(candidates) if len(candidates) != 0 else None
+            if job.priority >= self.background_priority:
+                pass
+            elif lowest is None or lowest[0] <= job.priority:
+                metrics.commands_stopped.inc(job.verb, "refused")
+                raise self.make_error("too many kubectl commands are waiting, try again later")
+            else:
+                self.remove_queued(lowest[2])
+                metrics.commands_stopped.inc(lowest[2].verb, "refused")
+                lowest[2].admitted.set_exception(self.make_error("too many kubectl commands are waiting, try again later"))
+
+        job.entry = [job.priority, getattr(self.context, "sequence", None) or self.next_sequence(), job]
+        heapq.heappush(self.queue, job.entry)
+        metrics.commands_queued.inc()
+        try:
+            job.admitted.get()
+        except BaseException:
+            if job.entry in self.queue:
+                self.remove_queued(job)
+            elif job.admitted.successful():
+                self.release()
+            raise
+
+    def remove_queued(self, job):
+        self.queue.remove(job.entry)
+        heapq.heapify(self.queue)
+        metrics.commands_queued.dec()
+
+    def release(self):
+        # the slot goes to the first waiting command
+        if len(self.queue) != 0:
+            job = heapq.heappop(self.queue)[2]
+            metrics.commands_queued.dec()
+            job.admitted.set(True)
+        else:
+            self.running -= 1
+
+    def cancel(self, job):
+        job.cancelled = True
+        metrics.commands_stopped.inc(job.verb, "cancelled")
+        if job.entry in self.queue:
+            self.remove_queued(job)
+            job.admitted.set_exception(self.make_error("the request was cancelled"))
+        elif job.process is not None:
+            logging.info("killing command, the client is gone: %s", job.key[0])
+            job.process.kill()
+
+    def run_process(self, job, command_line, pipe_as_input, consume_output):
+        timeout = params.command_timeouts.get(job.verb, params.default_command_timeout)
+        metrics.commands_in_flight.inc()
+        try:
+            if pipe_as_input is None:
+                job.process = Popen(shlex.split(command_line), stdout=PIPE, stderr=PIPE)
+                if consume_output is not None:
+                    return self.stream_output(job, command_line, timeout, consume_output)
+            else:
+                job.process = Popen(shlex.split(command_line), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+                pipe_as_input = pipe_as_input.encode("utf-8")
+            try:
+                (output, error_out) = job.process.communicate(input=pipe_as_input, timeout=timeout)
+            except TimeoutExpired:
+                logging.error("command timed out after %d seconds: %s", timeout, command_line)
+                metrics.commands_stopped.inc(job.verb, "timeout")
+                job.process.kill()
+                (output, error_out) = job.process.communicate()
+                error_out += "command timed out after {} seconds".format(timeout).encode("utf-8")
+            exit_code = job.process.wait()
+        finally:
+            metrics.commands_in_flight.dec()
+        return exit_code, output, error_out
+
+    def stream_output(self, job, command_line, timeout, consume_output):
+        # the standard output goes to consume_output in chunks while it arrives, it is not kept.
+        error_reader = gevent.spawn(job.process.stderr.read)
+        try:
+            with gevent.Timeout(timeout, TimeoutExpired(command_line, timeout)):
+                while True:
+                    data = job.process.stdout.read1(self.stream_chunk_size)
+                    if data == b"":
+                        break
+                    consume_output(data)
+                error_out = error_reader.get()
+        except TimeoutExpired:
+            logging.error("command timed out after %d seconds: %s", timeout, command_line)
+            metrics.commands_stopped.inc(job.verb, "timeout")
+            job.process.kill()
+            error_out = error_reader.get() + "command timed out after {} seconds".format(timeout).encode("utf-8")
+        except BaseException:
+            job.process.kill()
+            job.process.wait()
+            error_reader.kill()
+            raise
+        return job.process.wait(), b"", error_out
+
+    def watch_peers(self, job):
+        # the command is cancelled once all clients that wait for it have closed their connection.
+        peers = {}
+        try:
+            while not job.detached:
+                for peer in job.peers:
+                    if peer not in peers:
+                        peers[peer] = gevent.socket.socket(fileno=os.dup(peer.fileno()))
+                readable, _, _ = select(list(peers.values()), [], [], self.cancel_check_interval)
+                closed = [peer for peer, dup in peers.items() if dup in readable and CommandScheduler.is_closed(dup)]
+                for peer in closed:
+                    job.peers.remove(peer)
+                    peers.pop(peer).close()
+                if len(job.peers) == 0:
+                    self.cancel(job)
+                    return
+                if len(closed) < len(readable):
+                    # the next request of a keep-alive connection, or tls data: look again later.
+                    gevent.sleep(self.cancel_check_interval)
+        except OSError:
+            pass
+        finally:
+            for dup in peers.values():
+                dup.close()
+
+    def wait_for_reply(self, sock):
+        # waits until sock is readable; returns False if the client of the current request went away before.
+        peer = self.get_request()[1]
+        if peer is None:
+            return True
+        peer_dup = gevent.socket.socket(fileno=os.dup(peer.fileno()))
+        try:
+            while True:
+                readable, _, _ = select([sock, peer_dup], [], [])
+                if sock in readable:
+                    return True
+                if CommandScheduler.is_closed(peer_dup):
+                    return False
+                select([sock], [], [], self.cancel_check_interval)
+        finally:
+            peer_dup.close()
+
+    @staticmethod
+    def is_closed(sock):
+        # a readable socket is closed if there is no more data, or if the peer has sent its FIN after the data.
+        try:
+            if sock.recv(1, gevent.socket.MSG_PEEK) == b"":
+                return True
+            if sock.family in (gevent.socket.AF_INET, gevent.socket.AF_INET6) and hasattr(gevent.socket, "TCP_INFO"):
+                tcp_close_wait = 8
+                return sock.getsockopt(gevent.socket.IPPROTO_TCP, gevent.socket.TCP_INFO, 1)[0] == tcp_close_wait
+        except OSError:
+            return True
+        return False
+
+
+command_scheduler = CommandScheduler()
+
+
+def bind_to_request(func):
+    # gevent.local values are not inherited: func, called in another greenlet, works with the priority, client
+    # and metrics labels of the request of the current greenlet, not as background work.
+    priority, peer = command_scheduler.get_request()
+    route, resource = metrics.get_context()
+
+    def run(*args):
+        command_scheduler.set_request(priority, peer)
+        metrics.set_context(route, resource)
+        return func(*args)
+
+    return run
+
+
+def spawn_for_request(func, *args):
+    return gevent.spawn(bind_to_request(func), *args)
 
 
 class RunCommand:
-    def __init__(self, command_line, split_lines=True, pipe_as_input=None):
+    # with consume_output the standard output is passed to consume_output(data) while it arrives, instead of being
+    # kept; such a command gets no standard input, and it is not cached.
+    def __init__(self, command_line, split_lines=True, pipe_as_input=None, consume_output=None):
         self.command_line = command_line
         self.lines = []
         self.exit_code = 0
-        self.run(command_line, split_lines, pipe_as_input)
+        self.run(command_line, split_lines, pipe_as_input, consume_output)
 
-    def run(self, command_line, split_lines, pipe_as_input):
+    def run(self, command_line, split_lines, pipe_as_input, consume_output):
 
         logging.info("command line: %s", command_line)
 
-        if pipe_as_input is None:
-            process = Popen(shlex.split(command_line), \
-                            stdout=PIPE, stderr=PIPE)
-
-            (output, error_out) = process.communicate()
-            self.exit_code = process.wait()
+        if consume_output is None:
+            self.exit_code, output, error_out = command_cache.run(command_line, pipe_as_input, RunCommand.execute)
         else:
-            process = Popen(shlex.split(command_line), \
-                            stdin=PIPE, stdout=PIPE, stderr=PIPE)
-
-            (output, error_out) = process.communicate(input=pipe_as_input.encode("utf-8"))
-            self.exit_code = process.wait()
+            self.exit_code, output, error_out = RunCommand.execute(command_line, None, consume_output)
 
+        self.data = output
         if split_lines:
             self.lines = output.splitlines()
         else:
@@ -101,6 +955,18 @@ class RunCommand:
 
         return self.exit_code
 
+    @staticmethod
+    def execute(command_line, pipe_as_input, consume_output=None):
+        verb = get_command_args(command_line)[0:1] or [""]
+        start = time.perf_counter()
+        try:
+            exit_code, output, error_out = command_scheduler.run(command_line, pipe_as_input, verb[0], consume_output)
+        finally:
+            route, resource = metrics.get_context()
+            metrics.command_seconds.observe(time.perf_counter() - start, route, resource, verb[0])
+        metrics.command_exit_codes.inc(verb[0], exit_code)
+        return exit_code, output, error_out
+
     def result(self):
         return self.exit_code, self.lines
 
@@ -117,101 +983,625 @@ def make_error_message(command):
     return return_value
 
 
-class TextCommand:
-    def __init__(self, command):
-        self.token_start = []
-        self.token_end = []
+def make_list_document(objects):
+    # the input of kubectl -f - for many objects
+    return json.dumps({"apiVersion": "v1", "kind": "List", "items": objects})
 
-        self.titles = []
-        self.parsed_lines = []
 
-        self.parse_header(command.lines[0].decode("utf-8"))
-        self.parse_fields(command)
+def match_bulk_results(objects, run_command):
+    # kubectl -o name prints <kind>/<name> for each object that it did; the others failed, their error is the
+    # part of the error output that has their name in quotes (kubectl goes on after a failed object).
+    done = collections.Counter(line.decode("utf-8").split()[0].rsplit("/", 1)[-1] for line in run_command.lines \
+                               if line.strip())
+    error_lines = run_command.error_out.decode("utf-8", "replace").splitlines()
+    results = []
+    for obj in objects:
+        name = obj["metadata"]["name"]
+        if done[name] > 0:
+            done[name] -= 1
+            results.append((obj, None))
+        else:
+            quoted = '"{}"'.format(name)
+            results.append((obj, "\n".join(line for line in error_lines if quoted in line) or \
+                            make_error_message(run_command)))
+    return results
 
-    def parse_header(self, header_line):
 
-        # here it becomes a bit hacky
-        header_line = header_line.replace("CREATED AT", "CREATED_AT")
-        header_line = header_line.replace("NOMINATED NODE", "NOMINATED_NODE")
-        header_line = header_line.replace("READINESS GATES", "READINESS_GATES")
+class CommandStream:
+    # output of a long running command, read as it arrives.
+    def __init__(self, command_line):
+        logging.info("stream command line: %s", command_line)
+        self.process = Popen(shlex.split(command_line), stdout=PIPE, stderr=DEVNULL)
 
-        self.titles = header_line.split()
-        start = 0
-        for title_pos in range(len(self.titles)):
+    def read1(self, size):
+        return self.process.stdout.read1(size)
 
-            word_pos = header_line.find(self.titles[title_pos], start)
-            start = word_pos + len(self.titles[title_pos])
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
 
-            self.token_start.append(word_pos)
-            self.token_end.append(-1)
 
-            if title_pos > 0:
-                self.token_end[title_pos - 1] = word_pos
+class KubectlBackend:
+    # gets everything by running kubectl
+    def __init__(self, cluster):
+        self.cluster = cluster
 
-    def parse_fields(self, command):
-        for line_pos in range(len(command.lines)):
-            if line_pos > 0:
-                line = command.lines[line_pos].decode("utf-8")
-                line_vals = []
-                for field_pos in range(len(self.token_start)):
-                    tstart = self.token_start[field_pos]
-                    tend = self.token_end[field_pos]
-                    if tend != -1:
-                        field_value = line[tstart: tend]
-                    else:
-                        field_value = line[tstart:]
-                    line_vals.append(field_value.strip())
-                self.parsed_lines.append(line_vals)
+    def get_api_resources(self):
+        # kubectl api-resources has no json output, the discovery documents are read instead.
+        return get_api_resource_table(self.get_json)
 
-    def dump(self):
-        logging.info("header: %s", self.titles)
-        for line in self.parsed_lines:
-            logging.info("line: %s", line)
+    def get_json(self, path):
+        output, error_message = self.get_raw(path)
+        if error_message is not None:
+            return None, error_message
+        return json.loads(output), None
 
+    def list_objects(self, oname, namespaced, current_ns, field_sel, label_sel):
+        cli_param = ""
+        if namespaced:
+            if current_ns == NO_NAMESPACE:
+                cli_param = "-A"
+            else:
+                cli_param = f"-n {current_ns}"
+
+        if field_sel:
+            cli_param += " --field-selector {}".format(field_sel)
+        if label_sel:
+            cli_param += " --selector {}".format(label_sel)
+
+        cmd = "{} get {} -o json {}".format(self.cluster.command_name, oname, cli_param)
+        columns = self.cluster.api_resources.get_list_columns(oname, namespaced and current_ns == NO_NAMESPACE)
+        object_list, error_message = KubectlBackend.run_list_command(cmd, columns)
+        if error_message is not None:
+            return None, None, error_message
+        return columns.titles, object_list.items, None
+
+    def list_objects_page(self, oname, namespaced, current_ns, field_sel, label_sel, limit, continue_token):
+        # kubectl get --chunk-size doesn't show the continue token, need a raw request for that.
+        api_path = self.cluster.api_resources.get_api_path(oname)
+        if api_path is None:
+            titles, parsed_lines, error_message = self.list_objects(oname, namespaced, current_ns, field_sel, label_sel)
+            return titles, parsed_lines, "", error_message
+
+        path = make_list_path(api_path, namespaced, current_ns) + "?" + \
+            make_list_query(field_sel, label_sel, limit, continue_token)
+        columns = self.cluster.api_resources.get_list_columns(oname, namespaced and current_ns == NO_NAMESPACE)
+        object_list, error_message = KubectlBackend.run_list_command( \
+            "{} get --raw '{}'".format(self.cluster.command_name, path), columns)
+        if error_message is not None:
+            return None, None, "", error_message
+        return columns.titles, object_list.items, \
+            object_list.fields.get("metadata", {}).get("continue", ""), None
 
-class ClientGoCmd:
-    def __init__(self, entity, is_namespaced, column_defs):
-        self.titles = []
-        self.parsed_lines = []
+    @staticmethod
+    def run_list_command(cmd, columns):
+        # the list is parsed while kubectl writes it, its output is never in memory as a whole.
+        # returns the JsonListStream and an error message
+        object_list = JsonListStream(columns.make_line)
+        parse_seconds = [0]
+
+        def feed(data):
+            start = time.perf_counter()
+            object_list.feed(data)
+            parse_seconds[0] += time.perf_counter() - start
+
+        run_command = RunCommand(cmd, split_lines=False, consume_output=feed)
+        if run_command.exit_code != 0:
+            return None, make_error_message(run_command)
+        object_list.close()
+        metrics.observe(metrics.parse_seconds, parse_seconds[0])
+        if object_list.error is not None:
+            return None, object_list.error
+        if len(object_list.items) == 0:
+            return None, "No resources found"
+        return object_list, None
+
+    def get_object_text(self, request_def, otype, oname, namespace):
+        cmd = ObjectDetailScreenBase.make_kubectl_cmd(self.cluster.command_name, request_def, namespace, otype, oname)
+        run_command = RunCommand(cmd, False)
+        if run_command.exit_code == 0 and run_command.output != "":
+            return cmd, run_command.output, None
+        return cmd, None, make_error_message(run_command)
 
-        self.process(entity, is_namespaced, column_defs)
+    def make_object_source(self, otype, oname, namespace):
+        # the command that gets the object, shown on its detail page
+        nspace = ""
+        if namespace != 'None':
+            nspace = '-n {}'.format(namespace)
+        return "{} get {} {} {}".format(self.cluster.command_name, otype, oname, nspace)
+
+    def get_object_json(self, otype, oname, namespace):
+        # returns the command, the object and an error message
+        source = self.make_object_source(otype, oname, namespace)
+        run_command = RunCommand(source + " -o json", split_lines=False)
+        if run_command.exit_code != 0:
+            return source, None, make_error_message(run_command)
+        try:
+            return source, json.loads(run_command.data), None
+        except ValueError as err:
+            return source, None, "can't parse the output of kubectl: {}".format(err)
+
+    def get_objects_json(self, otype, objects):
+        # all objects of a bulk edit with one kubectl get; returns the objects that were found and an error message.
+        cmd = "{} get -f - -o json".format(self.cluster.command_name)
+        run_command = RunCommand(cmd, False, pipe_as_input=make_list_document(objects))
+        error_message = make_error_message(run_command) if run_command.exit_code != 0 else None
+        if run_command.output.strip() == "":
+            return [], error_message
+        try:
+            obj = json.loads(run_command.output)
+        except ValueError as err:
+            return [], "can't parse the output of kubectl: {}".format(err)
+        # a single object is not in a list
+        return obj["items"] if obj.get("kind") == "List" else [obj], error_message
 
-    def process(self, entity, is_namespaced, column_defs):
-        if is_namespaced:
-            command_text = "{} get {} -A".format(params.command_name, entity)
-        else:
-            command_text = "{} get {}".format(params.command_name, entity)
+    @staticmethod
+    def get_bulk_batch_size(action):
+        return params.bulk_batch_size
+
+    def run_bulk_batch(self, action, resource, objects, dry_run):
+        # one kubectl command for the whole batch; returns (object, error message or None) for each object.
+        cmd = "{} {} -f - -o name".format(self.cluster.command_name, action)
+        if dry_run:
+            cmd += " --dry-run=server"
+        run_command = RunCommand(cmd, True, pipe_as_input=make_list_document(objects))
+        return match_bulk_results(objects, run_command)
+
+    def get_raw(self, path):
+        cmd = "{} get --raw '{}'".format(self.cluster.command_name, path)
+        run_command = RunCommand(cmd, False)
+        if run_command.exit_code != 0:
+            return None, make_error_message(run_command)
+        return run_command.output, None
 
-        if column_defs is not None:
-            command_text += ClientGoCmd.make_column_filter(column_defs)
-            command = RunCommand(command_text)
+    def open_watch(self, path):
+        return CommandStream("{} get --raw '{}'".format(self.cluster.command_name, path))
 
-            self.titles = []
-            for entry in column_defs:
-                self.titles.append(entry[0])
+    def open_logs(self, otype, oname, namespace, tail_lines, follow, timestamps=False):
+        nspace = ""
+        if namespace != 'None':
+            nspace = '-n {}'.format(namespace)
+        cmd = "{} logs {}/{} {} --tail={}".format(self.cluster.command_name, otype, oname, nspace, tail_lines)
+        if follow:
+            cmd += " -f"
+        if timestamps:
+            cmd += " --timestamps"
+        return CommandStream(cmd)
+
+
+class ApiResponseStream:
+    # body of a streaming api server response; the connection is not reused.
+    def __init__(self, connection, response):
+        self.connection = connection
+        self.response = response
+
+    def read1(self, size):
+        if self.response is None or self.response.status != 200:
+            return b""
+        try:
+            return self.response.read1(size)
+        except (http.client.HTTPException, OSError):
+            return b""
+
+    def close(self):
+        self.connection.close()
+
+
+class ApiClient:
+    # http client for the api server; keeps a pool of idle keep-alive connections.
+    # the connections use gevent sockets, so a request only blocks the calling greenlet.
+    max_idle_connections = 16
+    request_timeout = 60
+
+    def __init__(self, server, ssl_context, headers):
+        url = urllib.parse.urlsplit(server)
+        self.server = server
+        self.is_https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip("/")
+        self.ssl_context = ssl_context
+        self.headers = headers
+        self.idle_connections = []
+
+    def make_connection(self, timeout):
+        if self.is_https:
+            connection = http.client.HTTPSConnection(self.host, self.port, timeout=timeout, context=self.ssl_context)
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        connection._create_connection = gevent.socket.create_connection
+        return connection
+
+    def send(self, connection, method, path, headers, body):
+        all_headers = dict(self.headers)
+        if headers is not None:
+            all_headers.update(headers)
+        connection.request(method, self.base_path + path, body=body, headers=all_headers)
+        return connection.getresponse()
+
+    def request(self, method, path, headers=None, body=None):
+        status, data, _ = self.request_with_headers(method, path, headers, body)
+        return status, data
+
+    def request_with_headers(self, method, path, headers=None, body=None):
+        # returns the status, the body and the headers of the response
+        logging.info("api request: %s %s", method, path)
+        start = time.perf_counter()
+        status, data, response_headers = self.send_request(method, path, headers, body)
+        route, resource = metrics.get_context()
+        metrics.api_request_seconds.observe(time.perf_counter() - start, route, resource, method, status)
+        return status, data, response_headers
+
+    def send_request(self, method, path, headers, body):
+
+        # an idle connection may have been closed by the server, then try again with a new one.
+        while True:
+            reused = len(self.idle_connections) != 0
+            if reused:
+                connection = self.idle_connections.pop()
+            else:
+                connection = self.make_connection(self.request_timeout)
+            try:
+                response = self.send(connection, method, path, headers, body)
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError) as err:
+                connection.close()
+                if not reused:
+                    return 0, str(err).encode("utf-8"), {}
 
-            self.parsed_lines = []
-            for line in command.lines:
-                self.parsed_lines.append(line.split(","))
+        if len(self.idle_connections) < self.max_idle_connections and not response.will_close:
+            self.idle_connections.append(connection)
         else:
-            command_text += " -o wide "
-            command = RunCommand(command_text)
-            text_command = TextCommand(command)
-            self.titles = text_command.titles
-            self.parsed_lines = text_command.parsed_lines
+            connection.close()
+        return response.status, data, response.headers
+
+    def close_idle_connections(self):
+        while len(self.idle_connections) != 0:
+            self.idle_connections.pop().close()
+
+    def get_json(self, path, headers=None):
+        status, data = self.request("GET", path, headers)
+        if status != 200:
+            return None, "GET {} failed. status: {} {}".format(path, status, data.decode("utf-8", "replace"))
+        return json.loads(data), None
+
+    def get_json_if_changed(self, path, cached):
+        # conditional GET with the ETag of an earlier response, cached is (etag, object) or None.
+        # returns the object, the (etag, object) to keep for the next request and an error message.
+        headers = {"If-None-Match": cached[0]} if cached is not None else None
+        status, data, response_headers = self.request_with_headers("GET", path, headers)
+        if status == 304 and cached is not None:
+            return cached[1], cached, None
+        if status != 200:
+            return None, None, "GET {} failed. status: {} {}".format(path, status, data.decode("utf-8", "replace"))
+        obj = json.loads(data)
+        etag = response_headers.get("ETag")
+        return obj, (etag, obj) if etag else None, None
+
+    def stream(self, path):
+        logging.info("api stream: %s", path)
+        connection = self.make_connection(None)
+        try:
+            response = self.send(connection, "GET", path, None, None)
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            return ApiResponseStream(connection, None)
+        return ApiResponseStream(connection, response)
 
     @staticmethod
-    def make_column_filter(column_defs):
-        command_text = ' -o go-template --template=\'{{range .items}}{{printf "'
+    def from_kubeconfig(context_name):
+        kubeconfig, kubeconfig_dir = load_kubeconfig()
+        if kubeconfig is None:
+            return None
+
+        context_name = context_name or kubeconfig.get("current-context")
+        context = find_named_entry(kubeconfig.get("contexts"), context_name, "context")
+        if context is None:
+            logging.error("kubeconfig context %s not found", context_name)
+            return None
+        cluster = find_named_entry(kubeconfig.get("clusters"), context.get("cluster"), "cluster")
+        user = find_named_entry(kubeconfig.get("users"), context.get("user"), "user") or {}
+        if cluster is None:
+            logging.error("kubeconfig cluster %s not found", context.get("cluster"))
+            return None
+
+        if "exec" in user or "auth-provider" in user:
+            logging.error("credential plugins are not supported by the api backend, use the kubectl backend")
+            return None
+
+        headers = {"User-Agent": "s9k", "Accept": "application/json"}
+        token = user.get("token")
+        if user.get("tokenFile"):
+            with open(resolve_kubeconfig_path(kubeconfig_dir, user["tokenFile"]), "r") as token_file:
+                token = token_file.read().strip()
+        if token:
+            headers["Authorization"] = "Bearer " + token
+        elif user.get("username"):
+            credentials = "{}:{}".format(user["username"], user.get("password", ""))
+            headers["Authorization"] = "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+
+        ssl_context = None
+        if cluster["server"].startswith("https"):
+            ssl_context = make_ssl_context(cluster, user, kubeconfig_dir)
+
+        return ApiClient(cluster["server"], ssl_context, headers)
+
+
+def load_kubeconfig():
+    # returns the parsed kubeconfig and its directory. kubeconfig files are yaml, kubectl converts them
+    # to json, unless the file is already written in json (the fake api server does that)
+    if params.kubeconfig_path != "":
+        path = params.kubeconfig_path
+    else:
+        path = os.environ.get("KUBECONFIG", "").split(os.pathsep)[0] or os.path.expanduser("~/.kube/config")
+
+    try:
+        with open(path, "r") as file:
+            return json.load(file), os.path.dirname(path)
+    except (OSError, ValueError):
+        pass
+
+    run_command = RunCommand(params.command_name + " config view --raw -o json", False)
+    if run_command.exit_code != 0:
+        logging.error("can't read kubeconfig: %s", make_error_message(run_command))
+        return None, None
+    return json.loads(run_command.output), os.path.dirname(path)
 
-        command_text += "%s," * len(column_defs)
-        command_text += '\\n" '
-        for column_def in column_defs:
-            command_text += column_def[1]
-            command_text += " "
-        command_text += "}}{{end}}'"
 
-        return command_text
+def find_named_entry(entries, name, field):
+    for entry in entries or []:
+        if entry.get("name") == name:
+            return entry.get(field)
+    return None
+
+
+def resolve_kubeconfig_path(kubeconfig_dir, path):
+    # relative paths in a kubeconfig are relative to the directory of the kubeconfig file
+    return os.path.join(kubeconfig_dir, os.path.expanduser(path))
+
+
+def make_ssl_context(cluster, user, kubeconfig_dir):
+    ssl_context = gevent.ssl.SSLContext(gevent.ssl.PROTOCOL_TLS_CLIENT)
+    if cluster.get("insecure-skip-tls-verify"):
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = gevent.ssl.CERT_NONE
+    elif cluster.get("certificate-authority-data"):
+        ssl_context.load_verify_locations(cadata=base64.b64decode(cluster["certificate-authority-data"]).decode("ascii"))
+    elif cluster.get("certificate-authority"):
+        ssl_context.load_verify_locations(cafile=resolve_kubeconfig_path(kubeconfig_dir, cluster["certificate-authority"]))
+    else:
+        ssl_context.load_default_certs()
+
+    if user.get("client-certificate-data"):
+        # the ssl module loads client certificates from files only.
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cert_file = os.path.join(temp_dir, "cert.pem")
+            key_file = os.path.join(temp_dir, "key.pem")
+            with open(cert_file, "wb") as file:
+                file.write(base64.b64decode(user["client-certificate-data"]))
+            with open(key_file, "wb") as file:
+                file.write(base64.b64decode(user["client-key-data"]))
+            ssl_context.load_cert_chain(cert_file, key_file)
+    elif user.get("client-certificate"):
+        ssl_context.load_cert_chain(resolve_kubeconfig_path(kubeconfig_dir, user["client-certificate"]), \
+                                    resolve_kubeconfig_path(kubeconfig_dir, user["client-key"]))
+    return ssl_context
+
+
+def make_resource_path(api_path, namespace=None, name=None, subresource=None):
+    # api_path is the path of the resource type in all namespaces, like /apis/apps/v1/deployments
+    prefix, resource = api_path.rsplit("/", 1)
+    path = prefix
+    if namespace is not None:
+        path += "/namespaces/" + urllib.parse.quote(namespace)
+    path += "/" + resource
+    if name is not None:
+        path += "/" + urllib.parse.quote(name)
+    if subresource is not None:
+        path += "/" + subresource
+    return path
+
+
+def make_list_path(api_path, namespaced, current_ns):
+    if namespaced and current_ns != NO_NAMESPACE:
+        return make_resource_path(api_path, current_ns)
+    return api_path
+
+
+def make_list_query(field_sel, label_sel, limit, continue_token, query=None):
+    if query is None:
+        query = {}
+    if field_sel:
+        query["fieldSelector"] = field_sel
+    if label_sel:
+        query["labelSelector"] = label_sel
+    if limit > 0:
+        query["limit"] = limit
+    if continue_token:
+        query["continue"] = continue_token
+    return urllib.parse.urlencode(query)
+
+
+def format_table_cell(cell):
+    if cell is None or cell == "":
+        return "<none>"
+    if isinstance(cell, list):
+        return ",".join(str(item) for item in cell)
+    return str(cell)
+
+
+def get_api_resource_table(get_json):
+    # same table as kubectl api-resources, from the discovery documents. get_json(path) returns (object, error)
+    core_resources, error = get_json("/api/v1")
+    if error is not None:
+        return None, None, error
+    groups, error = get_json("/apis")
+    if error is not None:
+        return None, None, error
+
+    group_versions = [group["preferredVersion"]["groupVersion"] for group in groups.get("groups", [])]
+    requests = [gevent.spawn(get_json, "/apis/" + group_version) for group_version in group_versions]
+    gevent.joinall(requests)
+
+    parsed_lines = []
+    resource_lists = [core_resources] + [request.value[0] for request in requests if request.value is not None]
+    for resource_list in resource_lists:
+        # api groups of unavailable aggregated api servers are skipped, kubectl does the same.
+        if resource_list is None:
+            continue
+        for resource in resource_list.get("resources", []):
+            if "/" in resource["name"]:
+                continue
+            parsed_lines.append([resource["name"], ",".join(resource.get("shortNames", [])), \
+                                 resource_list["groupVersion"], \
+                                 "true" if resource.get("namespaced") else "false", resource["kind"]])
+    return ["NAME", "SHORTNAMES", "APIVERSION", "NAMESPACED", "KIND"], parsed_lines, None
+
+
+class ApiServerBackend:
+    # gets objects from the api server directly. Anything that kubectl implements on the client side
+    # (describe, apply) is still done by kubectl.
+    table_accept = "application/json;as=Table;v=v1;g=meta.k8s.io,application/json"
+
+    def __init__(self, cluster, client):
+        self.cluster = cluster
+        self.client = client
+        self.kubectl = KubectlBackend(cluster)
+        self.discovery_cache = {}  # path -> (etag, object) of the discovery documents
+
+    def get_api_resources(self):
+        return get_api_resource_table(self.get_discovery_json)
+
+    def get_discovery_json(self, path):
+        # the discovery documents are asked again only if changed, where the api server sends an ETag.
+        obj, cached, error = self.client.get_json_if_changed(path, self.discovery_cache.get(path))
+        if cached is not None:
+            self.discovery_cache[path] = cached
+        else:
+            self.discovery_cache.pop(path, None)
+        return obj, error
+
+    def list_objects(self, oname, namespaced, current_ns, field_sel, label_sel):
+        titles, parsed_lines, _, error_message = self.list_objects_page(oname, namespaced, current_ns, \
+                                                                       field_sel, label_sel, 0, "")
+        return titles, parsed_lines, error_message
+
+    def list_objects_page(self, oname, namespaced, current_ns, field_sel, label_sel, limit, continue_token):
+        api_path = self.cluster.api_resources.get_api_path(oname)
+        if api_path is None:
+            return self.kubectl.list_objects_page(oname, namespaced, current_ns, field_sel, label_sel, \
+                                                  limit, continue_token)
+
+        path = make_list_path(api_path, namespaced, current_ns) + "?" + \
+            make_list_query(field_sel, label_sel, limit, continue_token, {"includeObject": "Metadata"})
+        table, error_message = self.client.get_json(path, {"Accept": self.table_accept})
+        if error_message is not None:
+            return None, None, "", error_message
+        start = time.perf_counter()
+        titles, parsed_lines, error_message = ApiServerBackend.parse_table(table, namespaced and current_ns == NO_NAMESPACE)
+        metrics.observe(metrics.parse_seconds, time.perf_counter() - start)
+        return titles, parsed_lines, table.get("metadata", {}).get("continue", ""), error_message
+
+    @staticmethod
+    def parse_table(table, show_namespace):
+        # server side printing: the api server returns the same columns as kubectl get -o wide
+        titles = [column["name"].upper() for column in table.get("columnDefinitions", [])]
+        if show_namespace:
+            titles.insert(0, "NAMESPACE")
+        titles.append("LABELS")
+
+        parsed_lines = []
+        for row in table.get("rows", []):
+            metadata = row.get("object", {}).get("metadata", {})
+            line = [format_table_cell(cell) for cell in row["cells"]]
+            if show_namespace:
+                line.insert(0, metadata.get("namespace", ""))
+            line.append(format_labels(metadata.get("labels")))
+            parsed_lines.append(line)
+        if len(parsed_lines) == 0:
+            return None, None, "No resources found"
+        return titles, parsed_lines, None
+
+    def get_object_text(self, request_def, otype, oname, namespace):
+        # describe
+        return self.kubectl.get_object_text(request_def, otype, oname, namespace)
+
+    def make_object_source(self, otype, oname, namespace):
+        api_path = self.cluster.api_resources.get_api_path(otype)
+        if api_path is None:
+            return self.kubectl.make_object_source(otype, oname, namespace)
+        if namespace in ("None", NO_NAMESPACE):
+            namespace = None
+        return make_resource_path(api_path, namespace, oname)
+
+    def get_object_json(self, otype, oname, namespace):
+        if self.cluster.api_resources.get_api_path(otype) is None:
+            return self.kubectl.get_object_json(otype, oname, namespace)
+
+        path = self.make_object_source(otype, oname, namespace)
+        obj, error = self.client.get_json(path)
+        return path, obj, error
+
+    def get_objects_json(self, otype, objects):
+        # one request for each object, params.bulk_concurrency at the same time.
+        def get_object(obj):
+            return self.get_object_json(otype, obj["metadata"]["name"], obj["metadata"].get("namespace", "None"))
+
+        items = []
+        errors = []
+        pool = gevent.pool.Pool(params.bulk_concurrency)
+        for _, obj, error in pool.imap(bind_to_request(get_object), objects):
+            if obj is not None:
+                items.append(obj)
+            else:
+                errors.append(error)
+        return items, "\n".join(errors) if len(errors) != 0 else None
+
+    @staticmethod
+    def get_bulk_batch_size(action):
+        # a delete is one api call for each object, apply is done by kubectl.
+        return 1 if action == "delete" else params.bulk_batch_size
+
+    def run_bulk_batch(self, action, resource, objects, dry_run):
+        api_path = self.cluster.api_resources.get_api_path(resource)
+        if action != "delete" or api_path is None:
+            return self.kubectl.run_bulk_batch(action, resource, objects, dry_run)
+
+        results = []
+        for obj in objects:
+            path = make_resource_path(api_path, obj["metadata"].get("namespace"), obj["metadata"]["name"])
+            if dry_run:
+                path += "?dryRun=All"
+            status, data = self.client.request("DELETE", path)
+            if status in (200, 202):
+                results.append((obj, None))
+            else:
+                results.append((obj, "DELETE {} failed. status: {} {}".format(path, status, \
+                                                                               data.decode("utf-8", "replace"))))
+        return results
+
+    def get_raw(self, path):
+        status, data = self.client.request("GET", path)
+        if status != 200:
+            return None, "GET {} failed. status: {} {}".format(path, status, data.decode("utf-8", "replace"))
+        return data.decode("utf-8"), None
+
+    def open_watch(self, path):
+        return self.client.stream(path)
+
+    def open_logs(self, otype, oname, namespace, tail_lines, follow, timestamps=False):
+        # for other types kubectl picks one of the pods of the object.
+        if otype != "pods":
+            return self.kubectl.open_logs(otype, oname, namespace, tail_lines, follow, timestamps)
+        query = {"tailLines": tail_lines}
+        if follow:
+            query["follow"] = "true"
+        if timestamps:
+            query["timestamps"] = "true"
+        return self.client.stream(make_resource_path("/api/v1/pods", namespace, oname, "log") + "?" + \
+                                  urllib.parse.urlencode(query))
 
 
 def find_index_in_list(slist, elem):
@@ -226,66 +1616,125 @@ class HtmlTable:
         self.titles = titles
         self.parsed_lines = parsed_lines
         self.html_text = ""
+        # if set: sort_url(column position) returns the link of a column title, the table is sorted by the server.
+        self.sort_url = None
+        # if set: select_value(line) returns the value of a checkbox in front of the row, the rows can be selected
+        # for a bulk action (the table is inside the form of the action).
+        self.select_value = None
+        # if set: row_key(line) returns the data-key attribute of the row, a live list finds its rows by this key.
+        self.row_key = None
 
     def reset(self):
         self.html_text = ""
 
+    # rows are rendered and sent in chunks of this size
+    rows_per_chunk = 500
+
     def make_html(self, column_subset, link_cb, is_editable, editlink):
-        if link_cb is None:
-            link_cb = HtmlTable.make_object_link_def
+        self.html_text = "".join(self.render(column_subset, link_cb, is_editable, editlink))
+        return self.html_text
 
-        if self.titles is None or self.parsed_lines is None:
-            ret = ERROR_MESSAGE_NO_DATA
-        else:
-            ret = get_style_sheet()
+    def render(self, column_subset, link_cb, is_editable, editlink):
+        return metrics.timed_chunks(metrics.render_seconds, self.render_chunks(column_subset, link_cb, is_editable, editlink))
 
-            if is_editable:
-                ret += HtmlTable.make_script_switch_to_edit()
+    def render_chunks(self, column_subset, link_cb, is_editable, editlink):
+        # yields the html of the table in chunks. link_cb returns the url that the cells of a row link to.
+        if self.titles is None or self.parsed_lines is None:
+            yield ERROR_MESSAGE_NO_DATA
+            return
 
-            ret += self.make_table_header(column_subset)
+        ret = get_style_sheet()
+        if is_editable:
+            ret += HtmlTable.make_script_switch_to_edit()
+        ret += self.make_table_header(column_subset)
 
-            if isinstance(self.parsed_lines, list):
-                for line in self.parsed_lines:
-                    ret += '<tr>'
-                    for pos in range(len(self.titles)):
-                        if column_subset is None or pos in column_subset:
-                            ret += '<td>{}</td>'.format(link_cb(line, pos))
-                    ret += '</tr>\n'
-            else:
-                ret += '<tr id="displayform"><td>'
-                if is_editable:
-                    ret += '<input type="button" onclick="startedit();" value="edit"/> &nbsp; '
-                    ret += '<input type="button" onclick="deleteobj();" value="Delete"/>'
-                    ret += '<br/>'
-                ret += '<pre id="toedit">{}</pre></td></tr>'.format(self.parsed_lines)
-                if is_editable:
-                    ret += HtmlTable.make_edit_row(editlink)
-            ret += '</table>'
-
-        self.html_text = ret
-        return self.html_text
+        if not isinstance(self.parsed_lines, list):
+            ret += '<tr id="displayform"><td>'
+            if is_editable:
+                ret += '<input type="button" onclick="startedit();" value="edit"/> &nbsp; '
+                ret += '<input type="button" onclick="deleteobj();" value="Delete"/>'
+                ret += '<br/>'
+            ret += '<pre id="toedit">{}</pre></td></tr>'.format(html.escape(self.parsed_lines, False))
+            if is_editable:
+                ret += HtmlTable.make_edit_row(editlink)
+            yield ret + '</table>'
+            return
+
+        yield ret
+
+        row_template = self.make_row_template(column_subset, link_cb)
+        for chunk_start in range(0, len(self.parsed_lines), self.rows_per_chunk):
+            lines = self.parsed_lines[chunk_start: chunk_start + self.rows_per_chunk]
+            yield self.render_rows(lines, link_cb, *row_template)
+
+        yield '</table>'
+
+    def make_row_template(self, column_subset, link_cb):
+        # the row template is made once per table; all cells of a row link to the same url (the first value),
+        # the values of the checkbox and the row key come after the cells.
+        columns = self.get_columns(column_subset)
+        values_per_row = len(columns) + 1
+        row_format = '<tr>'
+        if self.row_key is not None:
+            row_format = '<tr data-key="{%d}">' % values_per_row
+            values_per_row += 1
+        if self.select_value is not None:
+            row_format += '<td><input type="checkbox" name="obj" value="{%d}"></td>' % values_per_row
+            values_per_row += 1
+        if link_cb is None:
+            row_format += ''.join('<td>{%d}</td>' % (pos + 1) for pos in range(len(columns))) + '</tr>\n'
+        else:
+            row_format += ''.join('<td><a href="{0}">{%d}</a></td>' % (pos + 1) for pos in range(len(columns))) + \
+                '</tr>\n'
+        get_cells = operator.itemgetter(*columns)
+        if len(columns) == 1:
+            get_cells = lambda line, get_cell=get_cells: (get_cell(line),)
+        return get_cells, row_format, values_per_row
+
+    def render_rows(self, lines, link_cb, get_cells, row_format, values_per_row):
+        # all values of the chunk are escaped in one call, joined by a character that doesn't need escaping.
+        values = []
+        for line in lines:
+            values.append(link_cb(line) if link_cb is not None else "")
+            values.extend(get_cells(line))
+            if self.row_key is not None:
+                values.append(self.row_key(line))
+            if self.select_value is not None:
+                values.append(self.select_value(line))
+        escaped = html.escape("\0".join(values)).split("\0")
+
+        return "".join(row_format.format(*escaped[pos: pos + values_per_row]) \
+                       for pos in range(0, len(escaped), values_per_row))
+
+    def get_columns(self, column_subset):
+        return [pos for pos in range(len(self.titles)) if column_subset is None or pos in column_subset]
 
     def make_table_header(self, column_subset):
+        if self.sort_url is not None:
+            hdr = '<table><thead><tr>' + self.make_select_header()
+            for pos in self.get_columns(column_subset):
+                hdr += '<th align="left"><a href="{}">{}</a></th>'.format(html.escape(self.sort_url(pos)), \
+                                                                         html.escape(self.titles[pos]))
+            return hdr + '</tr></thead>'
+
         hdr = HtmlTable.make_sort_jscript()
 
-        hdr += '<table class="js-sort-table"><thead><tr>'
-        for pos in range(len(self.titles)):
-            if column_subset is None or pos in column_subset:
-                title = self.titles[pos]
-                # hdr += '<th align="left"><a onclick="sortTable({})">{}</a></th>'.format(pos, title)
-                hdr += '<th align="left">{}</th>'.format(title)
+        hdr += '<table class="js-sort-table"><thead><tr>' + self.make_select_header()
+        for pos in self.get_columns(column_subset):
+            title = self.titles[pos]
+            # hdr += '<th align="left"><a onclick="sortTable({})">{}</a></th>'.format(pos, title)
+            hdr += '<th align="left">{}</th>'.format(html.escape(title))
         hdr += '</tr></thead>'
         return hdr
 
-    @staticmethod
-    def make_sort_jscript():
-        return "<script>\n" + \
-               read_static_file("sorttable/sort-table.min.js") + \
-               '</script>'
+    def make_select_header(self):
+        if self.select_value is None:
+            return ""
+        return '<th class="js-sort-none"><input type="checkbox" title="select all" onclick="selectAllRows(this);"></th>'
 
     @staticmethod
-    def make_object_link_def(line, title_pos):
-        return line[title_pos]
+    def make_sort_jscript():
+        return get_script("sorttable/sort-table.min.js")
 
     @staticmethod
     def make_edit_row(editlink):
@@ -307,143 +1756,1932 @@ class HtmlTable:
 
     @staticmethod
     def make_script_switch_to_edit():
-        return '''<script>
-function  startedit() {
-    toedit = document.getElementById("toedit");
-    displayform = document.getElementById("displayform");
-    editform = document.getElementById("editform");
-    editctl = document.getElementById("contentOnEdit");
-
-    displayform.style.display = 'none';
-    editctl.value = toedit.innerHTML;
-    editform.style.display = '';
-}
-
-function deleteobj() {
-    if (confirm("Do you really want to delete the object ?")) {
-        toedit = document.getElementById("toedit");
-        edit = document.getElementById("contentOnDelete");
-        edit.value = toedit.innerHTML;
-
-        form = document.getElementById("deleteobj");
-        form.submit();
-    }
-}
-</script>
-'''
+        return get_script("edit.js")
 
 
-def namespace_list(namespace):
-    cmd = params.command_name + " get namespace -o go-template='{{range .items}}{{.metadata.name }}{{\"\\n\"}}{{end}}'"
-    run_command = RunCommand(cmd, split_lines=True)
-    html = """<script>
-        function on_ns_select() {
-            let elm = document.getElementById("namespace_list");
-            window.location.href = "/" + elm.value;
-        }
-    </script>"""
-    html += '<select id="namespace_list" onchange="on_ns_select()">'
-    html += f"<option value=''>all namespaces</option>"
-    for ns in run_command.lines:
-        sel = ""
-        ns = ns.decode('utf-8')
-        if ns == namespace:
-            sel = "selected"
-        html += f"<option value='{ns}' {sel}>{ns}</option>"
-    html += "</select>"
-    return html
-
-
-class ApiResources:
-    def __init__(self):
+class ApiResourceIndex:
+    # one version of the api resources: the table of the home page, the api paths and the kinds of the resources.
+    # A new version replaces the old one as a whole.
+    def __init__(self, cluster, titles, parsed_lines, error_message):
+        self.cluster = cluster
         self.html_table = None
         self.name_index = None
         self.namespaced_index = None
-        self.error_message = None
-        self.current_namespace = ""
-
-    def load(self):
-        cmd = params.command_name + " api-resources"
-        run_command = RunCommand(cmd)
+        self.error_message = error_message
+        self.api_paths = {}
+        self.kind_names = {}
+        self.kinds = {}  # resource name -> (apiVersion, kind)
+        self.full_names = {}  # resource name -> <resource>.<group> (just <resource> in the core group)
+        self.table_html = {}  # column subset -> html of the table
+        self.list_columns = {}  # (full name, show namespace) -> ListColumns of the types that have no built-in table
+
+        if titles is not None:
+            self.html_table = HtmlTable(titles, parsed_lines)
+            self.name_index = find_index_in_list(self.html_table.titles, "NAME")
+            self.namespaced_index = find_index_in_list(self.html_table.titles, "NAMESPACED")
+            self.make_resource_indexes(parsed_lines)
+
+    def make_resource_indexes(self, parsed_lines):
+        # older kubectl versions show APIGROUP without the version, can't build a path from that.
+        version_index = find_index_in_list(self.html_table.titles, "APIVERSION")
+        kind_index = find_index_in_list(self.html_table.titles, "KIND")
+        if version_index == -1:
+            return
+
+        # a resource is known by its full name, and by its name alone if no resource of the same name came
+        # before it: the core group is first, so pods are the core pods and not pods.metrics.k8s.io
+        for line in parsed_lines:
+            name = line[self.name_index]
+            api_version = line[version_index]
+            if "/" in api_version:
+                group = api_version.split("/")[0]
+                api_path = f"/apis/{api_version}/{name}"
+                full_name = "{}.{}".format(name, group)
+                kind_name = "{}.{}".format(line[kind_index].lower(), group)
+            else:
+                api_path = f"/api/{api_version}/{name}"
+                full_name = name
+                kind_name = line[kind_index].lower()
+            for resource_name in (full_name, name):
+                if resource_name not in self.full_names:
+                    self.full_names[resource_name] = full_name
+                    self.api_paths[resource_name] = api_path
+                    self.kinds[resource_name] = (api_version, line[kind_index])
+            self.kind_names[kind_name] = name if self.full_names[name] == full_name else full_name
 
-        # for whatever reasons kubectl api-resources often returns error status,
-        # even it returned all resources.
-        # if run_command.exit_code == 0 and len(run_command.lines) != 0:
+    def make_object_link(self, line):
+        return make_objectinstance_url(self.cluster, line[self.name_index], line[self.namespaced_index], \
+                                       ApiResources.namespace_placeholder)
 
-        if len(run_command.lines) != 0:
 
-            text_command = TextCommand(run_command)
+class ApiResources:
+    # the api resources of the cluster (same table as kubectl api-resources). At startup they come from
+    # the snapshot of the last discovery of the kubeconfig context, so the server doesn't wait for the cluster;
+    # discovery runs in the background, again every params.discovery_refresh_interval seconds, and replaces
+    # the index when the resources changed (new CRDs, for example).
+    # The table of the home page is rendered once, with a placeholder for the namespace in its links.
+    namespace_placeholder = "\x01namespace\x01"
+    retry_delay = 30
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.index = ApiResourceIndex(cluster, None, None, "loading the api resources...")
+        self.digest = None
+        self.snapshot_path = None
+        self.refresher = None
 
-            parsed_lines = sorted(text_command.parsed_lines, key=lambda entry: entry[0])
+    def load(self):
+        self.snapshot_path = self.make_snapshot_path()
+        snapshot = self.read_snapshot()
+        if snapshot is not None:
+            self.set_resources(snapshot["titles"], snapshot["resources"])
+            logging.info("api resources from snapshot %s", self.snapshot_path)
+
+    def start_refresh(self):
+        # in the process that serves the pages: with --workers each worker discovers on its own, not the master.
+        if self.refresher is None:
+            self.refresher = gevent.spawn(self.refresh_loop)
+
+    def refresh_loop(self):
+        while True:
+            if not self.refresh():
+                gevent.sleep(self.retry_delay)
+            elif params.discovery_refresh_interval > 0:
+                gevent.sleep(params.discovery_refresh_interval)
+            else:
+                return
 
-            self.html_table = HtmlTable(text_command.titles, parsed_lines)
-            self.name_index = find_index_in_list(self.html_table.titles, "NAME")
-            self.namespaced_index = find_index_in_list(self.html_table.titles, "NAMESPACED")
-        else:
-            self.html_table = None
-            self.error_message = make_error_message(run_command)
+    def refresh(self):
+        start = time.perf_counter()
+        titles, parsed_lines, error_message = self.cluster.backend.get_api_resources()
+        if titles is None:
+            logging.error("discovery of the api resources of %s failed: %s", self.cluster.name, error_message)
+            if self.digest is None:
+                self.index = ApiResourceIndex(self.cluster, None, None, error_message)
+            return False
+
+        parsed_lines = sorted(parsed_lines, key=lambda entry: entry[0])
+        if self.set_resources(titles, parsed_lines):
+            logging.info("api resources of %s changed, %d resources, discovery took %.3f seconds", \
+                         self.cluster.name, len(parsed_lines), time.perf_counter() - start)
+            self.write_snapshot(titles, parsed_lines)
+        return True
+
+    def set_resources(self, titles, parsed_lines):
+        # returns False if the resources didn't change
+        digest = hashlib.sha256(json.dumps([titles, parsed_lines]).encode("utf-8")).hexdigest()
+        if digest == self.digest:
+            return False
+        self.index = ApiResourceIndex(self.cluster, titles, parsed_lines, None)
+        self.digest = digest
+        return True
+
+    def make_snapshot_path(self):
+        # one snapshot for each kubeconfig and context
+        if params.discovery_snapshot_dir == "":
+            return None
+        kubeconfig_path = params.kubeconfig_path or os.environ.get("KUBECONFIG", "")
+        key = "{}\n{}\n{}".format(self.cluster.command_name, kubeconfig_path, self.cluster.name)
+        return os.path.join(os.path.expanduser(params.discovery_snapshot_dir), \
+                            "discovery-{}.json".format(hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]))
+
+    def read_snapshot(self):
+        if self.snapshot_path is None:
+            return None
+        try:
+            with open(self.snapshot_path, "r") as file:
+                snapshot = json.load(file)
+            if isinstance(snapshot.get("titles"), list) and isinstance(snapshot.get("resources"), list):
+                return snapshot
+        except (OSError, ValueError) as err:
+            logging.info("no snapshot of the api resources: %s", err)
+        return None
+
+    def write_snapshot(self, titles, parsed_lines):
+        # written to a temporary file that replaces the old snapshot, a reader never sees half a file.
+        if self.snapshot_path is None:
+            return
+        temp_path = "{}.{}.tmp".format(self.snapshot_path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            with open(temp_path, "w") as file:
+                json.dump({"time": time.time(), "titles": titles, "resources": parsed_lines}, file)
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as err:
+            logging.error("can't write the snapshot of the api resources: %s", err)
+
+    def get_resource_name(self, kind_name):
+        # kind_name is the type part of kubectl -o name output, like deployment.apps
+        return self.index.kind_names.get(kind_name)
+
+    def get_api_path(self, oname):
+        return self.index.api_paths.get(oname)
+
+    def get_list_columns(self, oname, show_namespace):
+        # the built-in table of the type, the printer columns of a custom resource, or NAME and AGE.
+        index = self.index
+        full_name = index.full_names.get(oname, oname)
+        if full_name in LIST_COLUMN_DEFS or "." not in full_name:
+            return get_list_columns(full_name, show_namespace)
+
+        key = (full_name, show_namespace)
+        columns = index.list_columns.get(key)
+        if columns is None:
+            column_defs = self.get_printer_column_defs(full_name, index.kinds.get(full_name))
+            columns = ListColumns(column_defs or DEFAULT_LIST_COLUMN_DEFS, show_namespace)
+            index.list_columns[key] = columns
+        return columns
+
+    def get_printer_column_defs(self, full_name, kind):
+        # the additionalPrinterColumns of the version of a custom resource that is served by discovery,
+        # all of them, as kubectl get -o wide shows them. None if the type is not a custom resource.
+        output, error_message = self.cluster.backend.get_raw( \
+            "/apis/apiextensions.k8s.io/v1/customresourcedefinitions/" + full_name)
+        if error_message is not None:
+            return None
+        try:
+            crd = json.loads(output)
+        except ValueError:
+            return None
+        version = kind[0].split("/")[-1] if kind is not None else None
+        for crd_version in get_path(crd, ("spec", "versions")) or []:
+            if version is None or crd_version.get("name") == version:
+                printer_columns = crd_version.get("additionalPrinterColumns") or [{"name": "Age", "type": "date", \
+                                                                                 "jsonPath": ".metadata.creationTimestamp"}]
+                return [("NAME", ".metadata.name")] + [(column.get("name", "").upper(), compile_printer_column(column)) \
+                                                       for column in printer_columns]
+        return None
+
+    def get_kind(self, oname):
+        # apiVersion and kind of a resource type, for writing objects of the type; None if not known.
+        return self.index.kinds.get(oname)
 
     def make_html(self, column_subset, ns):
         if ns == "":
             ns = NO_NAMESPACE
 
-        home_link = format(get_home_link(ns))
-        ns_list = namespace_list(ns)
-        html = f"<b>{home_link}</b>&nbsp;{ns_list}</br>"
-        self.current_namespace = ns
-
-        if self.html_table:
-            self.html_table.reset()
-            html += self.html_table.make_html(column_subset, self.make_object_link, False, "")
+        home_link = format(get_home_link(self.cluster, ns))
+        ns_list = self.cluster.namespace_selector.make_html(ns)
+        ret = f"<b>{home_link}</b>&nbsp;{ns_list}</br>" + clusters.make_context_links(self.cluster, ns)
+
+        index = self.index
+        if not index.html_table:
+            return ret + index.error_message
+
+        table_html = index.table_html.get(tuple(column_subset))
+        if table_html is None:
+            index.html_table.reset()
+            table_html = index.html_table.make_html(column_subset, index.make_object_link, False, "")
+            index.table_html[tuple(column_subset)] = table_html
+        return ret + table_html.replace(self.namespace_placeholder, html.escape(ns))
+
+
+def format_age(timestamp):
+    if not timestamp:
+        return "<unknown>"
+    created = datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ")
+    seconds = int(time.time() - created.replace(tzinfo=datetime.timezone.utc).timestamp())
+    if seconds < 120:
+        return f"{seconds}s"
+    if seconds < 3600 * 3:
+        return f"{seconds // 60}m"
+    if seconds < 3600 * 48:
+        return f"{seconds // 3600}h"
+    return f"{seconds // 86400}d"
+
+
+def format_labels(labels):
+    if not labels:
+        return "<none>"
+    return ",".join(f"{key}={value}" for key, value in labels.items())
+
+
+# strings that are written without quotes. A yaml 1.1 parser reads numbers, .inf, .nan and timestamps from text
+# that starts with a digit, a sign or a dot, these are quoted.
+YAML_PLAIN_SCALAR = re.compile(r"^[A-Za-z_/][A-Za-z0-9_/. :=@+-]*$")
+YAML_RESERVED_WORDS = {"~", "null", "true", "false", "yes", "no", "on", "off", "y", "n"}
+
+
+def format_yaml(obj):
+    # yaml text of a json object, similar to kubectl -o yaml: sorted keys, lists are not indented.
+    if isinstance(obj, (dict, list)) and obj:
+        lines = []
+        append_yaml(lines, obj, "")
+        return "\n".join(lines) + "\n"
+    return format_yaml_value(obj, "") + "\n"
+
+
+def append_yaml(lines, obj, indent):
+    if isinstance(obj, dict):
+        for key in sorted(obj):
+            value = obj[key]
+            key_text = format_yaml_key(str(key))
+            if isinstance(value, dict) and value:
+                lines.append(f"{indent}{key_text}:")
+                append_yaml(lines, value, indent + "  ")
+            elif isinstance(value, list) and value:
+                lines.append(f"{indent}{key_text}:")
+                append_yaml(lines, value, indent)
+            else:
+                lines.append(f"{indent}{key_text}: {format_yaml_value(value, indent + '  ')}")
+    else:
+        for value in obj:
+            if isinstance(value, (dict, list)) and value:
+                item_lines = []
+                append_yaml(item_lines, value, indent + "  ")
+                item_lines[0] = indent + "- " + item_lines[0][len(indent) + 2:]
+                lines.extend(item_lines)
+            else:
+                lines.append(f"{indent}- {format_yaml_value(value, indent + '  ')}")
+
+
+def format_yaml_key(key):
+    # keys are on one line
+    if "\n" in key:
+        return json.dumps(key)
+    return format_yaml_value(key, "")
+
+
+def format_yaml_float(value):
+    if math.isnan(value):
+        return ".nan"
+    if math.isinf(value):
+        return ".inf" if value > 0 else "-.inf"
+    # yaml 1.1 reads 1e+300 as a string, 1.0e+300 as a number
+    text = json.dumps(value)
+    if "e" in text and "." not in text:
+        text = text.replace("e", ".0e")
+    return text
+
+
+def format_yaml_value(value, indent):
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return json.dumps(value)
+    if isinstance(value, float):
+        return format_yaml_float(value)
+    if isinstance(value, dict):
+        return "{}"
+    if isinstance(value, list):
+        return "[]"
+    if "\n" in value:
+        block_lines = value[:-1].split("\n") if value.endswith("\n") else value.split("\n")
+        # the indentation of a block is that of its first line that is not empty, it must not have more.
+        first_line = next((line for line in block_lines if line), "")
+        if first_line != "" and not first_line.startswith(" ") and not value.endswith("\n\n") and \
+                "\r" not in value and all(line == line.rstrip() for line in block_lines):
+            header = "|" if value.endswith("\n") else "|-"
+            return header + "".join(f"\n{indent}{line}" if line else "\n" for line in block_lines)
+        return json.dumps(value)
+    if YAML_PLAIN_SCALAR.match(value) and value.lower() not in YAML_RESERVED_WORDS \
+            and ": " not in value and not value.endswith(":") and not value.endswith(" "):
+        return value
+    return json.dumps(value)
+
+
+def get_path(obj, keys):
+    for key in keys:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def format_column_value(value):
+    if value is None or value == "" or value == [] or value == {}:
+        return "<none>"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def compile_path(path):
+    # ".status.podIP" -> function that returns the value as text, or <none>
+    keys = path.strip(".").split(".")
+
+    def get_value(obj):
+        return format_column_value(get_path(obj, keys))
+    return get_value
+
+
+# the steps of the json paths of printer columns: .field, ['field'], [index], [*] and [?(@.field=="value")]
+JSON_PATH_STEP = re.compile(r"""\.([^.\[]+)|\[['"]([^'"]*)['"]\]|\[(-?\d+)\]|\[(\*)\]|\[\?\(@\.([^=!<>\s]+)\s*==\s*['"]?([^'")]*)['"]?\)\]""")
+
+
+def parse_json_path(path):
+    # returns the steps, or None if the path is not supported
+    path = path.strip()
+    if path.startswith("{") and path.endswith("}"):
+        path = path[1:-1]
+    path = path.lstrip("$")
+    steps = []
+    pos = 0
+    while pos < len(path):
+        match = JSON_PATH_STEP.match(path, pos)
+        if match is None:
+            return None
+        field, quoted_field, index, wildcard, filter_path, filter_value = match.groups()
+        if field is not None or quoted_field is not None:
+            steps.append(("field", field if field is not None else quoted_field))
+        elif index is not None:
+            steps.append(("index", int(index)))
+        elif wildcard is not None:
+            steps.append(("all", None))
         else:
-            html += self.error_message
+            steps.append(("filter", (filter_path.split("."), filter_value)))
+        pos = match.end()
+    return steps
+
+
+def select_json_path(value, steps):
+    # the values that the steps select, one after the other
+    if len(steps) == 0:
+        yield value
+        return
+    step, arg = steps[0]
+    if step == "field":
+        children = [value[arg]] if isinstance(value, dict) and arg in value else []
+    elif step == "index":
+        children = [value[arg]] if isinstance(value, list) and -len(value) <= arg < len(value) else []
+    elif step == "all":
+        children = value if isinstance(value, list) else list(value.values()) if isinstance(value, dict) else []
+    else:
+        children = [item for item in value if format_column_value(get_path(item, arg[0])) == arg[1]] \
+            if isinstance(value, list) else []
+    for child in children:
+        yield from select_json_path(child, steps[1:])
 
-        return html
 
-    def make_object_link(self, line, title_pos):
-        return make_objectinstance_link(line[self.name_index], line[self.namespaced_index], self.current_namespace, line[title_pos])
+def compile_printer_column(column):
+    # a printer column of a custom resource -> function of the object. Like kubectl: the first value that the
+    # path selects, a date as its age.
+    steps = parse_json_path(column.get("jsonPath", ""))
+    is_date = column.get("type") == "date"
 
+    def get_value(obj):
+        value = next(select_json_path(obj, steps), None) if steps is not None else None
+        if is_date and isinstance(value, str):
+            return format_age(value)
+        return format_column_value(value)
+    return get_value
 
-class ObjectListScreen:
 
-    def __init__(self, oname, namespaced, field_sel, label_sel, current_ns):
-        cli_param = ""
+def column_age(obj):
+    return format_age(get_path(obj, ("metadata", "creationTimestamp")))
 
-        self.namespaced = namespaced
-        self.object_type = oname
-        self.current_ns = current_ns
 
-        if namespaced == "true":
-            if current_ns == NO_NAMESPACE:
-                cli_param = "-A"
+def column_containers(obj, keys=("spec", "template", "spec", "containers")):
+    return ",".join(container.get("name", "") for container in get_path(obj, keys) or []) or "<none>"
+
+
+def column_images(obj, keys=("spec", "template", "spec", "containers")):
+    return ",".join(container.get("image", "") for container in get_path(obj, keys) or []) or "<none>"
+
+
+def column_selector(obj):
+    selector = get_path(obj, ("spec", "selector"))
+    if not selector:
+        return "<none>"
+    if "matchLabels" in selector or "matchExpressions" in selector:
+        terms = [f"{key}={value}" for key, value in selector.get("matchLabels", {}).items()]
+        for expression in selector.get("matchExpressions", []):
+            terms.append("{} {} ({})".format(expression.get("key"), expression.get("operator", "").lower(), \
+                                             ",".join(expression.get("values", []))))
+        return ",".join(terms) or "<none>"
+    return format_labels(selector)
+
+
+def column_ready_replicas(obj):
+    return "{}/{}".format(get_path(obj, ("status", "readyReplicas")) or 0, get_path(obj, ("spec", "replicas")) or 0)
+
+
+def column_count(path):
+    keys = path.strip(".").split(".")
+
+    def get_value(obj):
+        return str(len(get_path(obj, keys) or []))
+    return get_value
+
+
+def column_pod_ready(obj):
+    statuses = get_path(obj, ("status", "containerStatuses")) or []
+    containers = get_path(obj, ("spec", "containers")) or []
+    return "{}/{}".format(sum(1 for status in statuses if status.get("ready")), len(containers))
+
+
+def column_pod_status(obj):
+    # the same rules as kubectl, mostly: the reason of the first container that is not running, or the phase.
+    if get_path(obj, ("metadata", "deletionTimestamp")):
+        return "Terminating"
+    reason = get_path(obj, ("status", "reason")) or get_path(obj, ("status", "phase")) or "Unknown"
+    for status in (get_path(obj, ("status", "initContainerStatuses")) or []):
+        state = status.get("state", {})
+        if "terminated" in state and state["terminated"].get("exitCode", 0) != 0:
+            return "Init:" + (state["terminated"].get("reason") or "Error")
+        if "waiting" in state and state["waiting"].get("reason", "PodInitializing") != "PodInitializing":
+            return "Init:" + state["waiting"]["reason"]
+    for status in (get_path(obj, ("status", "containerStatuses")) or []):
+        state = status.get("state", {})
+        if "waiting" in state and state["waiting"].get("reason"):
+            reason = state["waiting"]["reason"]
+        elif "terminated" in state:
+            reason = state["terminated"].get("reason") or "Error"
+    return reason
+
+
+def column_pod_restarts(obj):
+    return str(sum(status.get("restartCount", 0) for status in get_path(obj, ("status", "containerStatuses")) or []))
+
+
+def column_service_external_ip(obj):
+    addresses = list(get_path(obj, ("spec", "externalIPs")) or [])
+    for ingress in get_path(obj, ("status", "loadBalancer", "ingress")) or []:
+        addresses.append(ingress.get("ip") or ingress.get("hostname", ""))
+    if addresses:
+        return ",".join(addresses)
+    if get_path(obj, ("spec", "type")) == "LoadBalancer":
+        return "<pending>"
+    return "<none>"
+
+
+def column_service_ports(obj):
+    ports = []
+    for port in get_path(obj, ("spec", "ports")) or []:
+        text = str(port.get("port", ""))
+        if port.get("nodePort"):
+            text += ":{}".format(port["nodePort"])
+        ports.append("{}/{}".format(text, port.get("protocol", "TCP")))
+    return ",".join(ports) or "<none>"
+
+
+def column_node_status(obj):
+    status = "Unknown"
+    for condition in get_path(obj, ("status", "conditions")) or []:
+        if condition.get("type") == "Ready":
+            status = "Ready" if condition.get("status") == "True" else "NotReady"
+    if get_path(obj, ("spec", "unschedulable")):
+        status += ",SchedulingDisabled"
+    return status
+
+
+def column_node_roles(obj):
+    roles = [key[len("node-role.kubernetes.io/"):] for key in (get_path(obj, ("metadata", "labels")) or {}) \
+             if key.startswith("node-role.kubernetes.io/")]
+    return ",".join(roles) or "<none>"
+
+
+def column_node_address(address_type):
+    def get_value(obj):
+        for address in get_path(obj, ("status", "addresses")) or []:
+            if address.get("type") == address_type:
+                return address.get("address", "")
+        return "<none>"
+    return get_value
+
+
+def column_job_completions(obj):
+    return "{}/{}".format(get_path(obj, ("status", "succeeded")) or 0, get_path(obj, ("spec", "completions")) or 1)
+
+
+def column_ingress_hosts(obj):
+    return ",".join(rule.get("host", "*") for rule in get_path(obj, ("spec", "rules")) or []) or "*"
+
+
+def column_ingress_address(obj):
+    return ",".join(ingress.get("ip") or ingress.get("hostname", "") \
+                    for ingress in get_path(obj, ("status", "loadBalancer", "ingress")) or []) or "<none>"
+
+
+def column_endpoints(obj):
+    addresses = []
+    for subset in get_path(obj, ("subsets",)) or []:
+        for address in subset.get("addresses", []):
+            for port in subset.get("ports", []) or [{}]:
+                addresses.append("{}:{}".format(address.get("ip", ""), port.get("port", "")) if port else address.get("ip", ""))
+    return ",".join(addresses) or "<none>"
+
+
+# the columns of kubectl get -o wide for the common resource types, by full resource name; (title, ".json.path"
+# or function of the object). Custom resources show their printer columns (ApiResources.get_list_columns), the
+# other types NAME and AGE. NAMESPACE and LABELS are added by ListColumns.
+LIST_COLUMN_DEFS = {
+    "pods": [("NAME", ".metadata.name"), ("READY", column_pod_ready), ("STATUS", column_pod_status), \
+             ("RESTARTS", column_pod_restarts), ("AGE", column_age), ("IP", ".status.podIP"), \
+             ("NODE", ".spec.nodeName"), ("NOMINATED NODE", ".status.nominatedNodeName"), \
+             ("READINESS GATES", column_count(".spec.readinessGates"))],
+    "deployments.apps": [("NAME", ".metadata.name"), ("READY", column_ready_replicas), \
+                    ("UP-TO-DATE", ".status.updatedReplicas"), ("AVAILABLE", ".status.availableReplicas"), \
+                    ("AGE", column_age), ("CONTAINERS", column_containers), ("IMAGES", column_images), \
+                    ("SELECTOR", column_selector)],
+    "replicasets.apps": [("NAME", ".metadata.name"), ("DESIRED", ".spec.replicas"), ("CURRENT", ".status.replicas"), \
+                    ("READY", ".status.readyReplicas"), ("AGE", column_age), ("CONTAINERS", column_containers), \
+                    ("IMAGES", column_images), ("SELECTOR", column_selector)],
+    "statefulsets.apps": [("NAME", ".metadata.name"), ("READY", column_ready_replicas), ("AGE", column_age), \
+                     ("CONTAINERS", column_containers), ("IMAGES", column_images)],
+    "daemonsets.apps": [("NAME", ".metadata.name"), ("DESIRED", ".status.desiredNumberScheduled"), \
+                   ("CURRENT", ".status.currentNumberScheduled"), ("READY", ".status.numberReady"), \
+                   ("UP-TO-DATE", ".status.updatedNumberScheduled"), ("AVAILABLE", ".status.numberAvailable"), \
+                   ("NODE SELECTOR", compile_path(".spec.template.spec.nodeSelector")), ("AGE", column_age), \
+                   ("CONTAINERS", column_containers), ("IMAGES", column_images), ("SELECTOR", column_selector)],
+    "jobs.batch": [("NAME", ".metadata.name"), ("COMPLETIONS", column_job_completions), ("AGE", column_age), \
+             ("CONTAINERS", column_containers), ("IMAGES", column_images), ("SELECTOR", column_selector)],
+    "cronjobs.batch": [("NAME", ".metadata.name"), ("SCHEDULE", ".spec.schedule"), ("SUSPEND", ".spec.suspend"), \
+                 ("ACTIVE", column_count(".status.active")), ("LAST SCHEDULE", ".status.lastScheduleTime"), \
+                 ("AGE", column_age)],
+    "services": [("NAME", ".metadata.name"), ("TYPE", ".spec.type"), ("CLUSTER-IP", ".spec.clusterIP"), \
+                 ("EXTERNAL-IP", column_service_external_ip), ("PORT(S)", column_service_ports), ("AGE", column_age), \
+                 ("SELECTOR", lambda obj: format_labels(get_path(obj, ("spec", "selector"))))],
+    "endpoints": [("NAME", ".metadata.name"), ("ENDPOINTS", column_endpoints), ("AGE", column_age)],
+    "ingresses.networking.k8s.io": [("NAME", ".metadata.name"), ("CLASS", ".spec.ingressClassName"), ("HOSTS", column_ingress_hosts), \
+                  ("ADDRESS", column_ingress_address), ("AGE", column_age)],
+    "nodes": [("NAME", ".metadata.name"), ("STATUS", column_node_status), ("ROLES", column_node_roles), \
+              ("AGE", column_age), ("VERSION", ".status.nodeInfo.kubeletVersion"), \
+              ("INTERNAL-IP", column_node_address("InternalIP")), ("EXTERNAL-IP", column_node_address("ExternalIP")), \
+              ("OS-IMAGE", ".status.nodeInfo.osImage"), ("KERNEL-VERSION", ".status.nodeInfo.kernelVersion"), \
+              ("CONTAINER-RUNTIME", ".status.nodeInfo.containerRuntimeVersion")],
+    "namespaces": [("NAME", ".metadata.name"), ("STATUS", ".status.phase"), ("AGE", column_age)],
+    "configmaps": [("NAME", ".metadata.name"), ("DATA", column_count(".data")), ("AGE", column_age)],
+    "secrets": [("NAME", ".metadata.name"), ("TYPE", ".type"), ("DATA", column_count(".data")), ("AGE", column_age)],
+    "serviceaccounts": [("NAME", ".metadata.name"), ("SECRETS", column_count(".secrets")), ("AGE", column_age)],
+    "persistentvolumeclaims": [("NAME", ".metadata.name"), ("STATUS", ".status.phase"), \
+                               ("VOLUME", ".spec.volumeName"), ("CAPACITY", ".status.capacity.storage"), \
+                               ("ACCESS MODES", lambda obj: ",".join(get_path(obj, ("status", "accessModes")) or [])), \
+                               ("STORAGECLASS", ".spec.storageClassName"), ("AGE", column_age), \
+                               ("VOLUMEMODE", ".spec.volumeMode")],
+    "persistentvolumes": [("NAME", ".metadata.name"), ("CAPACITY", ".spec.capacity.storage"), \
+                          ("ACCESS MODES", lambda obj: ",".join(get_path(obj, ("spec", "accessModes")) or [])), \
+                          ("RECLAIM POLICY", ".spec.persistentVolumeReclaimPolicy"), ("STATUS", ".status.phase"), \
+                          ("CLAIM", lambda obj: "{}/{}".format(get_path(obj, ("spec", "claimRef", "namespace")) or "", \
+                                                               get_path(obj, ("spec", "claimRef", "name")) or "")), \
+                          ("STORAGECLASS", ".spec.storageClassName"), ("AGE", column_age)],
+    "events": [("LAST SEEN", lambda obj: format_age(obj.get("lastTimestamp") or obj.get("eventTime"))), \
+               ("TYPE", ".type"), ("REASON", ".reason"), \
+               ("OBJECT", lambda obj: "{}/{}".format(get_path(obj, ("involvedObject", "kind")) or "", \
+                                                     get_path(obj, ("involvedObject", "name")) or "").lower()), \
+               ("MESSAGE", ".message"), ("NAME", ".metadata.name")],
+}
+
+DEFAULT_LIST_COLUMN_DEFS = [("NAME", ".metadata.name"), ("AGE", column_age)]
+
+
+class ListColumns:
+    # the column definitions of a resource type, compiled to one function per column.
+    def __init__(self, column_defs, show_namespace):
+        self.titles = [column_def[0] for column_def in column_defs]
+        self.extractors = [compile_path(column_def[1]) if isinstance(column_def[1], str) else column_def[1] \
+                           for column_def in column_defs]
+        if show_namespace:
+            self.titles.insert(0, "NAMESPACE")
+            self.extractors.insert(0, compile_path(".metadata.namespace"))
+        self.titles.append("LABELS")
+        self.extractors.append(lambda obj: format_labels(get_path(obj, ("metadata", "labels"))))
+
+    def make_line(self, obj):
+        return [extractor(obj) for extractor in self.extractors]
+
+
+list_columns = {}
+
+
+def get_list_columns(full_name, show_namespace):
+    # the columns of the built-in table of a type, by its full name like "pods" or "deployments.apps".
+    # ApiResources.get_list_columns finds the full name of a type of the cluster.
+    key = (full_name, show_namespace)
+    columns = list_columns.get(key)
+    if columns is None:
+        columns = ListColumns(LIST_COLUMN_DEFS.get(full_name, DEFAULT_LIST_COLUMN_DEFS), show_namespace)
+        list_columns[key] = columns
+    return columns
+
+
+def make_object_table(oname, objects, show_namespace):
+    columns = get_list_columns(oname, show_namespace)
+    return columns.titles, [columns.make_line(obj) for obj in objects]
+
+
+class JsonStream:
+    # decodes a stream of concatenated json documents, as written by kubectl --watch or a raw watch request.
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+
+    def feed(self, data):
+        self.buffer += self.text_decoder.decode(data)
+        ret = []
+        pos = 0
+        while True:
+            while pos < len(self.buffer) and self.buffer[pos].isspace():
+                pos += 1
+            if pos == len(self.buffer):
+                break
+            try:
+                obj, pos = self.decoder.raw_decode(self.buffer, pos)
+            except json.JSONDecodeError:
+                # document is not complete yet, wait for more data.
+                break
+            ret.append(obj)
+        self.buffer = self.buffer[pos:]
+        return ret
+
+
+class JsonListStream:
+    # decodes a list response (kubectl get -o json, or a list request) while it arrives. Each item is passed
+    # to make_item as soon as it is complete, so the whole list is never decoded at once.
+    # the other fields of the list (kind, metadata) are in fields.
+    feed_size = 65536
+
+    def __init__(self, make_item):
+        self.make_item = make_item
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.state = "start"
+        self.key = None
+        self.items = []
+        self.fields = {}
+        self.error = None
+
+    def feed_all(self, data):
+        for pos in range(0, len(data), self.feed_size):
+            self.feed(data[pos: pos + self.feed_size])
+        self.close()
+
+    def close(self):
+        # the end of the input
+        if self.state != "end" and self.error is None:
+            self.error = "incomplete json list"
+
+    def feed(self, data):
+        if self.error is not None:
+            # the rest of the output is not parsed, and not kept.
+            return
+        self.buffer += self.text_decoder.decode(data)
+        pos = 0
+        while self.error is None and self.state != "end":
+            while pos < len(self.buffer) and self.buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(self.buffer):
+                break
+            next_pos = self.parse(pos)
+            if next_pos == pos:
+                # document is not complete yet, wait for more data.
+                break
+            pos = next_pos
+        self.buffer = self.buffer[pos:]
+
+    def parse(self, pos):
+        char = self.buffer[pos]
+        if self.state == "start":
+            if char != "{":
+                self.error = "json list expected"
+                return pos
+            self.state = "key"
+            return pos + 1
+
+        if self.state == "key" and char == "}":
+            self.state = "end"
+            return pos + 1
+
+        if self.state == "items" and char == "]":
+            self.state = "key"
+            return pos + 1
+
+        if self.state == "key":
+            end = self.buffer.find('"', pos + 1)
+            if end != -1:
+                end = self.buffer.find(":", end + 1)
+            if end == -1:
+                return pos
+            self.key = json.loads(self.buffer[pos: end].strip())
+            if self.key == "items":
+                start = self.buffer.find("[", end)
+                if start == -1:
+                    return pos
+                self.state = "items"
+                return start + 1
+            self.state = "value"
+            return end + 1
+
+        try:
+            value, end = self.decoder.raw_decode(self.buffer, pos)
+        except json.JSONDecodeError:
+            return pos
+        if self.state == "items":
+            self.items.append(self.make_item(value))
+        else:
+            if end == len(self.buffer) and isinstance(value, (int, float)):
+                # a number might continue in the next chunk.
+                return pos
+            self.fields[self.key] = value
+            self.state = "key"
+        return end
+
+
+LABEL_REQUIREMENT = re.compile(r"^\s*(!?)\s*([A-Za-z0-9_./-]+)\s*(?:(==|=|!=)\s*([A-Za-z0-9_.-]*)|\s(in|notin)\s*\(([^)]*)\))?\s*$")
+
+
+def parse_label_selector(label_sel):
+    # "app=web,tier!=db,env in (a,b),!legacy" -> list of (key, operator, values). raises ValueError if not valid.
+    terms = re.findall(r"[^,(]+(?:\([^)]*\))?[^,]*", label_sel)
+    requirements = []
+    for term in terms:
+        match = LABEL_REQUIREMENT.match(term)
+        if match is None or (match.group(1) and (match.group(3) or match.group(5))):
+            raise ValueError("invalid label selector: {}".format(term.strip()))
+        negated, key, operator, value, set_operator, set_values = match.groups()
+        if operator is not None:
+            requirements.append((key, "!=" if operator == "!=" else "=", [value]))
+        elif set_operator is not None:
+            requirements.append((key, set_operator, [value.strip() for value in set_values.split(",") if value.strip()]))
+        else:
+            requirements.append((key, "!exists" if negated else "exists", []))
+    return requirements
+
+
+def parse_field_selector(field_sel):
+    # "status.phase=Running,spec.nodeName!=node-1" -> list of (path keys, is equal, value)
+    requirements = []
+    for term in field_sel.split(","):
+        if term.strip() == "":
+            continue
+        match = re.match(r"^\s*([A-Za-z0-9_.]+)\s*(==|=|!=)\s*(.*?)\s*$", term)
+        if match is None:
+            raise ValueError("invalid field selector: {}".format(term.strip()))
+        requirements.append((tuple(match.group(1).split(".")), match.group(2) != "!=", match.group(3)))
+    return requirements
+
+
+def make_sort_value(cell):
+    # numbers are sorted as numbers, "1/2" (ready containers) by the first number.
+    number = cell.split("/", 1)[0]
+    if number.isdigit():
+        return 0, int(number), cell
+    return 1, 0, cell
+
+
+class ObjectIndex:
+    # indexes over the objects of an ObjectCache: selectors, searches and sorted views are answered from memory.
+    # objects are identified by (namespace, name)
+    def __init__(self, columns):
+        self.columns = columns
+        self.status_pos = find_index_in_list(self.columns.titles, "STATUS")
+        self.objects = {}  # key -> object
+        self.rows = {}  # key -> table row (with namespace)
+        self.namespaces = {}  # namespace -> set of keys
+        self.labels = {}  # label key -> { label value -> set of keys }
+        self.nodes = {}  # spec.nodeName -> set of keys
+        self.statuses = {}  # STATUS column -> set of keys
+        # built when needed, dropped when an object changes
+        self.sort_orders = {}  # column position -> list of keys sorted by that column
+        self.names = None  # sorted list of (name, key), for prefix search
+        self.name_text = None  # "\n" + all names separated by "\n", for substring search
+        self.name_offsets = None  # offset of each name in name_text, and its key
+
+    def add(self, obj):
+        metadata = obj.get("metadata", {})
+        key = (metadata.get("namespace", ""), metadata.get("name", ""))
+        if key in self.objects:
+            self.remove(key)
+
+        row = self.columns.make_line(obj)
+        self.objects[key] = obj
+        self.rows[key] = row
+        self.namespaces.setdefault(key[0], set()).add(key)
+        for label_key, label_value in (metadata.get("labels") or {}).items():
+            self.labels.setdefault(label_key, {}).setdefault(label_value, set()).add(key)
+        node = get_path(obj, ("spec", "nodeName"))
+        if node:
+            self.nodes.setdefault(node, set()).add(key)
+        if self.status_pos != -1:
+            self.statuses.setdefault(row[self.status_pos], set()).add(key)
+        self.changed()
+
+    def remove(self, key):
+        obj = self.objects.pop(key, None)
+        if obj is None:
+            return
+        row = self.rows.pop(key)
+        ObjectIndex.discard(self.namespaces, key[0], key)
+        for label_key, label_value in (obj.get("metadata", {}).get("labels") or {}).items():
+            values = self.labels.get(label_key, {})
+            ObjectIndex.discard(values, label_value, key)
+            if not values:
+                self.labels.pop(label_key, None)
+        ObjectIndex.discard(self.nodes, get_path(obj, ("spec", "nodeName")), key)
+        if self.status_pos != -1:
+            ObjectIndex.discard(self.statuses, row[self.status_pos], key)
+        self.changed()
+
+    @staticmethod
+    def discard(index, value, key):
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    def changed(self):
+        if self.sort_orders:
+            self.sort_orders = {}
+        self.names = None
+        self.name_text = None
+
+    def get_sort_key(self, column_pos):
+        if column_pos == -1:
+            # by namespace, then by name
+            return None
+        if self.columns.extractors[column_pos] is column_age:
+            # the age column is sorted by creation time, reversed
+            return lambda key: (self.objects[key].get("metadata", {}).get("creationTimestamp") or "", key)
+        return lambda key: (make_sort_value(self.rows[key][column_pos]), key)
+
+    def is_reversed(self, column_pos):
+        return column_pos != -1 and self.columns.extractors[column_pos] is column_age
+
+    def get_sort_order(self, column_pos):
+        order = self.sort_orders.get(column_pos)
+        if order is None:
+            order = sorted(self.rows, key=self.get_sort_key(column_pos), reverse=self.is_reversed(column_pos))
+            self.sort_orders[column_pos] = order
+        return order
+
+    def get_sort_value(self, key, column_pos):
+        # the sort key of an object as a flat list that ends with the namespace and the name; a live list
+        # puts its rows in order by comparing these in the browser.
+        sort_key = self.get_sort_key(column_pos)
+        if sort_key is None:
+            return list(key)
+        value, key = sort_key(key)
+        return list(value if isinstance(value, tuple) else (value,)) + list(key)
+
+    def matches(self, key, namespace, list_query):
+        # the query of a list for a single object, without the indexes. raises ValueError for bad selectors.
+        obj = self.objects.get(key)
+        if obj is None or (namespace != NO_NAMESPACE and key[0] != namespace):
+            return False
+        labels = obj.get("metadata", {}).get("labels") or {}
+        for label_key, operator, values in parse_label_selector(list_query.label_sel):
+            if operator in ("=", "in") and labels.get(label_key) not in values:
+                return False
+            if operator in ("!=", "notin") and labels.get(label_key) in values:
+                return False
+            if operator == "exists" and label_key not in labels:
+                return False
+            if operator == "!exists" and label_key in labels:
+                return False
+        for path, is_equal, value in parse_field_selector(list_query.field_sel):
+            if (str(get_path(obj, path) or "") == value) != is_equal:
+                return False
+        if list_query.status and (self.status_pos == -1 or self.rows[key][self.status_pos] != list_query.status):
+            return False
+        search = list_query.search
+        if search.startswith("^"):
+            return key[1].startswith(search[1:])
+        return search in key[1]
+
+    def search_names(self, text):
+        # "^abc" - names that start with abc, otherwise names that contain the text.
+        if self.names is None:
+            self.names = sorted((key[1], key) for key in self.objects)
+            self.name_offsets = []
+            parts = []
+            offset = 1
+            for name, key in self.names:
+                self.name_offsets.append(offset)
+                parts.append(name)
+                offset += len(name) + 1
+            self.name_text = "\n" + "\n".join(parts) + "\n"
+
+        if text.startswith("^"):
+            prefix = text[1:]
+            ret = set()
+            for pos in range(bisect.bisect_left(self.names, (prefix,)), len(self.names)):
+                if not self.names[pos][0].startswith(prefix):
+                    break
+                ret.add(self.names[pos][1])
+            return ret
+
+        ret = set()
+        pos = self.name_text.find(text)
+        while pos != -1:
+            name_pos = bisect.bisect_right(self.name_offsets, pos) - 1
+            ret.add(self.names[name_pos][1])
+            # continue after the name that matched
+            pos = self.name_text.find(text, self.name_offsets[name_pos] + len(self.names[name_pos][0]))
+        return ret
+
+    def select_labels(self, keys, label_sel):
+        for label_key, operator, values in parse_label_selector(label_sel):
+            label_values = self.labels.get(label_key, {})
+            if operator in ("=", "in"):
+                matching = set().union(*[label_values.get(value, set()) for value in values])
+                keys = matching if keys is None else keys & matching
+            elif operator == "exists":
+                matching = set().union(*label_values.values())
+                keys = matching if keys is None else keys & matching
+            else:
+                if operator == "!exists":
+                    values = list(label_values.keys())
+                excluded = set().union(*[label_values.get(value, set()) for value in values])
+                keys = (set(self.objects) if keys is None else keys) - excluded
+        return keys
+
+    def select_fields(self, keys, field_sel):
+        for path, is_equal, value in parse_field_selector(field_sel):
+            if path == ("metadata", "namespace"):
+                matching = self.namespaces.get(value, set())
+            elif path == ("spec", "nodeName"):
+                matching = self.nodes.get(value, set())
             else:
-                cli_param = f"-n {self.current_ns}"
+                candidates = self.objects.keys() if keys is None else keys
+                matching = set(key for key in candidates if str(get_path(self.objects[key], path) or "") == value)
+            if is_equal:
+                keys = matching if keys is None else keys & matching
+            else:
+                keys = (set(self.objects) if keys is None else keys) - matching
+        return keys
+
+    def query(self, namespace, label_sel, field_sel, search, status, sort_column, descending):
+        # returns the keys of the matching objects, in the order of the view. raises ValueError for bad selectors.
+        sort_pos = find_index_in_list(self.columns.titles, sort_column)
+        keys = None  # None - all objects
+        if namespace != NO_NAMESPACE:
+            keys = set(self.namespaces.get(namespace, set()))
+        if label_sel:
+            keys = self.select_labels(keys, label_sel)
+        if field_sel:
+            keys = self.select_fields(keys, field_sel)
+        if status:
+            matching = self.statuses.get(status, set())
+            keys = matching if keys is None else keys & matching
+        if search:
+            matching = self.search_names(search)
+            keys = matching if keys is None else keys & matching
+
+        if keys is not None and len(keys) * 16 < len(self.objects):
+            # few matches: sorting these is faster than going through the whole sort order
+            ret = sorted(keys, key=self.get_sort_key(sort_pos), reverse=self.is_reversed(sort_pos))
+        else:
+            order = self.get_sort_order(sort_pos)
+            ret = list(order) if keys is None else [key for key in order if key in keys]
+        if descending:
+            ret.reverse()
+        return ret
 
-        add = ""
+    def make_rows(self, keys, show_namespace):
+        # rows are made again, the age column changes with time
+        if show_namespace:
+            return [self.columns.make_line(self.objects[key]) for key in keys]
+        return [self.columns.make_line(self.objects[key])[1:] for key in keys]
+
+    def get_titles(self, show_namespace):
+        if show_namespace:
+            return self.columns.titles
+        return self.columns.titles[1:]
+
+
+class ObjectCache:
+    # keeps all instances of one resource type in memory; lists once, then follows a watch from the
+    # resource version of that list. Stopped by ObjectCacheRegistry when nobody looked at it for a while.
+    # The keys of the latest changes are kept for the live lists; a live list that is further behind reloads.
+    max_changes = 10000
+    # a watch that is rejected or closed right away is listed again after a delay, that doubles up to this
+    # number of seconds while the watches keep failing.
+    max_relist_delay = 60
+
+    def __init__(self, cluster, oname, api_path):
+        self.cluster = cluster
+        self.oname = oname
+        self.api_path = api_path
+        # cluster scoped objects are in namespace ""
+        self.index = ObjectIndex(cluster.api_resources.get_list_columns(oname, True))
+        self.change_count = 0
+        self.changes = collections.deque(maxlen=self.max_changes)  # keys of the latest changes
+        self.listed_at = 0  # change count of the last list, the live lists from before have to reload
+        self.resource_version = ""
+        self.error = None
+        self.stopped = False
+        self.stream = None
+        self.watch_had_events = False
+        self.last_access = time.time()
+        self.synced = gevent.event.Event()
+        self.greenlet = gevent.spawn(self.run)
+
+    def run(self):
+        relist_delay = 0
+        while not self.stopped:
+            if not self.relist():
+                self.synced.set()
+                return
+            self.synced.set()
+            while not self.stopped and self.watch():
+                gevent.sleep(1)
+            if self.watch_had_events:
+                # the resource version is too old (410 Gone): list again right away
+                relist_delay = 0
+            else:
+                relist_delay = min(max(1, relist_delay * 2), self.max_relist_delay)
+                gevent.sleep(relist_delay)
+
+    def relist(self):
+        output, self.error = self.cluster.backend.get_raw(self.api_path)
+        if self.error is not None:
+            return False
 
-        self.label_sel = ""
-        self.field_sel = ""
+        try:
+            object_list = json.loads(output)
+        except ValueError as err:
+            self.error = "can't parse the list of {}: {}".format(self.oname, err)
+            return False
+        kind = object_list.get("kind", "")
+        if kind.endswith("List"):
+            kind = kind[:-len("List")]
+
+        self.index = ObjectIndex(self.cluster.api_resources.get_list_columns(self.oname, True))
+        self.cluster.relations.clear(self.oname)
+        for obj in object_list.get("items", []):
+            obj.setdefault("kind", kind)
+            obj.setdefault("apiVersion", object_list.get("apiVersion", ""))
+            self.put(obj)
+        self.resource_version = object_list.get("metadata", {}).get("resourceVersion", "")
+        self.changes.clear()
+        self.change_count += 1
+        self.listed_at = self.change_count
+        return True
+
+    def watch(self):
+        # returns False if the watch has to start over with a new list.
+        self.stream = self.cluster.backend.open_watch("{}?watch=true&allowWatchBookmarks=true&resourceVersion={}". \
+                                                      format(self.api_path, self.resource_version))
+        stream = JsonStream()
+        resource_version_valid = True
+        # a watch that failed right away (like 410 Gone as http status) doesn't return any events.
+        has_events = False
+        while resource_version_valid and self.stream is not None:
+            data = self.stream.read1(65536)
+            if not data:
+                break
+            for event in stream.feed(data):
+                has_events = True
+                if not self.apply_event(event):
+                    resource_version_valid = False
+                    break
+        self.stop_stream()
+        self.watch_had_events = has_events
+        return resource_version_valid and has_events
+
+    def apply_event(self, event):
+        event_type = event.get("type")
+        obj = event.get("object", {})
+
+        if event_type == "ERROR":
+            # typically 410 Gone: the resource version is too old, need to list again.
+            logging.info("watch of %s returned error: %s", self.oname, obj.get("message"))
+            return False
+
+        resource_version = obj.get("metadata", {}).get("resourceVersion")
+        if resource_version:
+            self.resource_version = resource_version
+
+        if event_type in ("ADDED", "MODIFIED"):
+            self.put(obj)
+        elif event_type == "DELETED":
+            self.remove(obj)
+        return True
+
+    def put(self, obj):
+        self.index.add(obj)
+        self.cluster.relations.put(self.oname, obj)
+        self.add_change(obj)
+
+    def remove(self, obj):
+        metadata = obj.get("metadata", {})
+        self.index.remove((metadata.get("namespace", ""), metadata.get("name", "")))
+        self.cluster.relations.remove((self.oname, metadata.get("namespace", ""), metadata.get("name", "")))
+        self.add_change(obj)
+
+    def add_change(self, obj):
+        metadata = obj.get("metadata", {})
+        self.changes.append((metadata.get("namespace", ""), metadata.get("name", "")))
+        self.change_count += 1
+
+    def get_changes(self, since):
+        # the keys of the objects that changed after change number since; None if these are no longer known.
+        count = self.change_count - since
+        if since < self.listed_at or count > len(self.changes):
+            return None
+        return set(itertools.islice(self.changes, len(self.changes) - count, None))
+
+    def get_object(self, namespace, name):
+        self.last_access = time.time()
+        if namespace in ("None", NO_NAMESPACE):
+            namespace = ""
+        return self.index.objects.get((namespace, name))
+
+    def make_table(self, namespaced, current_ns, limit, continue_token, list_query):
+        # the continue token of a cached list is the offset of the first object in the page.
+        # returns titles, rows, continue token of the next page, error message
+        self.last_access = time.time()
+        if not namespaced:
+            current_ns = NO_NAMESPACE
+        start = time.perf_counter()
+        try:
+            keys = self.index.query(current_ns, list_query.label_sel, list_query.field_sel, list_query.search, \
+                                    list_query.status, list_query.sort, list_query.descending)
+        except ValueError as err:
+            return None, None, "", str(err)
+        if limit > 0:
+            offset = int(continue_token) if continue_token.isdigit() else 0
+            next_continue = str(offset + limit) if offset + limit < len(keys) else ""
+            keys = keys[offset: offset + limit]
+        else:
+            next_continue = ""
+        show_namespace = namespaced and current_ns == NO_NAMESPACE
+        parsed_lines = self.index.make_rows(keys, show_namespace)
+        metrics.observe(metrics.parse_seconds, time.perf_counter() - start)
+        if len(parsed_lines) == 0:
+            return None, None, "", "No resources found"
+        return self.index.get_titles(show_namespace), parsed_lines, next_continue, None
+
+    def stop(self):
+        self.stopped = True
+        self.stop_stream()
+        self.cluster.relations.clear(self.oname)
+
+    def stop_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class ObjectCacheRegistry:
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.caches = {}
+        self.reaper = None
+
+    def get(self, oname):
+        # returns the synchronized cache for the resource type, starts watching it if needed.
+        # returns None if caching is off or the type can't be watched, then kubectl get is the fallback.
+        if not params.watch_cache:
+            return None
+        return self.watch(oname)
+
+    def watch(self, oname):
+        # like get, also without --watch-cache: the live lists follow the watch of the cache.
+        cache = self.start(oname)
+        if cache is None:
+            return None
+        return self.check_synced(cache, params.cache_sync_timeout)
+
+    def start(self, oname):
+        # returns the cache of the type without waiting for it to be synchronized, starts watching it if needed.
+        # None if the type can't be watched.
+        api_path = self.cluster.api_resources.get_api_path(oname)
+        if api_path is None:
+            return None
+
+        cache = self.caches.get(oname)
+        if cache is None:
+            cache = ObjectCache(self.cluster, oname, api_path)
+            self.caches[oname] = cache
+            if self.reaper is None:
+                self.reaper = gevent.spawn(self.reap)
+        cache.last_access = time.time()
+        return cache
+
+    def lookup(self, oname):
+        # like get, but does not start a watch for a type that is not cached yet.
+        cache = self.caches.get(oname)
+        if cache is None:
+            return None
+        return self.check_synced(cache, 0)
+
+    def check_synced(self, cache, timeout):
+        if not cache.synced.wait(timeout):
+            return None
+        if cache.error is not None:
+            logging.error("can't cache %s of %s: %s", cache.oname, self.cluster.name, cache.error)
+            if self.caches.get(cache.oname) is cache:
+                del self.caches[cache.oname]
+            return None
+        cache.last_access = time.time()
+        return cache
+
+    def reap(self):
+        while True:
+            gevent.sleep(min(params.cache_idle_timeout, 30))
+            now = time.time()
+            for oname, cache in list(self.caches.items()):
+                if now - cache.last_access > params.cache_idle_timeout:
+                    logging.info("stop watching idle resource type %s of %s", oname, self.cluster.name)
+                    del self.caches[oname]
+                    cache.stop()
+
+
+def get_pod_references(namespace, pod_spec):
+    # the config maps, secrets, volume claims and the service account that a pod (or a pod template) uses
+    refs = set()
+    for volume in pod_spec.get("volumes") or []:
+        if "configMap" in volume:
+            refs.add(("configmaps", namespace, volume["configMap"].get("name", "")))
+        if "secret" in volume:
+            refs.add(("secrets", namespace, volume["secret"].get("secretName", "")))
+        if "persistentVolumeClaim" in volume:
+            refs.add(("persistentvolumeclaims", namespace, volume["persistentVolumeClaim"].get("claimName", "")))
+        for source in get_path(volume, ("projected", "sources")) or []:
+            if "configMap" in source:
+                refs.add(("configmaps", namespace, source["configMap"].get("name", "")))
+            if "secret" in source:
+                refs.add(("secrets", namespace, source["secret"].get("name", "")))
+    for container in (pod_spec.get("containers") or []) + (pod_spec.get("initContainers") or []):
+        for env_from in container.get("envFrom") or []:
+            if "configMapRef" in env_from:
+                refs.add(("configmaps", namespace, env_from["configMapRef"].get("name", "")))
+            if "secretRef" in env_from:
+                refs.add(("secrets", namespace, env_from["secretRef"].get("name", "")))
+        for env in container.get("env") or []:
+            value_from = env.get("valueFrom") or {}
+            if "configMapKeyRef" in value_from:
+                refs.add(("configmaps", namespace, value_from["configMapKeyRef"].get("name", "")))
+            if "secretKeyRef" in value_from:
+                refs.add(("secrets", namespace, value_from["secretKeyRef"].get("name", "")))
+    for secret in pod_spec.get("imagePullSecrets") or []:
+        refs.add(("secrets", namespace, secret.get("name", "")))
+    if pod_spec.get("serviceAccountName"):
+        refs.add(("serviceaccounts", namespace, pod_spec["serviceAccountName"]))
+    return refs
+
+
+def get_references(oname, obj):
+    # (resource name, namespace, name) of the objects that an object refers to by name
+    namespace = obj.get("metadata", {}).get("namespace", "")
+    spec = obj.get("spec") or {}
+    if oname == "pods":
+        refs = get_pod_references(namespace, spec)
+        if spec.get("nodeName"):
+            refs.add(("nodes", "", spec["nodeName"]))
+    elif oname == "cronjobs":
+        refs = get_pod_references(namespace, get_path(spec, ("jobTemplate", "spec", "template", "spec")) or {})
+    elif oname == "ingresses":
+        refs = set()
+        backends = [spec.get("defaultBackend") or {}]
+        for rule in spec.get("rules") or []:
+            backends.extend(path.get("backend") or {} for path in get_path(rule, ("http", "paths")) or [])
+        for backend in backends:
+            if get_path(backend, ("service", "name")):
+                refs.add(("services", namespace, backend["service"]["name"]))
+        for tls in spec.get("tls") or []:
+            if tls.get("secretName"):
+                refs.add(("secrets", namespace, tls["secretName"]))
+    elif oname == "persistentvolumeclaims" and spec.get("volumeName"):
+        refs = {("persistentvolumes", "", spec["volumeName"])}
+    else:
+        refs = get_pod_references(namespace, get_path(spec, ("template", "spec")) or {})
+    return {ref for ref in refs if ref[2] != ""}
+
+
+def selector_matches(selector, labels):
+    # selector is (matchLabels, matchExpressions)
+    match_labels, expressions = selector
+    for key, value in match_labels.items():
+        if labels.get(key) != value:
+            return False
+    for expression in expressions:
+        key = expression.get("key", "")
+        operator = expression.get("operator")
+        values = expression.get("values") or []
+        if operator == "In" and labels.get(key) not in values:
+            return False
+        if operator == "NotIn" and labels.get(key) in values:
+            return False
+        if operator == "Exists" and key not in labels:
+            return False
+        if operator == "DoesNotExist" and key in labels:
+            return False
+    return True
+
+
+class RelationNode:
+    def __init__(self, key, obj, refs, selector):
+        metadata = obj.get("metadata", {})
+        self.key = key
+        self.uid = metadata.get("uid", "")
+        self.owners = metadata.get("ownerReferences") or []
+        self.labels = metadata.get("labels") or {}
+        self.refs = refs
+        self.selector = selector
+
+
+class RelationIndex:
+    # relations between the objects in the watch caches of a cluster, updated with every change of the caches:
+    # owner references, the pods that services, network policies and deployments select, and the objects that
+    # pods, workloads and ingresses refer to by name (config maps, secrets, volume claims, services, ...). The
+    # related objects of an object are found in time of the number of its relations, without asking the cluster.
+    # Objects are identified by (resource name, namespace, name). The types of relation_types are watched while
+    # detail pages are shown.
+    relation_types = ("pods", "replicasets", "deployments", "statefulsets", "daemonsets", "jobs", "cronjobs", \
+                      "services", "ingresses", "networkpolicies")
+    # path of the pod selector by type; the selector of a service is a map of labels
+    selector_paths = {"services": ("spec", "selector"), "networkpolicies": ("spec", "podSelector"), \
+                      "deployments": ("spec", "selector"), "poddisruptionbudgets": ("spec", "selector")}
+    max_shown = 50
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.nodes = {}  # key -> RelationNode
+        self.by_uid = {}  # uid -> key
+        self.owned = collections.defaultdict(set)  # owner uid -> keys of the owned objects
+        self.used_by = collections.defaultdict(set)  # key of a referred object -> keys of the objects that refer to it
+        self.pods = collections.defaultdict(set)  # namespace -> keys of the pods
+        self.labels = collections.defaultdict(set)  # (namespace, label, value) -> keys of the pods with the label
+        # (namespace, label, value) -> keys of the objects that select pods with (at least) this label;
+        # a selector without labels is under (namespace, None, None)
+        self.selectors = collections.defaultdict(set)
+
+    @staticmethod
+    def remove_from(index, index_key, key):
+        keys = index.get(index_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[index_key]
+
+    def get_selector(self, oname, obj):
+        path = self.selector_paths.get(oname)
+        if path is None:
+            return None
+        selector = get_path(obj, path)
+        if not isinstance(selector, dict):
+            return None
+        if oname == "services":
+            # a service without a selector selects no pods
+            return (selector, []) if selector else None
+        return selector.get("matchLabels") or {}, selector.get("matchExpressions") or []
+
+    def put(self, oname, obj):
+        metadata = obj.get("metadata", {})
+        key = (oname, metadata.get("namespace", ""), metadata.get("name", ""))
+        self.remove(key)
+        node = RelationNode(key, obj, get_references(oname, obj), self.get_selector(oname, obj))
+        self.nodes[key] = node
+        if node.uid:
+            self.by_uid[node.uid] = key
+        for owner in node.owners:
+            self.owned[owner.get("uid", "")].add(key)
+        for ref in node.refs:
+            self.used_by[ref].add(key)
+        if oname == "pods":
+            self.pods[key[1]].add(key)
+            for label in node.labels.items():
+                self.labels[(key[1],) + label].add(key)
+        if node.selector is not None:
+            self.selectors[(key[1],) + self.get_index_label(node.selector)].add(key)
+
+    @staticmethod
+    def get_index_label(selector):
+        # a selector is indexed under one of its labels, a pod then has to check only the selectors of its labels
+        if selector[0]:
+            return min(selector[0].items())
+        return None, None
+
+    def remove(self, key):
+        node = self.nodes.pop(key, None)
+        if node is None:
+            return
+        if self.by_uid.get(node.uid) == key:
+            del self.by_uid[node.uid]
+        for owner in node.owners:
+            RelationIndex.remove_from(self.owned, owner.get("uid", ""), key)
+        for ref in node.refs:
+            RelationIndex.remove_from(self.used_by, ref, key)
+        if key[0] == "pods":
+            RelationIndex.remove_from(self.pods, key[1], key)
+            for label in node.labels.items():
+                RelationIndex.remove_from(self.labels, (key[1],) + label, key)
+        if node.selector is not None:
+            RelationIndex.remove_from(self.selectors, (key[1],) + RelationIndex.get_index_label(node.selector), key)
+
+    def clear(self, oname):
+        # the objects of a type that is listed again, or no longer watched
+        for key in [key for key in self.nodes if key[0] == oname]:
+            self.remove(key)
+
+    def watch_types(self):
+        # starts the watches, or keeps them from being stopped as idle; returns True while some types are listed.
+        loading = False
+        for oname in self.relation_types:
+            cache = self.cluster.object_caches.start(oname)
+            if cache is not None and not cache.synced.is_set():
+                loading = True
+        return loading
+
+    def get_owner_key(self, namespace, owner):
+        key = self.by_uid.get(owner.get("uid", ""))
+        if key is not None:
+            return key
+        group = owner.get("apiVersion", "").split("/")[0] if "/" in owner.get("apiVersion", "") else ""
+        kind_name = owner.get("kind", "").lower() + ("." + group if group else "")
+        oname = self.cluster.api_resources.get_resource_name(kind_name)
+        return (oname, namespace, owner.get("name", "")) if oname is not None else None
+
+    def get_selected_pods(self, namespace, selector):
+        if selector[0]:
+            # the pods with the least common label of the selector
+            candidates = min((self.labels.get((namespace,) + label, ()) for label in selector[0].items()), key=len)
+        else:
+            candidates = self.pods.get(namespace, ())
+        return [key for key in candidates if selector_matches(selector, self.nodes[key].labels)]
+
+    def get_selecting(self, node):
+        namespace = node.key[1]
+        candidates = set(self.selectors.get((namespace, None, None), ()))
+        for label in node.labels.items():
+            candidates.update(self.selectors.get((namespace,) + label, ()))
+        return [key for key in candidates if selector_matches(self.nodes[key].selector, node.labels)]
+
+    def get_related(self, oname, namespace, name):
+        # returns [(relation, keys of the related objects)]
+        if namespace in ("None", NO_NAMESPACE):
+            namespace = ""
+        key = (oname, namespace, name)
+        node = self.nodes.get(key)
+        ret = []
+        if node is not None:
+            owners = [self.get_owner_key(namespace, owner) for owner in node.owners]
+            ret.append(("owner", [owner for owner in owners if owner is not None]))
+            ret.append(("owns", self.owned.get(node.uid, ())))
+            if node.selector is not None:
+                ret.append(("selects", self.get_selected_pods(namespace, node.selector)))
+            if oname == "pods":
+                ret.append(("selected by", self.get_selecting(node)))
+            ret.append(("uses", node.refs))
+        ret.append(("used by", self.used_by.get(key, ())))
+        return [(relation, keys) for relation, keys in ret if keys]
+
+    def make_html(self, oname, namespace, name, current_ns):
+        loading = self.watch_types()
+        groups = []
+        for relation, keys in self.get_related(oname, namespace, name):
+            keys = sorted(keys)
+            links = [make_objectinfo_link(self.cluster, "get-yaml", key[0], key[2], key[1] or "None", \
+                                          "true" if key[1] else "false", current_ns, \
+                                          html.escape("{}/{}".format(key[0], key[2]))) \
+                     for key in keys[:self.max_shown]]
+            if len(keys) > self.max_shown:
+                links.append("({} more)".format(len(keys) - self.max_shown))
+            groups.append("<b>{}</b>:&nbsp;{}".format(relation, ",&nbsp;".join(links)))
+        if loading:
+            groups.append("(loading)")
+        if not groups:
+            return ""
+        return "<br/>related:&nbsp;" + "&nbsp;|&nbsp;".join(groups)
+
+
+class NamespaceCache(ObjectCache):
+    # the names of all namespaces, for the namespace selector of the home page. Watches the namespaces for
+    # as long as s9k runs; the version changes only when a namespace is added or removed.
+    retry_delay = 10
+
+    def __init__(self, cluster):
+        self.names = set()
+        self.version = 0
+        super().__init__(cluster, "namespaces", "/api/v1/namespaces")
+
+    def run(self):
+        # ObjectCache gives up when the list fails, try again later.
+        while not self.stopped:
+            super().run()
+            if self.error is not None:
+                logging.error("can't list namespaces of %s: %s", self.cluster.name, self.error)
+            gevent.sleep(self.retry_delay)
+
+    def relist(self):
+        names = self.names
+        self.names = set()
+        if super().relist():
+            return True
+        self.names = names
+        return False
+
+    def put(self, obj):
+        super().put(obj)
+        name = obj.get("metadata", {}).get("name", "")
+        if name not in self.names:
+            self.names.add(name)
+            self.version += 1
+
+    def remove(self, obj):
+        super().remove(obj)
+        name = obj.get("metadata", {}).get("name", "")
+        if name in self.names:
+            self.names.discard(name)
+            self.version += 1
+
+
+class NamespaceSelector:
+    # the selector filters the names while typing, in the browser (namespaces.js). The page only has an input
+    # field, the names come from /namespaces/names.json; that is made again when the set of names changed.
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.cache = None
+        self.version = -1
+        self.body = b""
+        self.etag = ""
+
+    def get_cache(self):
+        # the watch starts with the first page that shows the selector.
+        if self.cache is None:
+            self.cache = NamespaceCache(self.cluster)
+        return self.cache
+
+    def make_html(self, namespace):
+        self.get_cache()
+        if namespace == NO_NAMESPACE:
+            namespace = ""
+        return '<span class="namespace-select"><input id="namespace_filter" autocomplete="off" ' \
+            'placeholder="all namespaces" value="{}"><span id="namespace_matches"></span></span>'. \
+            format(html.escape(namespace)) + \
+            '<script>var namespace_home_url = "{0}/"; var namespace_names_url = "{0}/namespaces/names.json";</script>'. \
+            format(self.cluster.url_prefix) + get_script("namespaces.js")
+
+    def make_response(self):
+        cache = self.get_cache()
+        cache.synced.wait(params.cache_sync_timeout)
+        if cache.version != self.version:
+            self.version = cache.version
+            self.body = json.dumps(sorted(cache.names)).encode("utf-8")
+            self.etag = '"{}"'.format(hashlib.sha256(self.body).hexdigest()[:16])
+
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", "Content-Type": "application/json"}
+        if self.etag in bottle.request.headers.get("If-None-Match", ""):
+            return bottle.HTTPResponse(status=304, headers=headers)
+        return bottle.HTTPResponse(self.body, 200, headers)
+
+
+QUANTITY_FACTORS = {"n": 1e-9, "u": 1e-6, "m": 1e-3, "k": 1e3, "M": 1e6, "G": 1e9, "T": 1e12, "P": 1e15, "E": 1e18, \
+                    "Ki": 2 ** 10, "Mi": 2 ** 20, "Gi": 2 ** 30, "Ti": 2 ** 40, "Pi": 2 ** 50, "Ei": 2 ** 60}
+SPARKLINE_CHARS = "\u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+
+
+def parse_quantity(text):
+    # a kubernetes quantity (250m, 128Mi, 2) as a number, nan if it isn't one
+    factor = 1
+    for suffix_len in (2, 1):
+        if text[-suffix_len:] in QUANTITY_FACTORS:
+            factor = QUANTITY_FACTORS[text[-suffix_len:]]
+            text = text[:-suffix_len]
+            break
+    try:
+        return float(text) * factor
+    except ValueError:
+        return math.nan
+
+
+def format_cpu(cores):
+    # like kubectl top: millicores
+    if math.isnan(cores):
+        return ""
+    return "{}m".format(int(round(cores * 1000)))
+
+
+def format_memory(size):
+    if math.isnan(size):
+        return ""
+    return "{}Mi".format(int(round(size / 2 ** 20)))
+
+
+def make_sparkline(values):
+    # one block character per value, its height relative to the largest value; a blank for missing samples.
+    highest = max((value for value in values if not math.isnan(value)), default=0)
+    scale = (len(SPARKLINE_CHARS) - 1) / highest if highest > 0 else 0
+    return "".join(" " if math.isnan(value) else SPARKLINE_CHARS[int(value * scale)] for value in values)
+
+
+class UsageSeries:
+    # the samples of one pod or node: cpu in cores and memory in bytes, in ring buffers of 32 bit floats with a
+    # slot for each sample of the UsageSampler; nan where the object had no sample.
+    __slots__ = ("cpu", "memory", "last_sample")
+
+    def __init__(self, capacity):
+        self.cpu = array.array("f", [math.nan]) * capacity
+        self.memory = array.array("f", [math.nan]) * capacity
+        self.last_sample = -1
+
+
+class UsageSampler:
+    # cpu and memory of the pods and nodes of a cluster, from the metrics api (metrics-server, the source of
+    # kubectl top). A greenlet takes a sample every params.usage_interval seconds, it starts with the first list of
+    # pods or nodes. The samples of params.usage_history hours are kept, 24 hours of 20000 pods at the default
+    # interval take about 50MB. Lists of pods and nodes show the last sample and the recent history of the cpu;
+    # sorted by cpu or memory, the rows of the page are picked by heap selection over the last samples.
+    resource_types = ("pods", "nodes")
+    titles = ["CPU", "MEMORY", "CPU HISTORY"]
+    sort_fields = {"CPU": "cpu", "CPU HISTORY": "cpu", "MEMORY": "memory"}
+    # samples in the history column
+    sparkline_width = 24
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.capacity = max(1, params.usage_history * 3600 // max(1, params.usage_interval))
+        # time of the sample in each slot
+        self.times = array.array("d", [0]) * self.capacity
+        self.sample_count = 0
+        # resource type -> (namespace, name) -> UsageSeries; the namespace of nodes is empty
+        self.series = {oname: {} for oname in self.resource_types}
+        self.error = None
+        self.sampler = None
+
+    def start(self):
+        if self.sampler is None and params.usage_interval > 0:
+            self.sampler = gevent.spawn(self.run)
+
+    def run(self):
+        while True:
+            start = time.perf_counter()
+            self.sample()
+            gevent.sleep(max(0, params.usage_interval - (time.perf_counter() - start)))
+
+    def sample(self):
+        results = {}
+        errors = []
+        for oname in self.resource_types:
+            output, error_message = self.cluster.backend.get_raw("/apis/metrics.k8s.io/v1beta1/" + oname)
+            if error_message is None:
+                try:
+                    results[oname] = UsageSampler.parse_metrics(oname, output)
+                except ValueError as err:
+                    error_message = "can't parse the {} metrics: {}".format(oname, err)
+            if error_message is not None:
+                errors.append(error_message)
+        # the error is logged when it changes, not every interval
+        error_message = "; ".join(errors) or None
+        if error_message is not None and error_message != self.error:
+            logging.error("context %s: no usage samples: %s", self.cluster.name, error_message)
+        self.error = error_message
+        if len(results) != 0:
+            self.add_sample(results)
+
+    @staticmethod
+    def parse_metrics(oname, output):
+        # (namespace, name) -> (cpu, memory) of a PodMetricsList (the sum of the containers) or NodeMetricsList
+        usage = {}
+        for item in json.loads(output).get("items", []):
+            metadata = item.get("metadata", {})
+            if oname == "pods":
+                containers = [container.get("usage", {}) for container in item.get("containers", [])]
+            else:
+                containers = [item.get("usage", {})]
+            usage[metadata.get("namespace", ""), metadata.get("name", "")] = \
+                (sum(parse_quantity(container.get("cpu", "")) for container in containers), \
+                 sum(parse_quantity(container.get("memory", "")) for container in containers))
+        return usage
+
+    def add_sample(self, results):
+        slot = self.sample_count % self.capacity
+        self.times[slot] = time.time()
+        for oname, usage in results.items():
+            series_of_type = self.series[oname]
+            for key, (cpu, memory) in usage.items():
+                series = series_of_type.get(key)
+                if series is None:
+                    series = series_of_type[key] = UsageSeries(self.capacity)
+                series.cpu[slot] = cpu
+                series.memory[slot] = memory
+                series.last_sample = self.sample_count
+        # objects that are not in this sample get nan in its slot, they are dropped when none of the kept samples
+        # is theirs.
+        for series_of_type in self.series.values():
+            for key, series in list(series_of_type.items()):
+                if series.last_sample == self.sample_count:
+                    continue
+                if self.sample_count - series.last_sample >= self.capacity:
+                    del series_of_type[key]
+                else:
+                    series.cpu[slot] = math.nan
+                    series.memory[slot] = math.nan
+        self.sample_count += 1
+
+    def has_samples(self, oname):
+        return len(self.series.get(oname, ())) != 0
+
+    def get_latest(self, oname, key, field):
+        # the last sample of the object, nan if it wasn't in the last sample
+        series = self.series[oname].get(key)
+        if series is None or series.last_sample != self.sample_count - 1:
+            return math.nan
+        return getattr(series, field)[series.last_sample % self.capacity]
+
+    def get_recent(self, values, count):
+        # the last count samples of a ring buffer, the oldest first
+        end = self.sample_count % self.capacity
+        start = end - min(count, self.sample_count, self.capacity)
+        if start >= 0:
+            return values[start:end]
+        return values[start:] + values[:end]
+
+    def make_cells(self, oname, key):
+        series = self.series[oname].get(key)
+        if series is None:
+            return ["", "", ""]
+        return [format_cpu(self.get_latest(oname, key, "cpu")), format_memory(self.get_latest(oname, key, "memory")), \
+                make_sparkline(self.get_recent(series.cpu, self.sparkline_width))]
+
+    def select_top(self, oname, lines, get_key, field, count, descending):
+        # the count rows with the highest (or lowest) last sample, rows without a sample come last.
+        missing = -math.inf if descending else math.inf
+
+        def get_value(line):
+            value = self.get_latest(oname, get_key(line), field)
+            return missing if math.isnan(value) else value
+
+        if descending:
+            return heapq.nlargest(count, lines, key=get_value)
+        return heapq.nsmallest(count, lines, key=get_value)
+
+
+class ListPageFetcher:
+    # gets pages of object lists; while a page is viewed, the next page is fetched in the background.
+    prefetch_ttl = 60
+    max_prefetched = 32
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.prefetched = collections.OrderedDict()  # request arguments -> (start time, greenlet)
+
+    def get(self, oname, namespaced, current_ns, field_sel, label_sel, limit, continue_token):
+        key = (oname, namespaced, current_ns, field_sel, label_sel, limit, continue_token)
+        entry = self.prefetched.pop(key, None)
+        if entry is not None and time.time() - entry[0] < self.prefetch_ttl:
+            result = entry[1].get()
+        else:
+            result = self.cluster.backend.list_objects_page(*key)
+
+        next_continue = result[2]
+        if next_continue != "":
+            next_key = key[:-1] + (next_continue,)
+            self.prefetched[next_key] = (time.time(), gevent.spawn(self.cluster.backend.list_objects_page, *next_key))
+            while len(self.prefetched) > self.max_prefetched:
+                self.prefetched.popitem(last=False)
+        return result
+
+
+class ListQuery:
+    # filters and sort order of an object list. With the watch cache these are answered by the ObjectIndex,
+    # otherwise the selectors are passed to kubectl, search and status filter the rows that it returned.
+    def __init__(self, label_sel, field_sel, search, status, sort, descending):
+        self.label_sel = label_sel or ""
+        self.field_sel = field_sel or ""
+        self.search = search or ""
+        self.status = status or ""
+        self.sort = sort or ""
+        self.descending = descending
+
+    @staticmethod
+    def from_request(request_params):
+        return ListQuery(request_params.get("labelsel"), request_params.get("fieldsel"), request_params.get("search"), \
+                         request_params.get("status"), request_params.get("sort"), request_params.get("order") == "desc")
+
+    def make_url_query(self):
+        query = {"labelsel": self.label_sel, "fieldsel": self.field_sel, "search": self.search, "status": self.status}
+        if self.sort != "":
+            query["sort"] = self.sort
+            query["order"] = "desc" if self.descending else "asc"
+        return query
+
+    def filter_rows(self, titles, parsed_lines):
+        # search and status filter for rows that don't come from the cache.
+        name_pos = find_index_in_list(titles, "NAME")
+        status_pos = find_index_in_list(titles, "STATUS")
+        if self.search != "" and name_pos != -1:
+            if self.search.startswith("^"):
+                parsed_lines = [line for line in parsed_lines if line[name_pos].startswith(self.search[1:])]
+            else:
+                parsed_lines = [line for line in parsed_lines if self.search in line[name_pos]]
+        if self.status != "" and status_pos != -1:
+            parsed_lines = [line for line in parsed_lines if line[status_pos] == self.status]
+        return parsed_lines
 
-        if field_sel and field_sel != "":
-            self.field_sel = field_sel
-            add += "--field-selector {}".format(field_sel)
 
-        if label_sel and label_sel != "":
-            self.label_sel = label_sel
-            add += "--selector {}".format(label_sel)
+class ObjectListScreen:
+    # a live list comes from the watch cache (started for it, also without --watch-cache), the page then gets the
+    # changes over a websocket (LiveListUpdates). Lists of pods and nodes have the usage columns of the
+    # UsageSampler, once it has samples; sorted by one of these the list is not live.
+    def __init__(self, cluster, oname, namespaced, list_query, current_ns, limit, continue_token, live=False):
+        self.cluster = cluster
+        self.namespaced = namespaced
+        self.object_type = oname
+        self.current_ns = current_ns
 
-        cmd = "{} get {} -o wide {} --show-labels {}".format(
-            params.command_name, oname, cli_param, add)
-        run_command = RunCommand(cmd)
-        if run_command.exit_code == 0 and len(run_command.lines) != 0:
-            text_command = TextCommand(run_command)
-            self.name_index = find_index_in_list(text_command.titles, "NAME")
-            self.namespace_index = find_index_in_list(text_command.titles, "NAMESPACE")
+        self.list_query = list_query
+        self.limit = limit
+        self.continue_token = continue_token
+        self.next_continue = ""
+        self.html_table = None
 
-            self.html_table = HtmlTable(text_command.titles, text_command.parsed_lines)
+        if oname in UsageSampler.resource_types:
+            cluster.usage.start()
+        self.show_usage = cluster.usage.has_samples(oname)
+        self.usage_field = UsageSampler.sort_fields.get(list_query.sort) if self.show_usage else None
+        if self.usage_field is not None:
+            # the page is selected from all rows (select_usage_page)
+            live = False
+            titles, parsed_lines, _, self.error_message, self.object_cache = cluster.list_objects( \
+                oname, namespaced == "true", current_ns, list_query, 0, "")
         else:
-            self.html_table = None
-            self.error_message = make_error_message(run_command)
+            titles, parsed_lines, self.next_continue, self.error_message, self.object_cache = cluster.list_objects( \
+                oname, namespaced == "true", current_ns, list_query, limit, continue_token, live)
+        self.live = live and self.object_cache is not None
+        if self.live:
+            # the live list sends the changes after this one
+            self.change_count = self.object_cache.change_count
+            self.sort_pos = find_index_in_list(self.object_cache.index.columns.titles, list_query.sort)
+        if titles is not None:
+            self.init_table(titles, parsed_lines)
+
+    def set_table(self, titles, parsed_lines):
+        self.name_index = find_index_in_list(titles, "NAME")
+        self.namespace_index = find_index_in_list(titles, "NAMESPACE")
+
+        self.html_table = HtmlTable(titles, parsed_lines)
+
+    def init_table(self, titles, parsed_lines):
+        self.set_table(titles, parsed_lines)
+        if self.usage_field is not None:
+            self.select_usage_page()
+        if self.show_usage:
+            self.html_table.titles = titles + UsageSampler.titles
+            self.html_table.parsed_lines = self.add_usage_cells(self.html_table.parsed_lines)
+        if self.object_cache is not None:
+            self.html_table.sort_url = self.make_sort_url
+        if self.live:
+            self.html_table.row_key = self.make_row_key
+        # bulk actions need the kind of the objects
+        if self.cluster.api_resources.get_kind(self.object_type) is not None:
+            self.html_table.select_value = self.make_select_value
+
+    def select_usage_page(self):
+        # the rows of the page with the highest (lowest) cpu or memory, the continue token is the offset of the page.
+        offset = int(self.continue_token) if self.continue_token.isdigit() else 0
+        parsed_lines = self.html_table.parsed_lines
+        count = offset + self.limit if self.limit > 0 else len(parsed_lines)
+        parsed_lines = self.cluster.usage.select_top(self.object_type, parsed_lines, self.get_line_key, \
+                                                     self.usage_field, count, self.list_query.descending)
+        if self.limit > 0:
+            parsed_lines = parsed_lines[offset:]
+            if count < len(self.html_table.parsed_lines):
+                self.next_continue = str(count)
+        self.html_table.parsed_lines = parsed_lines
+
+    def add_usage_cells(self, parsed_lines):
+        usage = self.cluster.usage
+        return [line + usage.make_cells(self.object_type, self.get_line_key(line)) for line in parsed_lines]
 
     def make_html(self):
         add = ""
@@ -453,42 +3691,457 @@ class ObjectListScreen:
             else:
                 add = "|&nbsp;View objects from all namespaces"
 
-        ret = get_home_link(self.current_ns)
-        ret += self.get_self_link() + "&nbsp;" + add + '</br>'
+        ret = get_home_link(self.cluster, self.current_ns)
+        ret += self.get_self_link() + "&nbsp;" + add + clusters.make_fanout_link(self.object_type, self.namespaced, \
+                                                                            self.current_ns, self.list_query) + \
+            self.make_live_link() + self.make_pod_logs_link() + self.make_usage_links() + '</br>'
 
         ret += self.make_query_fields()
 
-        if self.html_table is not None:
-            return ret + self.html_table.make_html(None, self.make_object_link, False, '')
-        return ret + self.error_message
+        if self.html_table is None:
+            yield ret + self.error_message + self.make_live_script()
+            return
+
+        if self.html_table.select_value is None:
+            yield ret + self.make_page_links()
+            yield from self.html_table.render(None, self.make_object_link, False, '')
+            yield self.make_page_links() + self.make_live_script()
+            return
+
+        yield ret + self.make_page_links() + self.make_bulk_form()
+        yield from self.html_table.render(None, self.make_object_link, False, '')
+        yield '</form>' + self.make_page_links() + self.make_live_script()
+
+    def make_pod_logs_link(self):
+        # the logs of the pods of the list, for its label selector
+        if self.object_type != "pods":
+            return ""
+        return '&nbsp;|&nbsp;<a href="{}">logs</a>'.format(html.escape( \
+            make_pod_logs_url(self.cluster, self.current_ns, self.list_query.label_sel)))
+
+    def make_usage_links(self):
+        if not self.show_usage:
+            return ""
+        ret = ""
+        for title in ("CPU", "MEMORY"):
+            query = {"limit": self.limit}
+            query.update(self.list_query.make_url_query())
+            query["sort"] = title
+            query["order"] = "desc"
+            ret += '&nbsp;|&nbsp;<a href="{}?{}">top {}</a>'.format( \
+                html.escape(make_objectinstance_url(self.cluster, self.object_type, self.namespaced, self.current_ns)), \
+                html.escape(urllib.parse.urlencode(query)), title.lower())
+        return ret
+
+    def make_live_link(self):
+        if self.live:
+            return '&nbsp;|&nbsp;live updates<span id="live_status"></span>&nbsp;<a href="{}">stop</a>'.format( \
+                html.escape(self.make_page_url("", False)))
+        return '&nbsp;|&nbsp;<a href="{}">live updates</a>'.format(html.escape(self.make_page_url("", True)))
+
+    def make_live_script(self):
+        if not self.live:
+            return ""
+        query = self.list_query.make_url_query()
+        query["since"] = self.change_count
+        if self.show_usage:
+            query["usage"] = "1"
+        live_url = "{}/wslist/{}/{}/{}?{}".format(self.cluster.url_prefix, self.object_type, self.namespaced, \
+                                                  self.current_ns, urllib.parse.urlencode(query))
+        # rows that sort after the last row belong to the next page, if there is one.
+        return '<script>var live_url = {}; var live_page_url = {}; var live_descending = {}; ' \
+            'var live_complete = {};</script>'.format( \
+                json.dumps(live_url), json.dumps(self.make_page_url(self.continue_token, True)), \
+                json.dumps(self.list_query.descending != self.object_cache.index.is_reversed(self.sort_pos)), \
+                json.dumps(self.next_continue == "")) + get_script("live.js")
+
+    def make_page_links(self):
+        if self.continue_token == "" and self.next_continue == "":
+            return ""
+
+        ret = ""
+        if self.continue_token != "":
+            ret += '<a href="{}">first page</a>&nbsp;'.format(self.make_page_url(""))
+        if self.next_continue != "":
+            ret += '<a href="{}">next page</a>'.format(self.make_page_url(self.next_continue))
+        return ret + '<br/>'
+
+    def make_page_url(self, continue_token, live=None):
+        query = {"limit": self.limit, "continue": continue_token}
+        query.update(self.list_query.make_url_query())
+        if self.live if live is None else live:
+            query["live"] = "1"
+        return "{}?{}".format(make_objectinstance_url(self.cluster, self.object_type, self.namespaced, self.current_ns), \
+                              urllib.parse.urlencode(query))
+
+    def make_sort_url(self, column_pos):
+        # a click on the title of the sorted column reverses the order
+        title = self.html_table.titles[column_pos]
+        query = {"limit": self.limit}
+        query.update(self.list_query.make_url_query())
+        if self.live:
+            query["live"] = "1"
+        query["sort"] = title
+        query["order"] = "desc" if self.list_query.sort == title and not self.list_query.descending else "asc"
+        return "{}?{}".format(make_objectinstance_url(self.cluster, self.object_type, self.namespaced, self.current_ns), \
+                              urllib.parse.urlencode(query))
 
     def get_self_link(self):
-        return make_objectinstance_link(self.object_type, self.namespaced, self.current_ns, self.object_type)
+        return make_objectinstance_link(self.cluster, self.object_type, self.namespaced, self.current_ns, \
+                                        self.object_type)
+
+    def make_form_url(self):
+        return make_objectinstance_url(self.cluster, self.object_type, self.namespaced, self.current_ns)
 
-    def make_object_link(self, line, title_pos):
+    def make_object_link(self, line):
         if self.namespace_index != -1:
-            link = make_objectinfo_link(
-                "get-yaml", self.object_type, line[self.name_index],
-                line[self.namespace_index],
-                self.namespaced, self.current_ns, line[title_pos])
+            namespace = line[self.namespace_index]
         else:
-            link = make_objectinfo_link(
-                "get-yaml", self.object_type, line[self.name_index], self.current_ns,
-                self.namespaced, self.current_ns, line[title_pos])
+            namespace = self.current_ns
+        return make_objectinfo_url(self.cluster, "get-yaml", self.object_type, line[self.name_index], namespace, \
+                                   self.namespaced, self.current_ns)
+
+    def get_line_key(self, line):
+        # (namespace, name) of the object of a row, the namespace is empty for objects that are not namespaced
+        if self.namespace_index != -1:
+            return line[self.namespace_index], line[self.name_index]
+        if self.namespaced == "true":
+            return self.current_ns, line[self.name_index]
+        return "", line[self.name_index]
+
+    def make_select_value(self, line):
+        return "{}/{}".format(*self.get_line_key(line))
 
-        return link
+    def make_row_key(self, line):
+        return json.dumps(self.object_cache.index.get_sort_value(self.get_line_key(line), self.sort_pos))
+
+    def make_bulk_form(self):
+        # the checked rows of the table are sent with this form
+        return get_script("bulk.js") + '''<form method="post" action="{}" onsubmit="return confirmBulk(event);">\
+<input type="hidden" name="namespaced" value="{}"><input type="hidden" name="current_ns" value="{}">\
+Selected objects:&nbsp;<button type="submit" name="action" value="edit">edit</button>&nbsp;\
+<button type="submit" name="action" value="delete">delete</button>&nbsp;\
+<label><input type="checkbox" name="dryrun" value="1" checked>server dry run</label></br>'''.format( \
+            html.escape(make_bulk_url(self.cluster, self.object_type)), html.escape(self.namespaced), \
+            html.escape(self.current_ns))
 
     def make_query_fields(self):
-        return '''<form method="post" action="/objectinstances/{}/{}/{}"><table><tr>\
+        list_query = self.list_query
+        return '''<form method="post" action="{}"><table><tr>\
 <td width="1%">LabelSelector</td>\
 <td><input name="labelsel" value="{}"></td></tr>\
-<tr><td>FieldSelector:</td><td><input name="fieldsel" value="{}"></td></tr></table>\
-<input type="submit" style="display: none" /></form>'''.format(self.object_type, self.namespaced, self.current_ns, \
-                                                               self.label_sel, self.field_sel)
+<tr><td>FieldSelector:</td><td><input name="fieldsel" value="{}"></td></tr>\
+<tr><td>Search:</td><td><input name="search" value="{}" title="part of the name, ^ for the start of the name"></td></tr>\
+<tr><td>Status:</td><td><input name="status" value="{}"></td></tr>\
+<tr><td>PageSize:</td><td><input name="limit" value="{}"></td></tr></table>\
+<input type="hidden" name="sort" value="{}"><input type="hidden" name="order" value="{}">{}\
+<input type="submit" style="display: none" /></form>'''.format(self.make_form_url(), \
+                                                               html.escape(list_query.label_sel), \
+                                                               html.escape(list_query.field_sel), \
+                                                               html.escape(list_query.search), \
+                                                               html.escape(list_query.status), self.limit, \
+                                                               html.escape(list_query.sort), \
+                                                               "desc" if list_query.descending else "asc", \
+                                                               '<input type="hidden" name="live" value="1">' \
+                                                               if self.live else "")
+
+
+class LiveListUpdates(ObjectListScreen):
+    # the changes of a live list page, sent over a websocket: the rows that were added or changed since the page
+    # was made (html, like the rows of the page) and the keys of the rows that were removed. Every
+    # params.live_update_interval seconds the keys that changed in the watch cache are checked against the query of
+    # the page; the work and the data sent depend on the number of changes, not on the length of the list.
+    def __init__(self, cluster, oname, namespaced, list_query, current_ns, change_count, show_usage=False):
+        self.cluster = cluster
+        self.namespaced = namespaced
+        self.object_type = oname
+        self.current_ns = current_ns
+        self.list_query = list_query
+        self.limit = 0
+        self.live = True
+        self.change_count = change_count
+        # the rows have the usage columns if the page has them
+        self.show_usage = show_usage
+        self.usage_field = None
+        self.show_namespace = namespaced == "true" and current_ns == NO_NAMESPACE
+        self.object_cache = cluster.object_caches.watch(oname)
+        if self.object_cache is not None:
+            index = self.object_cache.index
+            self.sort_pos = find_index_in_list(index.columns.titles, list_query.sort)
+            self.init_table(index.get_titles(self.show_namespace), [])
+
+    def run(self, web_socket):
+        if self.object_cache is None:
+            return
+        try:
+            parse_label_selector(self.list_query.label_sel)
+            parse_field_selector(self.list_query.field_sel)
+        except ValueError:
+            return
+
+        closed = gevent.event.Event()
+
+        def wait_for_close():
+            while web_socket.receive() is not None:
+                pass
+            closed.set()
+
+        close_watcher = gevent.spawn(wait_for_close)
+        try:
+            while not closed.wait(params.live_update_interval):
+                message = self.make_update()
+                if message is not None:
+                    web_socket.send(json.dumps(message))
+                    if "reload" in message:
+                        return
+        except WebSocketError:
+            pass
+        finally:
+            close_watcher.kill()
+
+    def make_update(self):
+        # returns the message for the changes since the last one, None if nothing changed.
+        cache = self.object_cache
+        changes = cache.get_changes(self.change_count)
+        if changes is None or self.cluster.object_caches.lookup(self.object_type) is not cache:
+            # listed again, or too many changes: the page is made again.
+            return {"reload": True}
+        self.change_count = cache.change_count
+        if len(changes) == 0:
+            return None
+
+        namespace = self.current_ns if self.namespaced == "true" else NO_NAMESPACE
+        keys = []
+        removed = []
+        for key in changes:
+            if cache.index.matches(key, namespace, self.list_query):
+                keys.append(key)
+            elif namespace == NO_NAMESPACE or key[0] == namespace:
+                removed.append(list(key))
+        if len(keys) == 0 and len(removed) == 0:
+            return None
+        rows = ""
+        if len(keys) != 0:
+            lines = cache.index.make_rows(keys, self.show_namespace)
+            if self.show_usage:
+                lines = self.add_usage_cells(lines)
+            rows = self.html_table.render_rows(lines, self.make_object_link, \
+                                               *self.html_table.make_row_template(None, self.make_object_link))
+        return {"rows": rows, "removed": removed}
+
+
+class FanoutListScreen(ObjectListScreen):
+    # the objects of one type in all contexts, in one table with the context in the first column. The contexts
+    # are asked at the same time, each in a greenlet; the page waits for the slowest one, but not longer than
+    # params.fanout_timeout seconds. Each context shows at most limit objects, the first page of its own list.
+    def __init__(self, oname, namespaced, list_query, current_ns, limit, context_names):
+        self.cluster = clusters.default
+        self.namespaced = namespaced
+        self.object_type = oname
+        self.current_ns = current_ns
+        self.list_query = list_query
+        self.limit = limit
+        self.continue_token = ""
+        self.next_continue = ""
+        self.html_table = None
+        self.error_message = ""
+        self.messages = []
+        self.live = False
+
+        selected = [cluster for cluster in clusters.all if len(context_names) == 0 or cluster.name in context_names]
+        requests = [spawn_for_request(cluster.list_objects, oname, namespaced == "true", current_ns, list_query, \
+                                      limit, "") for cluster in selected]
+        gevent.joinall(requests, timeout=params.fanout_timeout)
+
+        results = []
+        for cluster, request in zip(selected, requests):
+            if not request.ready():
+                # the greenlet is not killed, that would leave its kubectl process behind; it ends on its own.
+                self.messages.append((cluster, "no answer within {} seconds".format(params.fanout_timeout)))
+            elif not request.successful():
+                self.messages.append((cluster, getattr(request.exception, "body", None) or str(request.exception)))
+            else:
+                titles, parsed_lines, next_continue, error_message, _ = request.value
+                if titles is not None:
+                    results.append((cluster, titles, parsed_lines))
+                elif error_message != "No resources found":
+                    self.messages.append((cluster, error_message))
+                if next_continue != "":
+                    self.messages.append((cluster, "more objects in the list of the context"))
+        self.merge(results)
+
+    def merge(self, results):
+        # the columns of all contexts, in the order of their first appearance; the server side printing
+        # of different kubernetes versions may have different columns.
+        if len(results) == 0:
+            self.error_message = "No resources found"
+            return
+        titles = ["CONTEXT"]
+        for _, cluster_titles, _ in results:
+            titles.extend(title for title in cluster_titles if title not in titles)
+
+        parsed_lines = []
+        for cluster, cluster_titles, cluster_lines in results:
+            positions = [find_index_in_list(cluster_titles, title) for title in titles[1:]]
+            for line in cluster_lines:
+                parsed_lines.append([cluster.name] + [line[pos] if pos != -1 else "" for pos in positions])
+        self.set_table(titles, parsed_lines)
+
+    def make_html(self):
+        add = ""
+        if self.namespaced == "true":
+            if self.current_ns != NO_NAMESPACE:
+                add = f"|&nbsp;Selected Namespace: {self.current_ns}"
+            else:
+                add = "|&nbsp;View objects from all namespaces"
+
+        ret = get_home_link(self.cluster, self.current_ns)
+        ret += self.get_self_link() + "&nbsp;in all contexts&nbsp;" + add + '</br>'
+        ret += self.make_query_fields()
+        for cluster, message in self.messages:
+            ret += '{}: {}</br>'.format(make_objectinstance_link(cluster, self.object_type, self.namespaced, \
+                                                                 self.current_ns, html.escape(cluster.name)), \
+                                        html.escape(message))
+
+        if self.html_table is None:
+            yield ret + self.error_message
+            return
+
+        yield ret
+        yield from self.html_table.render(None, self.make_object_link, False, '')
+
+    def make_form_url(self):
+        return make_fanout_url(self.object_type, self.namespaced, self.current_ns)
+
+    def make_object_link(self, line):
+        cluster = clusters.find(line[0])
+        if self.namespace_index != -1:
+            namespace = line[self.namespace_index]
+        else:
+            namespace = self.current_ns
+        return make_objectinfo_url(cluster, "get-yaml", self.object_type, line[self.name_index], namespace, \
+                                   self.namespaced, self.current_ns)
+
+
+class ObjectDetail:
+    # an object of a detail page, fetched once as json: the yaml and json views and the names of the
+    # containers are made from this copy. Describe runs in the background once a tab of the page is shown.
+    describe_request = ['describe', '{} describe {} {} {}', False]
+    # describe shows the events of the object too, these change without a new resourceVersion.
+    describe_ttl = 10
+
+    def __init__(self, backend, source, obj, expires):
+        self.backend = backend
+        # kubectl doesn't show managed fields either; the object may belong to the watch cache, don't change it.
+        self.obj = dict(obj)
+        metadata = obj.get("metadata", {})
+        if "managedFields" in metadata:
+            self.obj["metadata"] = {key: value for key, value in metadata.items() if key != "managedFields"}
+        self.source = source
+        self.resource_version = metadata.get("resourceVersion", "")
+        self.expires = expires
+        self.texts = {}  # screen type -> text
+        self.describe = None  # gevent.event.AsyncResult of (source, output, error message)
+        self.describe_expires = 0
+
+    def is_current(self, watched_obj):
+        # the watch cache knows the current version; without one a copy is used until it expires.
+        if watched_obj is not None:
+            return watched_obj.get("metadata", {}).get("resourceVersion", "") == self.resource_version
+        return self.expires > time.time()
+
+    def get_text(self, screentype):
+        text = self.texts.get(screentype)
+        if text is None:
+            if screentype == "get-yaml":
+                text = format_yaml(self.obj)
+            else:
+                text = json.dumps(self.obj, indent=4)
+            self.texts[screentype] = text
+        return text
+
+    def list_containers(self):
+        return [container["name"] for container in get_path(self.obj, ("spec", "containers")) or []]
+
+    def prefetch_describe(self, otype, oname, namespace):
+        # runs with the priority of background work, a page that is waiting for it comes first.
+        if self.describe is None or (self.describe.ready() and self.describe_expires < time.time()):
+            self.describe = gevent.event.AsyncResult()
+            self.describe_expires = time.time() + self.describe_ttl
+            gevent.spawn(ObjectDetail.run_describe, self.backend, self.describe, otype, oname, namespace)
+
+    @staticmethod
+    def run_describe(backend, result, otype, oname, namespace):
+        try:
+            result.set(backend.get_object_text(ObjectDetail.describe_request, otype, oname, namespace))
+        except Exception as exc:
+            result.set_exception(exc)
+
+    def get_describe(self, otype, oname, namespace):
+        self.prefetch_describe(otype, oname, namespace)
+        describe = self.describe
+        describe.wait()
+        if not describe.successful() or describe.value[1] is None:
+            # a failed describe runs again when the tab is opened the next time.
+            if self.describe is describe:
+                self.describe = None
+        return describe.get()
+
+
+class ObjectDetailCache:
+    # the objects of recently opened detail pages, by type, namespace and name. Switching between the tabs
+    # of the page (get-yaml, get-json, describe) and the attach links of a pod don't run kubectl again.
+    # A copy is used while its resourceVersion is the one in the watch cache of its type, without a watch
+    # cache for ttl seconds. Saving or deleting objects drops the copies of their type (in this process).
+    ttl = 10
+    max_entries = 64
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.entries = collections.OrderedDict()  # (otype, namespace, oname) -> ObjectDetail
+
+    def get(self, otype, oname, namespace):
+        # returns the object detail and an error message
+        key = (otype, namespace, oname)
+        watched_obj = self.get_watched(otype, oname, namespace)
+        detail = self.entries.get(key)
+        if detail is not None and detail.is_current(watched_obj):
+            self.entries.move_to_end(key)
+            return detail, None
+
+        if watched_obj is not None:
+            source = self.cluster.backend.make_object_source(otype, oname, namespace)
+            detail = ObjectDetail(self.cluster.backend, source, watched_obj, 0)
+        else:
+            source, obj, error_message = self.cluster.backend.get_object_json(otype, oname, namespace)
+            if obj is None:
+                self.entries.pop(key, None)
+                return None, error_message
+            detail = ObjectDetail(self.cluster.backend, source, obj, time.time() + self.ttl)
+
+        self.entries[key] = detail
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return detail, None
+
+    def get_watched(self, otype, oname, namespace):
+        # only uses a cache that is already watched, doesn't start a watch for a single object.
+        object_cache = self.cluster.object_caches.lookup(otype)
+        if object_cache is None:
+            return None
+        return object_cache.get_object(namespace, oname)
+
+    def invalidate(self, resource=None):
+        for key in list(self.entries):
+            if resource is None or key[0] == resource:
+                del self.entries[key]
+
 
 class ObjectDetailScreenBase:
-    def __init__(self, urlbase, screentype, otype, oname, namespace, namespaced, request_types, current_ns):
+    def __init__(self, cluster, urlbase, screentype, otype, oname, namespace, namespaced, request_types, current_ns):
 
+        self.cluster = cluster
         self.request_types = request_types
         self.urlbase = urlbase
 
@@ -498,37 +4151,54 @@ class ObjectDetailScreenBase:
         self.current_ns = current_ns  # for home linke
 
         self.html_header = self.make_hdr_links(screentype, otype, oname, namespace, namespaced)
+        self.related = cluster.relations.make_html(otype, namespace if namespaced == "true" else "", oname, current_ns)
+        self.html_header += self.related
         self.html = self.html_header
 
+        self.add_content(screentype, otype, oname, namespace)
+
+    def add_content(self, screentype, otype, oname, namespace):
         for request_def in self.request_types:
             if screentype == request_def[0]:
-                cmd = ObjectDetailScreen.make_kubectl_cmd(request_def, namespace, otype, oname)
-                self.add_table(cmd, request_def[2])
+                self.add_table(request_def, otype, oname, namespace)
                 return
         logging.error("Illegal screen type %s", screentype)
 
     @staticmethod
-    def make_kubectl_cmd(request_def, namespace, otype, oname):
+    def make_kubectl_cmd(command_name, request_def, namespace, otype, oname):
         nspace = ""
         if namespace != 'None':
             nspace = '-n {}'.format(namespace)
-        cmd = request_def[1].format(params.command_name, otype, oname, nspace)
+        cmd = request_def[1].format(command_name, otype, oname, nspace)
         return cmd
 
-    def add_table(self, cmd, is_editable):
-        run_command = RunCommand(cmd, False)
-        if run_command.exit_code == 0 and run_command.output != "":
-            html_table = HtmlTable([cmd], run_command.output)
-            self.html += html_table.make_html(None, None, is_editable, \
-                                              ['/editobj/apply', '/editobj/delete'])
+    def add_table(self, request_def, otype, oname, namespace):
+        # the yaml and json views are made from the fetched object, describe is fetched for the next tab.
+        detail, error_message = self.cluster.object_details.get(otype, oname, namespace)
+        if detail is None:
+            self.html += error_message
+            return
+        if request_def[0] == "describe":
+            source, output, error_message = detail.get_describe(otype, oname, namespace)
+        else:
+            detail.prefetch_describe(otype, oname, namespace)
+            if detail.resource_version != "":
+                # the yaml and json views change with the resourceVersion and the related objects only
+                check_etag(detail.resource_version, self.related)
+            source, output = detail.source, detail.get_text(request_def[0])
+        if output is not None:
+            html_table = HtmlTable([source], output)
+            self.html += html_table.make_html(None, None, request_def[2], \
+                                              [self.cluster.url_prefix + '/editobj/apply', \
+                                               self.cluster.url_prefix + '/editobj/delete'])
         else:
-            self.html += make_error_message(run_command)
+            self.html += error_message
 
     def make_html(self):
         return self.html
 
     def make_hdr_links(self, screen_type, otype, oname, namespace, isnamespaced):
-        ret = get_home_link(self.current_ns)
+        ret = get_home_link(self.cluster, self.current_ns)
 
         ret += self.make_back_link(otype, isnamespaced) + "&nbsp;"
 
@@ -537,7 +4207,7 @@ class ObjectDetailScreenBase:
                 ret += '<b>'
 
             link = make_objectinfo_link(
-                request_def[0], otype,
+                self.cluster, request_def[0], otype,
                 oname, namespace, isnamespaced, self.namespace, request_def[0], self.urlbase)
 
             ret += link
@@ -549,190 +4219,1360 @@ class ObjectDetailScreenBase:
         if otype == "pods":
             container_names = self.list_containers()
             for container_name in container_names:
-                ret += '<a href="/shell-attach/{}/{}/{}/{}/{}">attach-{}</a>'. \
-                    format(isnamespaced, oname, namespace, container_name, self.namespace, container_name)
+                ret += '<a href="{}/shell-attach/{}/{}/{}/{}/{}">attach-{}</a>'. \
+                    format(self.cluster.url_prefix, isnamespaced, oname, namespace, container_name, self.namespace, \
+                           container_name)
+        elif isnamespaced == "true":
+            ret += self.make_pod_logs_link(otype, oname, namespace)
         return ret
 
+    def make_pod_logs_link(self, otype, oname, namespace):
+        # the logs of all pods of a workload (or of a service): the pods that match its selector
+        detail, _ = self.cluster.object_details.get(otype, oname, namespace)
+        if detail is None:
+            return ""
+        selector = get_path(detail.obj, ("spec", "selector"))
+        if not isinstance(selector, dict) or len(selector) == 0:
+            return ""
+        return '<a href="{}">pod-logs</a>'.format(html.escape(make_pod_logs_url(self.cluster, namespace, \
+                                                                                make_label_selector(selector))))
+
     def make_back_link(self, otype, isnamespaced):
-        return make_objectinstance_link(otype, isnamespaced, self.namespace, otype)
+        return make_objectinstance_link(self.cluster, otype, isnamespaced, self.namespace, otype)
 
     def list_containers(self):
-        namespace_opt = ""
-        if self.namespaced:
-            namespace_opt = '-n {}'.format(self.namespace)
-
-        list_cmd = "{} get pods {} {} -o jsonpath='{}'". \
-            format(params.command_name, namespace_opt, self.oname,
-                   '{.spec.containers[*].name}')
-
-        command = RunCommand(list_cmd, False)
-
-        if command.exit_code != 0:
+        detail, _ = self.cluster.object_details.get("pods", self.oname, self.namespace)
+        if detail is None:
             return []
-
-        print("list_cmd: {} out: {}".format(list_cmd, command.output))
-        return command.output.split()
+        return detail.list_containers()
 
 
 class ObjectDetailScreen(ObjectDetailScreenBase):
-    def __init__(self, screentype, otype, oname, namespace, namespaced, current_ns):
-        request_types = [['describe', '{} describe {} {} {}', False], \
+    def __init__(self, cluster, screentype, otype, oname, namespace, namespaced, current_ns):
+        request_types = [ObjectDetail.describe_request, \
                          ['get-yaml', '{} get {} {} {} -o yaml', True], \
                          ['get-json', '{} get {} {} {} -o json', False], \
                          ['logs', '{} logs {}/{} {}', False]]
 
-        super().__init__("objectinfo", screentype, otype, oname, \
+        super().__init__(cluster, "objectinfo", screentype, otype, oname, \
                          namespace, namespaced, request_types, current_ns)
 
 
+class LogScreen(ObjectDetailScreen):
+    # the log is streamed to the browser while kubectl is writing it, only one page of lines is shown.
+    # Page 0 has the last log_page_lines lines, page 1 the lines before that, etc. kubectl logs can only start from
+    # the end (--tail) or go forward in time (--since-time), a page further back reads the pages after it too;
+    # the pages go back params.max_log_pages, so that the lines read and held back stay bounded.
+    def __init__(self, cluster, otype, oname, namespace, namespaced, current_ns, page, follow):
+        self.otype = otype
+        self.page = min(page, params.max_log_pages - 1)
+        self.follow = follow
+        super().__init__(cluster, "logs", otype, oname, namespace, namespaced, current_ns)
+
+    def add_content(self, screentype, otype, oname, namespace):
+        pass
+
+    def make_html(self):
+        yield self.html_header + "<br/>" + self.make_page_links()
+        if self.follow:
+            yield self.make_follow_view()
+            return
+
+        stream = self.cluster.backend.open_logs(self.otype, self.oname, self.namespace, \
+                                                (self.page + 1) * params.log_page_lines, False)
+        try:
+            yield get_style_sheet() + '<pre>'
+            for text in LogScreen.select_page(stream, self.page * params.log_page_lines):
+                yield html.escape(text)
+            yield '</pre>'
+        finally:
+            stream.close()
+
+    @staticmethod
+    def select_page(stream, skip_last):
+        # yields the log text without its last skip_last lines; keeps at most skip_last lines in memory.
+        text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        held_back = collections.deque()
+        partial_line = ""
+        lines_to_show = params.log_page_lines
+        while lines_to_show > 0:
+            data = stream.read1(65536)
+            if not data:
+                break
+            lines = (partial_line + text_decoder.decode(data)).split("\n")
+            partial_line = lines.pop()
+
+            held_back.extend(lines)
+            ready = []
+            while len(held_back) > skip_last and lines_to_show > 0:
+                ready.append(held_back.popleft())
+                lines_to_show -= 1
+            if ready:
+                yield "\n".join(ready) + "\n"
+
+        if partial_line != "" and skip_last == 0 and lines_to_show > 0:
+            yield partial_line
+
+    def make_page_links(self):
+        base_url = make_objectinfo_url(self.cluster, "logs", self.otype, self.oname, self.namespace, \
+                                       self.namespaced, self.current_ns)
+        ret = ""
+        if self.page + 1 < params.max_log_pages:
+            ret += f'<a href="{base_url}?page={self.page + 1}">older</a>&nbsp;'
+        if self.page > 0:
+            ret += f'<a href="{base_url}?page={self.page - 1}">newer</a>&nbsp;'
+        if self.follow:
+            ret += f'<a href="{base_url}">stop following</a>'
+        else:
+            ret += f'<a href="{base_url}?follow=1">follow</a>'
+        return ret
+
+    def make_follow_view(self):
+        query = urllib.parse.urlencode({"otype": self.otype, "oname": self.oname, "namespace": self.namespace})
+        return get_style_sheet() + \
+            '<pre id="log"></pre>' + \
+            '<script>var log_url = "' + self.cluster.url_prefix + '/wslogs?' + query + '"; var log_max_lines = ' + \
+            str(params.log_page_lines) + ';</script>' + \
+            get_script("logs.js")
+
+
+def make_label_selector(selector):
+    # the text form of the selector of a workload (matchLabels and matchExpressions), or of a service (a map)
+    expressions = []
+    if "matchLabels" in selector or "matchExpressions" in selector:
+        labels = selector.get("matchLabels") or {}
+        expressions = selector.get("matchExpressions") or []
+    else:
+        labels = selector
+    ret = ["{}={}".format(key, value) for key, value in sorted(labels.items())]
+    for expression in expressions:
+        key = expression.get("key", "")
+        operator = expression.get("operator")
+        values = ",".join(expression.get("values") or [])
+        if operator == "In":
+            ret.append("{} in ({})".format(key, values))
+        elif operator == "NotIn":
+            ret.append("{} notin ({})".format(key, values))
+        elif operator == "Exists":
+            ret.append(key)
+        elif operator == "DoesNotExist":
+            ret.append("!" + key)
+    return ",".join(ret)
+
+
+def make_pod_logs_url(cluster, namespace, label_sel, pattern="", follow=False):
+    query = {"labelsel": label_sel, "regex": pattern}
+    if follow:
+        query["follow"] = "1"
+    return "{}/podlogs/{}?{}".format(cluster.url_prefix, namespace, urllib.parse.urlencode(query))
+
+
+def split_log_timestamp(line):
+    # a line of kubectl logs --timestamps: "<RFC3339Nano time> <text>". Returns the time as a text that sorts
+    # in time order (RFC3339Nano drops the trailing zeros of the fraction, these are put back) and the text.
+    stamp, _, text = line.partition(" ")
+    seconds, dot, rest = stamp.partition(".")
+    if dot == "":
+        return seconds[:19] + ".000000000" + seconds[19:], text
+    digits = len(rest) - len(rest.lstrip("0123456789"))
+    return seconds + "." + rest[:digits].ljust(9, "0") + rest[digits:], text
+
+
+class PodLogStream:
+    # the log of one pod of an aggregated log, read by its own greenlet. The lines that match the filter are kept
+    # in a ring buffer until they are merged, with the time of the line as the sort key; if the buffer is full
+    # the oldest lines are dropped.
+    def __init__(self, backend, namespace, name, tail_lines, follow, regex):
+        self.namespace = namespace
+        self.name = name
+        self.regex = regex
+        self.lines = collections.deque(maxlen=tail_lines)  # (sort key, text)
+        self.last_key = ""  # time of the last line that was read, also if it didn't match
+        self.last_read = time.time()
+        self.ended = False
+        self.dropped = 0
+        self.stream = backend.open_logs("pods", name, namespace, tail_lines, follow, True)
+
+    def run(self, arrived):
+        # reads the log until it ends; sets the event arrived when there are new lines.
+        text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        partial_line = ""
+        try:
+            while True:
+                data = self.stream.read1(65536)
+                if not data:
+                    break
+                lines = (partial_line + text_decoder.decode(data)).split("\n")
+                partial_line = lines.pop()
+                self.add_lines(lines)
+                arrived.set()
+            if partial_line != "":
+                self.add_lines([partial_line])
+        finally:
+            self.ended = True
+            self.stream.close()
+            arrived.set()
+
+    def add_lines(self, lines):
+        for line in lines:
+            key, text = split_log_timestamp(line)
+            self.last_key = key
+            if self.regex is not None and self.regex.search(text) is None:
+                continue
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append((key, text))
+        self.last_read = time.time()
+
+    def close(self):
+        self.stream.close()
+
+
+class PodLogMerger:
+    # merges the buffered lines of the pod logs in time order, with a heap over the first line of each buffer.
+    # While following, a line is only taken once no log can have an earlier one: every log that is still open has
+    # read a later line, or was quiet for merge_delay seconds (a late line of a quiet log can be out of order).
+    merge_delay = 1
+
+    def __init__(self, streams):
+        self.streams = streams
+
+    def get_watermark(self):
+        now = time.time()
+        keys = [stream.last_key for stream in self.streams \
+                if not stream.ended and now - stream.last_read < self.merge_delay]
+        return min(keys) if keys else None
+
+    def pop_lines(self, follow):
+        # returns the lines that are ready, as "<time> <pod> <text>"
+        watermark = self.get_watermark() if follow else None
+        heap = [(stream.lines[0][0], pos) for pos, stream in enumerate(self.streams) if stream.lines]
+        heapq.heapify(heap)
+        ret = []
+        while heap and (watermark is None or heap[0][0] <= watermark):
+            _, pos = heapq.heappop(heap)
+            stream = self.streams[pos]
+            key, text = stream.lines.popleft()
+            ret.append("{} {} {}\n".format(key, stream.name, text))
+            if stream.lines:
+                heapq.heappush(heap, (stream.lines[0][0], pos))
+        return ret
+
+    def is_done(self):
+        return all(stream.ended and not stream.lines for stream in self.streams)
+
+
+class PodLogScreen:
+    # the logs of all pods that match a label selector, merged in time order, with a regular expression that
+    # selects the lines on the server. Each pod has its own log stream (at most params.max_log_pods), the last
+    # log_page_lines lines of each are read; following the logs sends the new lines over a websocket.
+    def __init__(self, cluster, namespace, label_sel, pattern, follow):
+        self.cluster = cluster
+        self.namespace = namespace
+        self.label_sel = label_sel
+        self.pattern = pattern
+        self.follow = follow
+        self.regex = None
+        self.error_message = None
+        if pattern != "":
+            try:
+                self.regex = re.compile(pattern)
+            except re.error as err:
+                self.error_message = "bad regular expression: {}".format(html.escape(str(err)))
+
+    def make_html(self):
+        yield get_home_link(self.cluster, self.namespace) + self.make_links() + self.make_query_fields()
+        if self.error_message is not None:
+            yield self.error_message
+            return
+        if self.follow:
+            query = urllib.parse.urlencode({"namespace": self.namespace, "labelsel": self.label_sel, \
+                                            "regex": self.pattern})
+            yield '<pre id="log"></pre><script>var log_url = "{}/wspodlogs?{}"; var log_max_lines = {};</script>'. \
+                format(self.cluster.url_prefix, query, params.log_page_lines) + get_script("logs.js")
+            return
+
+        streams, message = self.open_streams(False)
+        yield message
+        if streams is None:
+            return
+        try:
+            arrived = gevent.event.Event()
+            gevent.joinall([spawn_for_request(stream.run, arrived) for stream in streams])
+            # the last page of the merged lines
+            lines = collections.deque(PodLogMerger(streams).pop_lines(False), maxlen=params.log_page_lines)
+            yield '<pre>' + html.escape("".join(lines)) + '</pre>'
+        finally:
+            for stream in streams:
+                stream.close()
+
+    def open_streams(self, follow):
+        # returns the streams of the pods and a message about them; None and an error message if there are none.
+        list_query = ListQuery(self.label_sel, "", "", "", "", False)
+        titles, parsed_lines, _, error_message, _ = self.cluster.list_objects("pods", True, self.namespace, \
+                                                                              list_query, 0, "")
+        if titles is None:
+            return None, html.escape(error_message or "No pods found")
+        name_pos = find_index_in_list(titles, "NAME")
+        namespace_pos = find_index_in_list(titles, "NAMESPACE")
+        message = "{} pods".format(len(parsed_lines))
+        if len(parsed_lines) > params.max_log_pods:
+            message = "the logs of {} of {} pods (--max-log-pods)".format(params.max_log_pods, len(parsed_lines))
+            parsed_lines = parsed_lines[:params.max_log_pods]
+        streams = [PodLogStream(self.cluster.backend, line[namespace_pos] if namespace_pos != -1 else self.namespace, \
+                                line[name_pos], params.log_page_lines, follow, self.regex) for line in parsed_lines]
+        return streams, message + "<br/>"
+
+    def run_follow(self, web_socket):
+        # sends the merged lines as they arrive, until the browser closes the page.
+        if self.error_message is not None:
+            return
+        streams, message = self.open_streams(True)
+        if streams is None:
+            web_socket.send(message + "\n")
+            return
+        closed = gevent.event.Event()
+        arrived = gevent.event.Event()
+
+        def wait_for_close():
+            while web_socket.receive() is not None:
+                pass
+            closed.set()
+            arrived.set()
+
+        greenlets = [gevent.spawn(wait_for_close)] + [spawn_for_request(stream.run, arrived) for stream in streams]
+        merger = PodLogMerger(streams)
+        try:
+            while not closed.is_set():
+                arrived.wait(merger.merge_delay)
+                arrived.clear()
+                lines = merger.pop_lines(True)
+                if lines:
+                    web_socket.send("".join(lines))
+                if merger.is_done():
+                    break
+        except WebSocketError:
+            pass
+        finally:
+            gevent.killall(greenlets)
+            for stream in streams:
+                stream.close()
+
+    def make_links(self):
+        if self.follow:
+            return '<a href="{}">stop following</a><br/>'.format(html.escape(self.make_url(False)))
+        return '<a href="{}">follow</a><br/>'.format(html.escape(self.make_url(True)))
+
+    def make_url(self, follow):
+        return make_pod_logs_url(self.cluster, self.namespace, self.label_sel, self.pattern, follow)
+
+    def make_query_fields(self):
+        return '''<form method="get" action="{}/podlogs/{}"><table><tr><td width="1%">LabelSelector</td>\
+<td><input name="labelsel" value="{}"></td></tr><tr><td>Regex:</td><td><input name="regex" value="{}" \
+title="only the lines that match are shown"></td></tr></table>{}<input type="submit" style="display: none" /></form>'''. \
+            format(self.cluster.url_prefix, self.namespace, html.escape(self.label_sel), html.escape(self.pattern), \
+                   '<input type="hidden" name="follow" value="1">' if self.follow else "")
+
+
 class EditObjectScreen:
-    def __init__(self, action, object_to_save):
+    def __init__(self, cluster, action, object_to_save):
+        self.cluster = cluster
         self.message = ""
         self.success_msg = {'apply': "Object saved successfully", \
                             'delete': "Object deleted successfully"}
         self.run(action, object_to_save)
 
     def run(self, action, object_to_save):
-        cmd = "{} {} -f -".format(params.command_name, action)
-        print("cmd:", cmd)
+        cmd = "{} {} -f - -o name".format(self.cluster.command_name, action)
+        logging.debug("edit object: %s", cmd)
         run_command = RunCommand(cmd, True, pipe_as_input=object_to_save)
+        self.invalidate_cached(run_command)
         if run_command.exit_code == 0:
             self.message = self.success_msg.get(action)
         else:
             self.message = make_error_message(run_command)
 
+    def invalidate_cached(self, run_command):
+        # kubectl -o name prints the changed objects as <kind>.<group>/<name>
+        object_details = self.cluster.object_details
+        for line in run_command.lines:
+            kind_name = line.decode("utf-8").split("/")[0]
+            resource_name = self.cluster.api_resources.get_resource_name(kind_name)
+            command_cache.invalidate(resource_name)
+            object_details.invalidate(resource_name)
+            if resource_name is None:
+                return
+        if run_command.exit_code != 0:
+            command_cache.invalidate()
+            object_details.invalidate()
+
     def make_html(self):
         return '{}<br/><button onclick="window.history.back();">Go Back</button>' \
             .format(self.message)
 
 
+class BulkActionScreen:
+    # apply or delete of many objects. The objects are sent in batches: a List document for each kubectl command,
+    # or one api call for each delete with the api backend. params.bulk_concurrency batches run at the same time,
+    # the result of each object is sent to the page as soon as its batch is done. A dry run only checks the
+    # changes on the server, the page then has a button to do them.
+    def __init__(self, cluster, action, oname, selected, edit_text, dry_run, namespaced, current_ns):
+        self.cluster = cluster
+        self.action = action
+        self.oname = oname
+        self.selected = selected
+        self.edit_text = edit_text
+        self.dry_run = dry_run
+        self.namespaced = namespaced
+        self.current_ns = current_ns
+        if action == "delete":
+            self.objects, self.error_message = BulkActionScreen.make_selected_objects(cluster, oname, selected)
+        else:
+            self.objects, self.error_message = BulkActionScreen.parse_document(cluster, edit_text)
+
+    @staticmethod
+    def make_selected_objects(cluster, oname, selected):
+        # the checkboxes of a list have <namespace>/<name> as their value. Returns (resource, object) pairs.
+        kind = cluster.api_resources.get_kind(oname)
+        if kind is None:
+            return [], "unknown resource type: {}".format(oname)
+        if len(selected) == 0:
+            return [], "no objects selected"
+        objects = []
+        for value in selected:
+            namespace, _, name = value.rpartition("/")
+            metadata = {"name": name}
+            if namespace != "":
+                metadata["namespace"] = namespace
+            objects.append((oname, {"apiVersion": kind[0], "kind": kind[1], "metadata": metadata}))
+        return objects, None
+
+    @staticmethod
+    def parse_document(cluster, text):
+        # the text of the bulk edit page: a List or one object, in json.
+        try:
+            document = json.loads(text)
+        except ValueError as err:
+            return [], "can't parse the objects: {}".format(err)
+        if not isinstance(document, dict):
+            return [], "the objects are not a json object"
+        items = document.get("items", []) if document.get("kind") == "List" else [document]
+        objects = []
+        for item in items:
+            if not isinstance(item, dict) or "kind" not in item or "name" not in item.get("metadata", {}):
+                return [], "each object needs a kind and a metadata.name"
+            group = item.get("apiVersion", "").rpartition("/")[0]
+            kind_name = item["kind"].lower() + ("." + group if group != "" else "")
+            objects.append((cluster.api_resources.get_resource_name(kind_name), item))
+        if len(objects) == 0:
+            return [], "no objects to apply"
+        return objects, None
+
+    def make_batches(self):
+        # a batch has objects of one resource type
+        batch_size = self.cluster.backend.get_bulk_batch_size(self.action)
+        by_resource = collections.OrderedDict()
+        for resource, obj in self.objects:
+            by_resource.setdefault(resource, []).append(obj)
+        return [(resource, objects[pos: pos + batch_size]) for resource, objects in by_resource.items() \
+                for pos in range(0, len(objects), batch_size)]
+
+    def run_batch(self, batch):
+        resource, objects = batch
+        try:
+            return resource, self.cluster.backend.run_bulk_batch(self.action, resource, objects, self.dry_run)
+        except bottle.HTTPError as err:
+            # refused by the command scheduler
+            return resource, [(obj, err.body) for obj in objects]
+
+    def invalidate_cached(self, resource):
+        # resource is None for a kind that is not known, then everything is dropped.
+        command_cache.invalidate(resource)
+        self.cluster.object_details.invalidate(resource)
+
+    def make_header(self):
+        return get_style_sheet() + get_home_link(self.cluster, self.current_ns) + \
+            make_objectinstance_link(self.cluster, self.oname, self.namespaced, self.current_ns, self.oname) + '</br>'
+
+    def make_html(self):
+        if self.error_message is not None:
+            yield self.make_header() + html.escape(self.error_message) + \
+                '<br/><button onclick="window.history.back();">Go Back</button>'
+            return
+
+        batches = self.make_batches()
+        done_text = {"apply": "applied", "delete": "deleted"}[self.action] + (" (server dry run)" if self.dry_run else "")
+        yield self.make_header() + '{} {} objects in {} batches{}</br>'.format( \
+            self.action, len(self.objects), len(batches), " (server dry run)" if self.dry_run else "") + \
+            '<table><thead><tr><th align="left">NAMESPACE</th><th align="left">NAME</th>' \
+            '<th align="left">RESULT</th></tr></thead>'
+
+        start = time.perf_counter()
+        failed = 0
+        pool = gevent.pool.Pool(params.bulk_concurrency)
+        for resource, results in pool.imap_unordered(bind_to_request(self.run_batch), batches):
+            if not self.dry_run:
+                self.invalidate_cached(resource)
+            rows = ""
+            for obj, error in results:
+                metadata = obj["metadata"]
+                if error is not None:
+                    failed += 1
+                rows += '<tr><td>{}</td><td>{}/{}</td><td>{}</td></tr>\n'.format( \
+                    html.escape(metadata.get("namespace", "")), html.escape(obj["kind"].lower()), \
+                    html.escape(metadata["name"]), \
+                    done_text if error is None else '<pre>{}</pre>'.format(html.escape(error)))
+            yield rows
+
+        ret = '</table>{} objects {}, {} failed, in {:.1f} seconds</br>'.format( \
+            len(self.objects) - failed, done_text, failed, time.perf_counter() - start)
+        if self.dry_run:
+            ret += self.make_run_form()
+        yield ret + '<button onclick="window.history.back();">Go Back</button>'
+
+    def make_run_form(self):
+        # the same objects once more, without dry run
+        if self.action == "delete":
+            fields = "".join('<input type="hidden" name="obj" value="{}">'.format(html.escape(value)) \
+                             for value in self.selected)
+        else:
+            fields = '<textarea name="edit" style="display:none">{}</textarea>'.format(html.escape(self.edit_text))
+        return get_script("bulk.js") + '''<form method="post" action="{}" onsubmit="return confirmBulk(event);">\
+<input type="hidden" name="namespaced" value="{}"><input type="hidden" name="current_ns" value="{}">{}\
+<button type="submit" name="action" value="{}">{} {} objects</button></form>'''.format( \
+            html.escape(make_bulk_url(self.cluster, self.oname)), html.escape(self.namespaced), \
+            html.escape(self.current_ns), fields, self.action, self.action, len(self.objects))
+
+
+class BulkEditScreen:
+    # the selected objects of a list in one json List document, saved with a bulk apply. The status and the
+    # managed fields are left out, apply doesn't change these.
+    def __init__(self, cluster, oname, selected, namespaced, current_ns):
+        self.cluster = cluster
+        self.oname = oname
+        self.namespaced = namespaced
+        self.current_ns = current_ns
+        self.items = []
+        objects, self.error_message = BulkActionScreen.make_selected_objects(cluster, oname, selected)
+        if self.error_message is None:
+            self.items, self.error_message = cluster.backend.get_objects_json(oname, [obj for _, obj in objects])
+        for item in self.items:
+            item.pop("status", None)
+            item.get("metadata", {}).pop("managedFields", None)
+
+    def make_html(self):
+        ret = get_style_sheet() + get_home_link(self.cluster, self.current_ns) + \
+            make_objectinstance_link(self.cluster, self.oname, self.namespaced, self.current_ns, self.oname) + '</br>'
+        if self.error_message is not None:
+            ret += '<pre>{}</pre>'.format(html.escape(self.error_message))
+        if len(self.items) == 0:
+            return ret + '<button onclick="window.history.back();">Go Back</button>'
+
+        text = json.dumps({"apiVersion": "v1", "kind": "List", "items": self.items}, indent=2)
+        return ret + '''<form method="post" action="{}">\
+<input type="hidden" name="namespaced" value="{}"><input type="hidden" name="current_ns" value="{}">\
+<button type="submit" name="action" value="apply">apply {} objects</button>&nbsp;\
+<label><input type="checkbox" name="dryrun" value="1" checked>server dry run</label><br/>\
+<textarea name="edit" rows="40" cols="120">{}</textarea></form>'''.format( \
+            html.escape(make_bulk_url(self.cluster, self.oname)), html.escape(self.namespaced), \
+            html.escape(self.current_ns), len(self.items), html.escape(text))
+
+
 class TerminalAttachScreen(ObjectDetailScreen):
-    def __init__(self, isnamespaced, podname, namespace, containername, current_ns):
+    def __init__(self, cluster, isnamespaced, podname, namespace, containername, current_ns):
         self.isnamespaced = isnamespaced
         self.podname = podname
         self.namespace = namespace
         self.containername = containername
 
-        super().__init__("terminal-attach", "pods", podname, namespace, isnamespaced, current_ns)
+        super().__init__(cluster, "terminal-attach", "pods", podname, namespace, isnamespaced, current_ns)
 
     def make_html(self):
         ret = self.html_header
         template = read_static_file('xterm/index.html')
 
-        html = template.format(self.podname, self.namespace, self.containername)
-        return ret + html
+        html_text = template.format(pod_name=self.podname, pod_namespace=self.namespace, \
+                                    container_name=self.containername, \
+                                    wssh_url=self.cluster.url_prefix + "/wssh", \
+                                    css=static_files.url("css.css"), \
+                                    xterm_css=static_files.url("xterm/lib/xterm.css"), \
+                                    xterm_js=static_files.url("xterm/lib/xterm.js"), \
+                                    wspty_js=static_files.url("xterm/wspty.js"), \
+                                    script_js=static_files.url("xterm/script.js"))
+        return ret + html_text
+
+
+class Cluster:
+    # one kubeconfig context: its backend (with the connections to its api server), its api resources and caches.
+    def __init__(self, context_name, url_prefix):
+        self.context_name = context_name
+        # the urls of the pages of this context start with this
+        self.url_prefix = url_prefix
+        self.command_name = params.command_name
+        if context_name != "":
+            self.command_name += " --context={}".format(shlex.quote(context_name))
+        self.name = context_name or self.get_current_context()
+        self.backend = self.make_backend()
+        self.api_resources = ApiResources(self)
+        self.object_caches = ObjectCacheRegistry(self)
+        self.list_page_fetcher = ListPageFetcher(self)
+        self.namespace_selector = NamespaceSelector(self)
+        self.object_details = ObjectDetailCache(self)
+        self.relations = RelationIndex(self)
+        self.usage = UsageSampler(self)
+
+    def get_current_context(self):
+        run_command = RunCommand(self.command_name + " config current-context", False)
+        if run_command.exit_code != 0:
+            return ""
+        return run_command.output.strip()
+
+    def make_backend(self):
+        if params.backend_name == "api":
+            client = ApiClient.from_kubeconfig(self.context_name)
+            if client is not None:
+                logging.info("context %s: using api server %s", self.name, client.server)
+                return ApiServerBackend(self, client)
+            logging.error("context %s: can't connect to the api server directly, falling back to kubectl", self.name)
+        return KubectlBackend(self)
+
+    def get_list_cache(self, oname, live):
+        # the watch cache that makes the list, None if the list comes from kubectl or the api server
+        if live:
+            return self.object_caches.watch(oname)
+        return self.object_caches.get(oname)
+
+    def list_objects(self, oname, namespaced, current_ns, list_query, limit, continue_token, live=False):
+        # returns titles, rows, continue token of the next page, error message, and the watch cache that made the
+        # rows (or None). With the cache the selectors are evaluated in memory; otherwise by the api server.
+        object_cache = self.get_list_cache(oname, live)
+        if object_cache is not None:
+            return object_cache.make_table(namespaced, current_ns, limit, continue_token, list_query) + (object_cache,)
+
+        if limit > 0:
+            titles, parsed_lines, next_continue, error_message = self.list_page_fetcher.get( \
+                oname, namespaced, current_ns, list_query.field_sel, list_query.label_sel, limit, continue_token)
+        else:
+            next_continue = ""
+            titles, parsed_lines, error_message = self.backend.list_objects( \
+                oname, namespaced, current_ns, list_query.field_sel, list_query.label_sel)
+        if titles is not None:
+            parsed_lines = list_query.filter_rows(titles, parsed_lines)
+        return titles, parsed_lines, next_continue, error_message, None
 
 
-api_resources_screen = ApiResources()
+class ClusterRegistry:
+    # the contexts that s9k serves. The pages of the default context (--context) have no context in their url,
+    # the pages of the others (--contexts) start with /context/<key>.
+    def __init__(self):
+        self.default = None
+        self.all = []
+        self.by_key = {}
+
+    def load(self):
+        self.default = Cluster(params.context_name, "")
+        self.all = [self.default]
+        for context_name in params.context_names:
+            if context_name in (self.default.name, self.default.context_name) or self.find(context_name) is not None:
+                continue
+            key = ClusterRegistry.make_key(context_name)
+            cluster = Cluster(context_name, "/context/" + key)
+            self.by_key[key] = cluster
+            self.all.append(cluster)
+        for cluster in self.all:
+            cluster.api_resources.load()
+
+    def start_refresh(self):
+        for cluster in self.all:
+            cluster.api_resources.start_refresh()
+
+    @staticmethod
+    def make_key(context_name):
+        # context names may have slashes (like the ARNs of EKS clusters), the web server would decode %2F
+        # before routing; the escapes of the key use ~ instead of %.
+        return urllib.parse.quote(context_name, safe="").replace("~", "%7E").replace("%", "~")
+
+    def get(self, key):
+        # the context of a request, key is None for the pages without a context in their url.
+        if key is None:
+            return self.default
+        cluster = self.by_key.get(key)
+        if cluster is None:
+            raise bottle.HTTPError(404, "unknown context")
+        return cluster
+
+    def find(self, name):
+        for cluster in self.all:
+            if cluster.name == name:
+                return cluster
+        return None
+
+    def make_context_links(self, current, current_ns):
+        if len(self.all) == 1:
+            return ""
+        links = []
+        for cluster in self.all:
+            link = "<a href='{}/{}'>{}</a>".format(cluster.url_prefix, current_ns, html.escape(cluster.name))
+            links.append("<b>{}</b>".format(link) if cluster is current else link)
+        return "Contexts:&nbsp;" + "&nbsp;|&nbsp;".join(links) + "</br>"
+
+    def make_fanout_link(self, oname, namespaced, current_ns, list_query):
+        if len(self.all) == 1:
+            return ""
+        return '&nbsp;|&nbsp;<a href="{}?{}">all contexts</a>'.format( \
+            make_fanout_url(oname, namespaced, current_ns), urllib.parse.urlencode(list_query.make_url_query()))
+
+    def close_idle_connections(self):
+        for cluster in self.all:
+            if isinstance(cluster.backend, ApiServerBackend):
+                cluster.backend.client.close_idle_connections()
+
+
+clusters = ClusterRegistry()
+
+class MetricsPlugin:
+    # bottle plugin: sets the metrics context for the request, measures its time and the size of the response.
+    name = "metrics"
+    api = 2
+
+    def apply(self, callback, route):
+        rule = route.rule
+        is_websocket = websocket in route.plugins
+
+        def wrapper(*args, **kwargs):
+            metrics.set_context(rule, kwargs.get("oname") or kwargs.get("otype") or "")
+            if is_websocket:
+                return callback(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                body = callback(*args, **kwargs)
+            except bottle.HTTPResponse as response:
+                MetricsPlugin.observe(start, response.body)
+                raise
+            if isinstance(body, bottle.HTTPResponse):
+                MetricsPlugin.observe(start, body.body)
+                return body
+            if body is None or isinstance(body, (str, bytes)):
+                MetricsPlugin.observe(start, body)
+                return body
+            return MetricsPlugin.count_chunks(start, body)
+
+        return wrapper
+
+    @staticmethod
+    def observe(start, body):
+        metrics.observe(metrics.request_seconds, time.perf_counter() - start)
+        metrics.observe(metrics.response_bytes, len(body) if isinstance(body, (str, bytes)) else 0)
+
+    @staticmethod
+    def count_chunks(start, chunks):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.observe(metrics.request_seconds, time.perf_counter() - start)
+            metrics.observe(metrics.response_bytes, size)
+
+
+class SchedulerPlugin:
+    # bottle plugin: tells the command scheduler the priority of the request and the socket of its client.
+    name = "scheduler"
+    api = 2
+    # lower numbers run first; work that is not done for a request runs after all requests.
+    route_priorities = {
+        "/objectinfo/<screentype>/<otype>/<instancename>/<namespace>/<isnamespaced>/<current_ns>": 0,
+        "/editobj/<action>": 0,
+        "/bulk/<oname>": 0,
+        "/shell-attach/<isnamespaced>/<podname>/<namespace>/<containername>/<current_ns>": 0,
+        "/objectinstances/<oname>/<namespaced>/<current_ns>": 2,
+        "/fanout/<oname>/<namespaced>/<current_ns>": 2,
+    }
+    default_priority = 1
+
+    def apply(self, callback, route):
+        rule = route.rule
+        if rule.startswith(CONTEXT_ROUTE_PREFIX):
+            rule = rule[len(CONTEXT_ROUTE_PREFIX):]
+        priority = self.route_priorities.get(rule, self.default_priority)
+
+        def wrapper(*args, **kwargs):
+            peer = bottle.request.environ.get("s9k.client_socket")
+            command_scheduler.set_request(priority, peer)
+            return callback(*args, **kwargs)
+
+        return wrapper
+
+
+def get_accepted_encoding():
+    # the content encoding of a generated page: gzip or deflate, by the q values of Accept-Encoding; "" for none.
+    if params.compress_level == 0:
+        return ""
+    accepted = {}
+    for part in bottle.request.headers.get("Accept-Encoding", "").split(","):
+        name, _, param = part.partition(";")
+        param = param.strip()
+        quality = 1.0
+        if param.startswith("q="):
+            try:
+                quality = float(param[2:])
+            except ValueError:
+                quality = 0
+        accepted[name.strip().lower()] = quality
+    quality, encoding = max((accepted.get(encoding, accepted.get("*", 0)), encoding) \
+                            for encoding in ("gzip", "deflate"))
+    return encoding if quality > 0 else ""
+
+
+def make_etag(*parts):
+    return '"{}"'.format(hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:16])
+
+
+def find_etag(etag):
+    # returns the tag of If-None-Match that is the ETag, None if there is none. A compressed page has the
+    # content encoding appended to its ETag.
+    for tag in bottle.request.headers.get("If-None-Match", "").split(","):
+        tag = tag.strip()
+        if tag == etag or tag in (etag[:-1] + '-gzip"', etag[:-1] + '-deflate"'):
+            return tag
+    return None
+
+
+def check_etag(*parts):
+    # for a page made from data with a known version (resourceVersion of the object, state of the watch cache):
+    # the ETag is made from the url and the version, the page is not made again if the browser has it.
+    if bottle.request.method not in ("GET", "HEAD"):
+        return
+    etag = make_etag(static_files.version, bottle.request.fullpath, bottle.request.query_string, *parts)
+    tag = find_etag(etag)
+    if tag is not None:
+        raise bottle.HTTPResponse(status=304, headers={"ETag": tag, "Vary": "Accept-Encoding", \
+                                                       "Cache-Control": bottle.response.get_header("Cache-Control")})
+    bottle.response.set_header("ETag", etag)
+
+
+class CompressionPlugin:
+    # bottle plugin: compresses the generated pages, as the browser accepts it, and adds an ETag made from the
+    # content to the pages that are not streamed (if check_etag didn't set one), an unchanged page is answered with
+    # 304 Not Modified. Streamed pages are compressed chunk by chunk, every chunk is flushed, so that the browser
+    # shows the rows as they arrive; responses made by the routes (static files, json) are left as they are.
+    name = "compress"
+    api = 2
+
+    def apply(self, callback, route):
+        if websocket in route.plugins:
+            return callback
+
+        def wrapper(*args, **kwargs):
+            body = callback(*args, **kwargs)
+            if bottle.response.status_code != 200 or isinstance(body, (bottle.HTTPResponse, dict)) or body is None:
+                return body
+            encoding = get_accepted_encoding()
+            if isinstance(body, (str, bytes)):
+                return CompressionPlugin.make_body(body.encode("utf-8") if isinstance(body, str) else body, encoding)
+            if encoding == "":
+                return body
+            CompressionPlugin.set_encoding(encoding)
+            return CompressionPlugin.compress_chunks(body, encoding)
+
+        return wrapper
+
+    @staticmethod
+    def make_body(body, encoding):
+        if bottle.request.method in ("GET", "HEAD") and bottle.response.get_header("ETag") is None:
+            etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+            tag = find_etag(etag)
+            bottle.response.set_header("ETag", etag)
+            if tag is not None:
+                bottle.response.set_header("ETag", tag)
+                bottle.response.status = 304
+                return b""
+        if encoding == "" or len(body) < params.compress_min_size:
+            return body
+        CompressionPlugin.set_encoding(encoding)
+        compressor = CompressionPlugin.make_compressor(encoding)
+        return compressor.compress(body) + compressor.flush()
+
+    @staticmethod
+    def set_encoding(encoding):
+        bottle.response.set_header("Content-Encoding", encoding)
+        bottle.response.add_header("Vary", "Accept-Encoding")
+        etag = bottle.response.get_header("ETag")
+        if etag is not None:
+            bottle.response.set_header("ETag", etag[:-1] + "-" + encoding + '"')
+
+    @staticmethod
+    def make_compressor(encoding):
+        # deflate in http is the zlib format, gzip has its own header
+        return zlib.compressobj(params.compress_level, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+
+    @staticmethod
+    def compress_chunks(chunks, encoding):
+        compressor = CompressionPlugin.make_compressor(encoding)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
 
 app = bottle.Bottle()
+app.install(MetricsPlugin())
+app.install(SchedulerPlugin())
+app.install(CompressionPlugin())
+
+# the pages of the contexts other than the default one have the context in front of their path
+CONTEXT_ROUTE_PREFIX = "/context/<context>"
 
 
 @app.route("/")
 @app.route('/<namespace>')
-def mainscr(namespace=""):
-    return api_resources_screen.make_html([0, 2, 4, 5], namespace)
+@app.route(CONTEXT_ROUTE_PREFIX + "/")
+def mainscr(namespace="", context=None):
+    return clusters.get(context).api_resources.make_html([0, 2, 4, 5], namespace)
+
+
+@app.route('/namespaces/names.json')
+@app.route(CONTEXT_ROUTE_PREFIX + '/namespaces/names.json')
+def get_namespace_names(context=None):
+    return clusters.get(context).namespace_selector.make_response()
+
+
+def get_list_params():
+    # the selectors are posted by the query form, the page links pass them as query parameters.
+    list_query = ListQuery.from_request(bottle.request.params)
+    limit = bottle.request.params.get("limit", "")
+    limit = int(limit) if limit.isdigit() else params.list_page_size
+    return list_query, limit
 
 
 @app.route('/objectinstances/<oname>/<namespaced>/<current_ns>', method=['GET', 'POST'])
-def objectlinkscr(oname, namespaced, current_ns):
+@app.route(CONTEXT_ROUTE_PREFIX + '/objectinstances/<oname>/<namespaced>/<current_ns>', method=['GET', 'POST'])
+def objectlinkscr(oname, namespaced, current_ns, context=None):
+    bottle.response.set_header('Cache-Control', 'no-cache')
+    cluster = clusters.get(context)
+    list_query, limit = get_list_params()
+    continue_token = bottle.request.params.get("continue", "")
+    live = bottle.request.params.get("live", "") != ""
+    object_cache = cluster.get_list_cache(oname, live)
+    if object_cache is not None:
+        # a list of the watch cache is the same while the cache didn't change and there is no new usage sample;
+        # the age column is made again every minute.
+        check_etag(object_cache.resource_version, object_cache.change_count, cluster.usage.sample_count, \
+                   int(time.time() // 60))
+    object_screen = ObjectListScreen(cluster, oname, namespaced, list_query, current_ns, limit, \
+                                     continue_token, live)
+    return object_screen.make_html()
+
+
+@app.route('/fanout/<oname>/<namespaced>/<current_ns>', method=['GET', 'POST'])
+def fanoutscr(oname, namespaced, current_ns):
     bottle.response.set_header('Cache-Control', 'no-store')
-    field_sel = bottle.request.forms.get("fieldsel")
-    label_sel = bottle.request.forms.get("labelsel")
-    object_screen = ObjectListScreen(oname, namespaced, field_sel, label_sel, current_ns)
+    list_query, limit = get_list_params()
+    # ?contexts=<name>,<name> shows some of the contexts only
+    context_names = [name for name in bottle.request.params.get("contexts", "").split(",") if name != ""]
+    object_screen = FanoutListScreen(oname, namespaced, list_query, current_ns, limit, context_names)
     return object_screen.make_html()
 
 
 @app.route('/objectinfo/<screentype>/<otype>/<instancename>/<namespace>/<isnamespaced>/<current_ns>')
-def objectinfoscr(otype, screentype, instancename, namespace, isnamespaced, current_ns):
-    bottle.response.set_header('Cache-Control', 'no-store')
-    object_screen = ObjectDetailScreen(screentype, otype, instancename, namespace, isnamespaced, current_ns)
+@app.route(CONTEXT_ROUTE_PREFIX + '/objectinfo/<screentype>/<otype>/<instancename>/<namespace>/<isnamespaced>/<current_ns>')
+def objectinfoscr(otype, screentype, instancename, namespace, isnamespaced, current_ns, context=None):
+    bottle.response.set_header('Cache-Control', 'no-cache')
+    cluster = clusters.get(context)
+    if screentype == "logs":
+        page = bottle.request.query.get("page", "")
+        page = int(page) if page.isdigit() else 0
+        follow = bottle.request.query.get("follow", "") != ""
+        log_screen = LogScreen(cluster, otype, instancename, namespace, isnamespaced, current_ns, page, follow)
+        return log_screen.make_html()
+    object_screen = ObjectDetailScreen(cluster, screentype, otype, instancename, namespace, isnamespaced, current_ns)
     return object_screen.make_html()
 
 
+@app.route('/podlogs/<namespace>')
+@app.route(CONTEXT_ROUTE_PREFIX + '/podlogs/<namespace>')
+def pod_logs(namespace, context=None):
+    bottle.response.set_header('Cache-Control', 'no-store')
+    query = bottle.request.query.decode()
+    log_screen = PodLogScreen(clusters.get(context), namespace, query.get("labelsel", ""), query.get("regex", ""), \
+                              query.get("follow", "") != "")
+    return log_screen.make_html()
+
+
 @app.route('/editobj/<action>', method='POST')
-def edit_object_action(action):
+@app.route(CONTEXT_ROUTE_PREFIX + '/editobj/<action>', method='POST')
+def edit_object_action(action, context=None):
     bottle.response.set_header('Cache-Control', 'no-store')
     object_to_save = bottle.request.forms.get("edit")
-    object_screen = EditObjectScreen(action, object_to_save)
+    object_screen = EditObjectScreen(clusters.get(context), action, object_to_save)
     return object_screen.make_html()
 
 
+@app.route('/bulk/<oname>', method='POST')
+@app.route(CONTEXT_ROUTE_PREFIX + '/bulk/<oname>', method='POST')
+def bulk_action(oname, context=None):
+    bottle.response.set_header('Cache-Control', 'no-store')
+    cluster = clusters.get(context)
+    forms = bottle.request.forms.decode()
+    action = forms.get("action", "")
+    namespaced = forms.get("namespaced", "true")
+    current_ns = forms.get("current_ns", NO_NAMESPACE)
+    if action == "edit":
+        return BulkEditScreen(cluster, oname, forms.getall("obj"), namespaced, current_ns).make_html()
+    if action not in ("apply", "delete"):
+        raise bottle.HTTPError(400, "unknown bulk action: {}".format(action))
+    bulk_screen = BulkActionScreen(cluster, action, oname, forms.getall("obj"), forms.get("edit", ""), \
+                                   forms.get("dryrun") is not None, namespaced, current_ns)
+    return bulk_screen.make_html()
+
+
+@app.route('/metrics')
+def get_metrics():
+    bottle.response.content_type = "text/plain; version=0.0.4; charset=utf-8"
+    return metrics.make_text()
+
+
 @app.route('/static-file/<fname:path>')
 def get_static_file(fname):
-    return read_static_file(fname)
+    return static_files.make_response(fname, False)
+
+
+@app.route('/static/<digest>/<fname:path>')
+def get_hashed_static_file(digest, fname):
+    static_file = static_files.get(fname)
+    return static_files.make_response(fname, static_file is not None and static_file.digest == digest)
 
 
 @app.route('/shell-attach/<isnamespaced>/<podname>/<namespace>/<containername>/<current_ns>')
-def shell_attach(isnamespaced, podname, namespace, containername, current_ns):
-    terminal_attach = TerminalAttachScreen(isnamespaced, podname, namespace, containername, current_ns)
+@app.route(CONTEXT_ROUTE_PREFIX + '/shell-attach/<isnamespaced>/<podname>/<namespace>/<containername>/<current_ns>')
+def shell_attach(isnamespaced, podname, namespace, containername, current_ns, context=None):
+    terminal_attach = TerminalAttachScreen(clusters.get(context), isnamespaced, podname, namespace, containername, \
+                                           current_ns)
     return terminal_attach.make_html()
 
 
+@app.get('/wslogs', apply=[websocket], method="GET")
+@app.get(CONTEXT_ROUTE_PREFIX + '/wslogs', apply=[websocket], method="GET")
+def follow_logs(web_socket, context=None):
+    # sends the log output as it arrives, until the browser closes the page.
+    cluster = clusters.get(context)
+    metrics.websocket_sessions.inc("/wslogs")
+    metrics.websocket_sessions_open.inc()
+    query = bottle.request.query
+    stream = cluster.backend.open_logs(query.get("otype"), query.get("oname"), query.get("namespace"), \
+                                       params.log_page_lines, True)
+
+    def wait_for_close():
+        while web_socket.receive() is not None:
+            pass
+        stream.close()
+
+    close_watcher = gevent.spawn(wait_for_close)
+    text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        while True:
+            data = stream.read1(65536)
+            if not data:
+                break
+            web_socket.send(text_decoder.decode(data))
+    except WebSocketError:
+        pass
+    finally:
+        close_watcher.kill()
+        stream.close()
+        metrics.websocket_sessions_open.dec()
+
+
+@app.get('/wspodlogs', apply=[websocket], method="GET")
+@app.get(CONTEXT_ROUTE_PREFIX + '/wspodlogs', apply=[websocket], method="GET")
+def follow_pod_logs(web_socket, context=None):
+    # the merged logs of the pods of a label selector, as they arrive
+    cluster = clusters.get(context)
+    metrics.websocket_sessions.inc("/wspodlogs")
+    metrics.websocket_sessions_open.inc()
+    try:
+        query = bottle.request.query.decode()
+        log_screen = PodLogScreen(cluster, query.get("namespace", NO_NAMESPACE), query.get("labelsel", ""), \
+                                  query.get("regex", ""), True)
+        log_screen.run_follow(web_socket)
+    finally:
+        metrics.websocket_sessions_open.dec()
+
+
+@app.get('/wslist/<oname>/<namespaced>/<current_ns>', apply=[websocket], method="GET")
+@app.get(CONTEXT_ROUTE_PREFIX + '/wslist/<oname>/<namespaced>/<current_ns>', apply=[websocket], method="GET")
+def live_list(web_socket, oname, namespaced, current_ns, context=None):
+    # the changes of a live list page
+    cluster = clusters.get(context)
+    metrics.websocket_sessions.inc("/wslist")
+    metrics.websocket_sessions_open.inc()
+    try:
+        list_query, _ = get_list_params()
+        since = bottle.request.query.get("since", "")
+        updates = LiveListUpdates(cluster, oname, namespaced, list_query, current_ns, \
+                                  int(since) if since.isdigit() else 0, bottle.request.query.get("usage", "") != "")
+        updates.run(web_socket)
+    finally:
+        metrics.websocket_sessions_open.dec()
+
+
 # @app.route('/socket.io/<fname:path>', apply=[websocket], method="GET")
 @app.get('/wssh', apply=[websocket], method="GET")
-def echo(web_socket):
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    cmd = "{}/kubeexec {}".format(script_dir, params.kubeconfig_file)
-
-    process = Popen(shlex.split(cmd), \
-                    stdout=PIPE, stdin=PIPE)  # , stderr=PIPE)
-
-    stream = web_socket.stream.handler.rfile
-    fd_stream = stream.fileno()
-
-    fd_out = process.stdout.fileno()
-
-    # print("fd_out {} fd-stream {} fd_stream-in {}".\
-    #   format(fd_out, fd_stream, process.stdin.fileno()))
-
-    loop_select = True
-    while loop_select:
-        try:
-            # print("before select")
-            read_sock, _, error_socks = \
-                select([fd_stream, fd_out], [], [fd_stream, fd_out], 1)
-            # print("after select read_events {} error_events {}".\
-            #        format(len(read_sock), len(error_socks)))
-
-            if len(read_sock) != 0:
-                for sock in read_sock:
-                    if sock == fd_out:
-                        # print("read from stdout")
-                        msg = process.stdout.readline()
-                        if msg is None or len(msg) == 0:
-                            loop_select = False
-                            break
-                        smsg = msg.decode('utf-8')
-                        # print("msg-from-kubectl {}".format(smsg))
-                        web_socket.send(smsg)
-
-                    elif sock == fd_stream:
-                        # print("read from sock {}".format(sock))
-                        msg = web_socket.receive()
-                        if msg is None or msg == "":
-                            loop_select = False
-                            break
-                        # print("msg-net {}".format(msg))
-                        msg += '\n'
-                        process.stdin.write(msg.encode('utf-8'))
-                        process.stdin.flush()
-            if len(error_socks) != 0:
-                # print("error:")
-                loop_select = False
-                break
+@app.get(CONTEXT_ROUTE_PREFIX + '/wssh', apply=[websocket], method="GET")
+def echo(web_socket, context=None):
+    cluster = clusters.get(context)
+    metrics.websocket_sessions.inc("/wssh")
+    metrics.websocket_sessions_open.inc()
+    try:
+        relay_terminal(web_socket, cluster)
+    finally:
+        metrics.websocket_sessions_open.dec()
+
+
+# the routes with a wildcard are matched in the order they were added, the home page of a context comes after
+# the other pages of the context that have a path of the same shape (wslogs, wssh). Its path is a namespace name
+# or -None, other paths of a context are not found.
+app.route(CONTEXT_ROUTE_PREFIX + '/<namespace:re:-None|[a-z0-9](?:[-a-z0-9]*[a-z0-9])?>', callback=mainscr)
+
+
+def relay_terminal(web_socket, cluster):
+    session = kubeexec_daemon.connect()
+    if session is None:
+        session = KubeexecProcess()
+    TerminalRelay(web_socket, session, cluster.context_name).run()
+
+
+def kubeexec_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "kubeexec")
+
+
+class KubeexecProcess:
+    # a terminal session in a kubeexec process of its own: frames on stdin, output on stdout, errors on stderr.
+    def __init__(self):
+        cmd = "{}{}{}".format(kubeexec_path(), params.kubeconfig_file, params.context_arg)
+        self.process = Popen(shlex.split(cmd), stdout=PIPE, stdin=PIPE, stderr=PIPE)
+
+    def fileno(self):
+        return self.process.stdout.fileno()
+
+    def write(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def read_error(self):
+        return self.process.stderr.read()
+
+    def stop(self):
+        self.process.kill()
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class KubeexecSession:
+    # a terminal session of the kubeexec daemon: a connection to its socket. The daemon writes errors
+    # to the terminal.
+    def __init__(self, sock):
+        self.sock = sock
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    @staticmethod
+    def read_error():
+        return b""
+
+    def stop(self):
+        try:
+            self.sock.shutdown(gevent.socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+
+class KubeexecDaemon:
+    # one kubeexec process (kubeexec -daemon) runs the terminal sessions of all browsers, and of all workers.
+    # It reads the kubeconfig once and keeps its connections to the api server, attaching a terminal
+    # doesn't start a process. If the daemon is not running, a session gets a kubeexec process of its own.
+    start_timeout = 10
+    restart_delay = 1
+
+    def __init__(self):
+        self.socket_dir = None
+        self.socket_path = None
+        self.process = None
+        self.watcher = None
+        self.stopping = False
+
+    def start(self):
+        if not os.access(kubeexec_path(), os.X_OK):
+            logging.info("no kubeexec binary, terminal sessions are not available")
+            return
+        self.socket_dir = tempfile.mkdtemp(prefix="s9k-")
+        self.socket_path = os.path.join(self.socket_dir, "kubeexec.sock")
+        self.start_process()
+        self.watcher = gevent.spawn(self.watch)
+
+    def start_process(self):
+        cmd = "{} -daemon {}{}{}".format(kubeexec_path(), self.socket_path, params.kubeconfig_file, params.context_arg)
+        self.process = Popen(shlex.split(cmd), stdin=DEVNULL)
+        deadline = time.monotonic() + self.start_timeout
+        while not os.path.exists(self.socket_path) and self.process.poll() is None \
+                and time.monotonic() < deadline:
+            gevent.sleep(0.05)
+        logging.info("kubeexec daemon %d started, socket: %s", self.process.pid, self.socket_path)
+
+    def watch(self):
+        while True:
+            status = self.process.wait()
+            if self.stopping:
+                return
+            logging.error("kubeexec daemon %d exited, status: %d", self.process.pid, status)
+            gevent.sleep(self.restart_delay)
+            self.start_process()
+
+    def connect(self):
+        if self.socket_path is None:
+            return None
+        sock = gevent.socket.socket(gevent.socket.AF_UNIX, gevent.socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as err:
+            logging.error("can't connect to the kubeexec daemon: %s", err)
+            sock.close()
+            return None
+        return KubeexecSession(sock)
+
+    def detach(self):
+        # in a worker process: the daemon belongs to the master.
+        if self.watcher is not None:
+            self.watcher.kill(block=False)
+            self.watcher = None
+
+    def stop(self):
+        self.stopping = True
+        self.detach()
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+        if self.socket_dir is not None:
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+
+kubeexec_daemon = KubeexecDaemon()
+
+
+class TerminalRelay:
+    # relays a terminal session between the browser and kubeexec (a process of its own, or the daemon).
+    # browser -> s9k: the first text frame is the connect message (json, s9k adds the context of the page to it,
+    # empty for the default context), then binary frames with the keyboard
+    # input and text frames with json control messages: {"cols": .., "rows": ..} or {"ack": <bytes>}.
+    # s9k -> browser: binary frames with the terminal output, text frames with errors ({"error": ..}).
+    # s9k -> kubeexec: the connect message as a line, then frames of one type byte (d - data, r - resize),
+    # the length of the payload (4 bytes, big endian) and the payload. kubeexec writes the raw terminal output.
+    #
+    # Bulk output that arrives within coalesce_seconds is sent in one frame, small reads (echo of keystrokes)
+    # are sent at once. No more output is read from kubeexec while the browser has not acknowledged
+    # window_size bytes, so a slow browser holds up the remote side.
+    coalesce_seconds = 0.005
+    bulk_read_size = 4096
+    max_frame_size = 65536
+    window_size = 1024 * 1024
+
+    def __init__(self, web_socket, session, context_name):
+        self.web_socket = web_socket
+        self.session = session
+        self.context_name = context_name
+        self.unacknowledged = 0
+        self.acknowledged = gevent.event.Event()
+        self.closed = False
+
+    def run(self):
+        reader = gevent.spawn(self.relay_input)
+        try:
+            self.relay_output()
+            error_out = self.session.read_error()
+            if error_out:
+                self.web_socket.send(json.dumps({"error": error_out.decode("utf-8", "replace")}))
+            self.web_socket.close()
         except WebSocketError:
-            loop_select = False
-            break
-        except BrokenPipeError:
-            loop_select = False
-            break
+            pass
+        finally:
+            reader.kill()
+            self.session.close()
+
+    def relay_output(self):
+        fd_out = self.session.fileno()
+        while True:
+            while self.unacknowledged >= self.window_size and not self.closed:
+                self.acknowledged.clear()
+                if self.unacknowledged >= self.window_size and not self.closed:
+                    self.acknowledged.wait()
+
+            data = TerminalRelay.read(fd_out, None, self.max_frame_size)
+            if not data:
+                return
+            deadline = time.monotonic() + self.coalesce_seconds
+            while len(data) < self.max_frame_size:
+                wait = max(0, deadline - time.monotonic()) if len(data) >= self.bulk_read_size else 0
+                more = TerminalRelay.read(fd_out, wait, self.max_frame_size - len(data))
+                if not more:
+                    break
+                data += more
 
-    try:
-        process.stdin.close()
-        process.stdout.close()
-    except BrokenPipeError:
-        pass
+            self.web_socket.send(data, binary=True)
+            self.unacknowledged += len(data)
+
+    @staticmethod
+    def read(fd_in, timeout, size):
+        # whatever is available, b"" at the end of the output, None if nothing arrived before the timeout
+        readable, _, _ = select([fd_in], [], [], timeout)
+        if len(readable) == 0:
+            return None
+        try:
+            return os.read(fd_in, size)
+        except ConnectionResetError:
+            return b""
+
+    def write_frame(self, frame_type, payload):
+        self.session.write(struct.pack(">cI", frame_type, len(payload)) + payload)
+
+    def relay_input(self):
+        connected = False
+        try:
+            while True:
+                msg = self.web_socket.receive()
+                if msg is None:
+                    break
+                if isinstance(msg, (bytes, bytearray)):
+                    self.write_frame(b"d", bytes(msg))
+                elif not connected:
+                    connect = json.loads(msg)
+                    connect["context"] = self.context_name
+                    self.session.write(json.dumps(connect).encode("utf-8") + b"\n")
+                    connected = True
+                else:
+                    control = json.loads(msg)
+                    if "ack" in control:
+                        self.unacknowledged -= control["ack"]
+                        self.acknowledged.set()
+                    if "cols" in control and "rows" in control:
+                        self.write_frame(b"r", struct.pack(">HH", control["cols"], control["rows"]))
+        except (WebSocketError, ConnectionError, ValueError, struct.error):
+            pass
+        # the browser is gone, end the session.
+        self.closed = True
+        self.acknowledged.set()
+        self.session.stop()
 
 
 def parse_cmd_line():
@@ -749,6 +5589,9 @@ def parse_cmd_line():
     parse.add_argument('--host', '-i', type=str, dest='host', default='localhost', \
                        help='listening on host')
 
+    parse.add_argument('--log-file', type=str, dest='log_file', default='s9k.log', \
+                       help='log file of the server')
+
     parse.add_argument('--cert', '-r', type=str, dest='cert', default='', \
                        help='TLS certifificate file')
 
@@ -761,6 +5604,81 @@ def parse_cmd_line():
     parse.add_argument('--context', '-x', type=str, dest='context', default='', \
                    help='set kubeconfig context to use (use default context if empty)')
 
+    parse.add_argument('--contexts', type=str, dest='contexts', default='', \
+                       help='more kubeconfig contexts served by this s9k: comma separated names, or all (their pages ' \
+                       'have /context/<name> in front of the path)')
+
+    parse.add_argument('--fanout-timeout', type=int, dest='fanout_timeout', default=30, \
+                       help='the list of objects in all contexts shows the contexts that answered within this number of seconds')
+
+    parse.add_argument('--backend', '-b', type=str, dest='backend', default='kubectl', choices=['kubectl', 'api'], \
+                       help='kubectl - run kubectl for each request, api - talk to the api server directly')
+
+    parse.add_argument('--log-lines', type=int, dest='log_page_lines', default=1000, \
+                       help='number of log lines shown on one page of the log screen')
+
+    parse.add_argument('--log-pages', type=int, dest='max_log_pages', default=10, \
+                       help='number of pages that the log screen goes back (older lines are not shown; each page ' \
+                       'back reads another page of lines)')
+
+    parse.add_argument('--page-size', type=int, dest='list_page_size', default=500, \
+                       help='number of objects shown on one page of an object list (0 - show all objects)')
+
+    parse.add_argument('--watch-cache', '-w', action='store_true', dest='watch_cache', default=False, \
+                       help='keep watched object lists in memory, instead of running kubectl get for each page')
+
+    parse.add_argument('--command-cache-size', type=int, dest='command_cache_mb', default=64, \
+                       help='megabytes of kubectl get/describe output kept for a few seconds (0 - off)')
+
+    parse.add_argument('--cache-idle-timeout', type=int, dest='cache_idle_timeout', default=300, \
+                       help='stop watching a resource type if it was not viewed for this number of seconds')
+
+    parse.add_argument('--discovery-refresh', type=int, dest='discovery_refresh_interval', default=300, \
+                       help='seconds between two discoveries of the api resources (0 - only at startup)')
+
+    parse.add_argument('--discovery-snapshot-dir', type=str, dest='discovery_snapshot_dir', default='~/.cache/s9k', \
+                       help='directory for the snapshots of the api resources of each context (empty - no snapshots)')
+
+    parse.add_argument('--max-commands', type=int, dest='max_commands', default=16, \
+                       help='maximum number of kubectl processes that run at the same time')
+
+    parse.add_argument('--max-queued-commands', type=int, dest='max_queued_commands', default=64, \
+                       help='kubectl commands that may wait for a free slot, then requests get a 503 error')
+
+    parse.add_argument('--max-log-pods', type=int, dest='max_log_pods', default=20, \
+                       help='maximum number of pods in the aggregated log of a label selector (one log stream per pod)')
+
+    parse.add_argument('--compress-level', type=int, dest='compress_level', default=6, \
+                       help='gzip/deflate level of the generated pages (0 - no compression)')
+
+    parse.add_argument('--compress-min-size', type=int, dest='compress_min_size', default=1024, \
+                       help='pages smaller than this number of bytes are sent uncompressed (streamed pages are always ' \
+                       'compressed)')
+
+    parse.add_argument('--live-interval', type=float, dest='live_update_interval', default=1, \
+                       help='seconds between two updates of a live object list (the changes are sent together)')
+
+    parse.add_argument('--usage-interval', type=int, dest='usage_interval', default=300, \
+                       help='seconds between two samples of the cpu and memory of pods and nodes, from the metrics api ' \
+                       '(0 - no samples)')
+
+    parse.add_argument('--usage-history', type=int, dest='usage_history', default=24, \
+                       help='hours of cpu and memory samples that are kept')
+
+    parse.add_argument('--bulk-batch-size', type=int, dest='bulk_batch_size', default=50, \
+                       help='bulk apply/delete: number of objects sent to one kubectl command')
+
+    parse.add_argument('--bulk-concurrency', type=int, dest='bulk_concurrency', default=4, \
+                       help='bulk apply/delete: number of batches (or api calls) that run at the same time')
+
+    parse.add_argument('--workers', type=int, dest='workers', default=1, \
+                       help='number of worker processes that serve requests (kill -HUP restarts them)')
+
+    parse.add_argument('--worker-drain-timeout', type=int, dest='worker_drain_timeout', default=600, \
+                       help='seconds a stopping worker waits for its open terminal and log sessions')
+
+    parse.add_argument('--exec-per-session', action='store_true', dest='exec_per_session', default=False, \
+                       help='start a kubeexec process for each terminal session, instead of one for all sessions')
 
     return parse.parse_args()
 
@@ -775,33 +5693,236 @@ def set_info_logger():
     root.addHandler(console_handler)
 
 
+class RequestHandler(WebSocketHandler):
+    # passes the client socket to the application, the command scheduler watches it to notice abandoned requests.
+    def get_environ(self):
+        environ = super().get_environ()
+        environ["s9k.client_socket"] = self.socket
+        return environ
+
+
+class GeventWebSocketServer(bottle.ServerAdapter):
+    def run(self, handler):
+        server = pywsgi.WSGIServer((self.host, self.port), handler, handler_class=RequestHandler)
+
+        server.serve_forever()
+
+
 class GeventWebSocketServerSSL(bottle.ServerAdapter):
     def run(self, handler):
         server = pywsgi.WSGIServer((self.host, self.port), handler, \
-                                   handler_class=WebSocketHandler, \
+                                   handler_class=RequestHandler, \
                                    keyfile=params.key_file, certfile=params.cert_file)
 
         server.serve_forever()
 
 
+def make_listener(host, port):
+    # every worker has its own listening socket on the same port, the kernel spreads the connections over them.
+    family, socktype, proto, _, address = gevent.socket.getaddrinfo(host, port, 0, gevent.socket.SOCK_STREAM, 0, \
+                                                                    gevent.socket.AI_PASSIVE)[0]
+    listener = gevent.socket.socket(family, socktype, proto)
+    listener.setsockopt(gevent.socket.SOL_SOCKET, gevent.socket.SO_REUSEADDR, 1)
+    listener.setsockopt(gevent.socket.SOL_SOCKET, gevent.socket.SO_REUSEPORT, 1)
+    listener.bind(address)
+    listener.listen(128)
+    return listener
+
+
+class WorkerHandler(RequestHandler):
+    # a stopping worker closes keep-alive connections: idle ones at once, the others after the running request.
+    def read_requestline(self):
+        self.server.idle_handlers.add(gevent.getcurrent())
+        try:
+            return super().read_requestline()
+        finally:
+            self.server.idle_handlers.discard(gevent.getcurrent())
+
+    def handle_one_request(self):
+        result = super().handle_one_request()
+        if result is True and self.server.closed:
+            return None
+        return result
+
+
+class WorkerServer(pywsgi.WSGIServer):
+    def __init__(self, listener, application, ssl_args):
+        super().__init__(listener, application, handler_class=WorkerHandler, spawn=gevent.pool.Pool(), **ssl_args)
+        self.idle_handlers = set()
+
+    def close(self):
+        super().close()
+        gevent.killall(list(self.idle_handlers), block=False)
+
+
+class WorkerPool:
+    # the master process of --workers mode. It forks the workers and runs the shared command cache.
+    # A connection stays with the worker that accepted it, so a websocket of a terminal or of a log
+    # always talks to the same process, also while the workers are restarted.
+    # SIGHUP restarts the workers one by one: the new worker is started first, then the old one stops
+    # accepting connections and exits once its running requests and websockets are finished.
+    restart_delay = 1
+
+    def __init__(self, num_workers, host, port, ssl_args, drain_timeout):
+        self.num_workers = num_workers
+        self.host = host
+        self.port = port
+        self.ssl_args = ssl_args
+        self.drain_timeout = drain_timeout
+        self.master_pid = os.getpid()
+        self.workers = set()
+        self.retiring = set()
+        self.stopping = False
+        self.stopped = gevent.event.Event()
+        self.signal_handlers = []
+        self.cache_server = None
+
+    def run(self):
+        socket_dir = tempfile.mkdtemp(prefix="s9k-")
+        self.cache_server = SharedCacheServer(os.path.join(socket_dir, "cache.sock"))
+        self.cache_server.start()
+
+        for _ in range(self.num_workers):
+            self.start_worker()
+
+        self.signal_handlers = [gevent.signal_handler(signal.SIGHUP, self.restart), \
+                                gevent.signal_handler(signal.SIGTERM, self.stop, signal.SIGTERM), \
+                                gevent.signal_handler(signal.SIGINT, self.stop, signal.SIGINT)]
+        logging.info("master %d started %d workers", self.master_pid, self.num_workers)
+
+        self.stopped.wait()
+        self.cache_server.close()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+    def start_worker(self):
+        if self.stopping:
+            return
+        pid = gevent.os.fork_and_watch(self.worker_exited)
+        if pid == 0:
+            try:
+                self.run_worker()
+            finally:
+                logging.shutdown()
+                os._exit(0)
+        self.workers.add(pid)
+        logging.info("started worker %d", pid)
+
+    def worker_exited(self, watcher):
+        self.workers.discard(watcher.pid)
+        logging.info("worker %d exited, status: %d", watcher.pid, watcher.rstatus)
+        if watcher.pid in self.retiring:
+            self.retiring.discard(watcher.pid)
+        elif not self.stopping:
+            gevent.spawn_later(self.restart_delay, self.start_worker)
+        if self.stopping and len(self.workers) == 0:
+            self.stopped.set()
+
+    def restart(self):
+        logging.info("restarting workers")
+        for pid in list(self.workers - self.retiring):
+            self.start_worker()
+            # give the new worker the time to listen, before the old one closes its socket.
+            gevent.sleep(self.restart_delay)
+            self.retiring.add(pid)
+            self.signal_worker(pid, signal.SIGTERM)
+
+    def stop(self, signum):
+        self.stopping = True
+        for pid in self.workers:
+            self.signal_worker(pid, signum)
+        if len(self.workers) == 0:
+            self.stopped.set()
+
+    @staticmethod
+    def signal_worker(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def run_worker(self):
+        # runs in the forked worker process: drop what belongs to the master.
+        for handler in self.signal_handlers:
+            handler.cancel()
+        self.cache_server.close()
+        command_cache.shared = SharedCacheClient(self.cache_server.socket_path)
+        kubeexec_daemon.detach()
+        clusters.close_idle_connections()
+        clusters.start_refresh()
+
+        server = WorkerServer(make_listener(self.host, self.port), app, self.ssl_args)
+        stopped = gevent.event.Event()
+
+        def stop(timeout):
+            if server.closed:
+                # asked again: don't wait for the open connections.
+                server.pool.kill(block=False)
+                return
+            logging.info("worker %d stopping, open connections: %d", os.getpid(), len(server.pool))
+            server.stop(timeout)
+            stopped.set()
+
+        def watch_master():
+            while os.getppid() == self.master_pid:
+                gevent.sleep(1)
+            stop(self.drain_timeout)
+
+        gevent.signal_handler(signal.SIGTERM, stop, self.drain_timeout)
+        gevent.signal_handler(signal.SIGINT, stop, 1)
+        gevent.signal_handler(signal.SIGHUP, lambda: None)
+        gevent.spawn(watch_master)
+        server.start()
+        stopped.wait()
+
+
 def main():
     cmd = parse_cmd_line()
 
-    logging.basicConfig(filename='s9k.log', level=logging.DEBUG)
+    logging.basicConfig(filename=cmd.log_file, level=logging.DEBUG)
 
     logging.info("host: %s port: %s command: %s certfile: %s keyfile: %s", \
                  cmd.host, cmd.port, cmd.kubectl, cmd.cert, cmd.key)
 
     params.set_config(cmd.kubectl, cmd.config, cmd.context)
-
-    api_resources_screen.load()
+    static_files.load("./static-file")
+    params.set_cache_config(cmd.watch_cache, cmd.cache_idle_timeout, cmd.command_cache_mb)
+    params.set_backend(cmd.backend)
+    params.set_page_sizes(cmd.log_page_lines, cmd.list_page_size, cmd.max_log_pages)
+    params.set_command_limits(cmd.max_commands, cmd.max_queued_commands)
+    params.set_bulk_limits(cmd.bulk_batch_size, cmd.bulk_concurrency)
+    params.set_live_update_interval(cmd.live_update_interval)
+    params.set_usage_sampling(cmd.usage_interval, cmd.usage_history)
+    params.set_compression(cmd.compress_level, cmd.compress_min_size)
+    params.set_max_log_pods(cmd.max_log_pods)
+    params.set_discovery_config(cmd.discovery_refresh_interval, cmd.discovery_snapshot_dir)
+    params.set_contexts(cmd.contexts, cmd.fanout_timeout)
+
+    clusters.load()
 
     if cmd.cert == "" and cmd.key == "":
-        bottle.run(app, host=cmd.host, port=cmd.port, server=GeventWebSocketServer)
+        ssl_args = {}
+        server = GeventWebSocketServer
     else:
         params.set_cert_files(cmd.key, cmd.cert)
+        ssl_args = {"keyfile": params.key_file, "certfile": params.cert_file}
+        server = GeventWebSocketServerSSL
 
-        bottle.run(app, host=cmd.host, port=cmd.port, server=GeventWebSocketServerSSL)
+    if cmd.workers > 1 and not hasattr(gevent.socket, "SO_REUSEPORT"):
+        print("--workers is not supported on this platform (no SO_REUSEPORT)")
+        sys.exit(1)
+
+    if not cmd.exec_per_session:
+        kubeexec_daemon.start()
+    try:
+        if cmd.workers > 1:
+            WorkerPool(cmd.workers, cmd.host, cmd.port, ssl_args, cmd.worker_drain_timeout).run()
+        else:
+            clusters.start_refresh()
+            # stop the kubeexec daemon on kill as well.
+            gevent.signal_handler(signal.SIGTERM, gevent.kill, gevent.getcurrent(), SystemExit)
+            bottle.run(app, host=cmd.host, port=cmd.port, server=server)
+    finally:
+        kubeexec_daemon.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,36 @@
+function selectAllRows(checkbox) {
+    var boxes = document.getElementsByName("obj");
+    for (var i = 0; i < boxes.length; i++) {
+        boxes[i].checked = checkbox.checked;
+    }
+}
+
+// the checked rows of the list (or the hidden fields of the form that does a dry run for real)
+function countSelected(form) {
+    var count = 0;
+    var fields = form.querySelectorAll('input[name="obj"]');
+    for (var i = 0; i < fields.length; i++) {
+        if (fields[i].type == "hidden" || fields[i].checked) {
+            count += 1;
+        }
+    }
+    return count;
+}
+
+function confirmBulk(evt) {
+    var form = evt.target;
+    var action = evt.submitter ? evt.submitter.value : "";
+    var dryRun = form.elements["dryrun"] !== undefined && form.elements["dryrun"].checked;
+
+    if (form.elements["edit"] === undefined) {
+        var count = countSelected(form);
+        if (count == 0) {
+            alert("No objects selected");
+            return false;
+        }
+        if (action == "delete" && !dryRun) {
+            return confirm("Do you really want to delete " + count + " objects ?");
+        }
+    }
+    return true;
+}
@@ -0,0 +1,21 @@
+function  startedit() {
+    toedit = document.getElementById("toedit");
+    displayform = document.getElementById("displayform");
+    editform = document.getElementById("editform");
+    editctl = document.getElementById("contentOnEdit");
+
+    displayform.style.display = 'none';
+    editctl.value = toedit.textContent;
+    editform.style.display = '';
+}
+
+function deleteobj() {
+    if (confirm("Do you really want to delete the object ?")) {
+        toedit = document.getElementById("toedit");
+        edit = document.getElementById("contentOnDelete");
+        edit.value = toedit.textContent;
+
+        form = document.getElementById("deleteobj");
+        form.submit();
+    }
+}
@@ -0,0 +1,125 @@
+// keeps a live object list up to date with the changes from /wslist: rows that were added or changed arrive as
+// html, rows that were removed by their namespace and name. The data-key of a row is its sort key (ending with
+// the namespace and name), new rows are put in order by it.
+
+function compareKeys(left, right) {
+    for (var i = 0; i < left.length && i < right.length; i++) {
+        if (left[i] < right[i]) {
+            return -1;
+        }
+        if (left[i] > right[i]) {
+            return 1;
+        }
+    }
+    return left.length - right.length;
+}
+
+function rowId(key) {
+    return JSON.stringify(key.slice(key.length - 2));
+}
+
+function LiveList(body) {
+    this.body = body;
+    this.rows = {};
+    for (var i = 0; i < body.rows.length; i++) {
+        var row = body.rows[i];
+        if (row.dataset.key !== undefined) {
+            row.liveKey = JSON.parse(row.dataset.key);
+            this.rows[rowId(row.liveKey)] = row;
+        }
+    }
+}
+
+LiveList.prototype.compare = function(left, right) {
+    var ret = compareKeys(left, right);
+    return live_descending ? -ret : ret;
+};
+
+LiveList.prototype.remove = function(id) {
+    var row = this.rows[id];
+    if (row !== undefined) {
+        row.parentNode.removeChild(row);
+        delete this.rows[id];
+    }
+    return row;
+};
+
+LiveList.prototype.insert = function(row) {
+    // binary search over the rows of the table (the first one is the title row)
+    var rows = this.body.rows;
+    var low = 0;
+    var high = rows.length;
+    while (low < high) {
+        var middle = (low + high) >> 1;
+        if (rows[middle].liveKey === undefined || this.compare(rows[middle].liveKey, row.liveKey) < 0) {
+            low = middle + 1;
+        } else {
+            high = middle;
+        }
+    }
+    if (low == rows.length && !live_complete) {
+        // sorts after the last row: it is on a later page
+        return false;
+    }
+    this.body.insertBefore(row, low < rows.length ? rows[low] : null);
+    return true;
+};
+
+LiveList.prototype.update = function(message) {
+    for (var i = 0; i < message.removed.length; i++) {
+        this.remove(JSON.stringify(message.removed[i]));
+    }
+    var rows = document.createElement('tbody');
+    rows.innerHTML = message.rows;
+    while (rows.firstElementChild !== null) {
+        var row = rows.removeChild(rows.firstElementChild);
+        row.liveKey = JSON.parse(row.dataset.key);
+        var id = rowId(row.liveKey);
+        var old = this.remove(id);
+        if (old !== undefined) {
+            // the selection of the row stays
+            var oldBox = old.querySelector('input[name="obj"]');
+            var box = row.querySelector('input[name="obj"]');
+            if (oldBox !== null && box !== null) {
+                box.checked = oldBox.checked;
+            }
+        }
+        if (this.insert(row)) {
+            this.rows[id] = row;
+            row.classList.add('live-changed');
+        }
+    }
+};
+
+function followList() {
+    var status = document.getElementById('live_status');
+    var first = document.querySelector('tr[data-key]');
+    var list = first !== null ? new LiveList(first.parentNode) : null;
+    var wsProtocol = location.protocol === 'http:' ? 'ws' : 'wss';
+    var ws = new WebSocket(wsProtocol + '://' + location.host + live_url);
+
+    ws.onopen = function() {
+        status.textContent = ' (connected)';
+    };
+    ws.onmessage = function(evt) {
+        var message = JSON.parse(evt.data);
+        if (message.reload !== undefined || (list === null && message.rows !== "")) {
+            location.href = live_page_url;
+            return;
+        }
+        if (list !== null) {
+            var changed = document.querySelectorAll('tr.live-changed');
+            for (var i = 0; i < changed.length; i++) {
+                changed[i].classList.remove('live-changed');
+            }
+            list.update(message);
+        }
+    };
+    ws.onclose = function() {
+        status.textContent = ' (disconnected)';
+    };
+}
+
+window.addEventListener('load', function() {
+  followList();
+});
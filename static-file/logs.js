@@ -0,0 +1,37 @@
+// appends the output of /wslogs to the log view; keeps at most log_max_lines lines on the page.
+
+function followLog() {
+    var log = document.getElementById('log');
+    var wsProtocol = location.protocol === 'http:' ? 'ws' : 'wss';
+    var ws = new WebSocket(wsProtocol + '://' + location.host + log_url);
+    var lineCount = 0;
+
+    ws.onmessage = function(evt) {
+        var atBottom = (window.innerHeight + window.scrollY) >= document.body.scrollHeight - 10;
+        log.appendChild(document.createTextNode(evt.data));
+        lineCount += evt.data.split('\n').length - 1;
+
+        while (lineCount > log_max_lines && log.firstChild !== null) {
+            var text = log.firstChild.nodeValue;
+            var cut = text.indexOf('\n');
+            if (cut === -1 || cut === text.length - 1) {
+                log.removeChild(log.firstChild);
+            } else {
+                log.firstChild.nodeValue = text.substring(cut + 1);
+            }
+            if (cut !== -1) {
+                lineCount -= 1;
+            }
+        }
+        if (atBottom) {
+            window.scrollTo(0, document.body.scrollHeight);
+        }
+    };
+    ws.onclose = function() {
+        log.appendChild(document.createTextNode('\n-- log stream closed --\n'));
+    };
+}
+
+window.addEventListener('load', function() {
+  followLog();
+});
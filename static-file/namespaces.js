@@ -0,0 +1,78 @@
+// the namespace selector of the home page: filters the names of the namespaces while typing.
+// Enter opens the first match (or the typed name), an empty field opens all namespaces.
+
+var namespaceNames = [];
+var maxNamespaceMatches = 30;
+
+function findNamespaces(text) {
+    // names that start with the text come first, then the names that contain it.
+    var starts = [];
+    var contains = [];
+    for (var i = 0; i < namespaceNames.length && starts.length < maxNamespaceMatches; i++) {
+        var pos = namespaceNames[i].indexOf(text);
+        if (pos === 0) {
+            starts.push(namespaceNames[i]);
+        } else if (pos > 0 && contains.length < maxNamespaceMatches) {
+            contains.push(namespaceNames[i]);
+        }
+    }
+    return starts.concat(contains).slice(0, maxNamespaceMatches);
+}
+
+function showNamespaceMatches() {
+    var input = document.getElementById('namespace_filter');
+    var matches = document.getElementById('namespace_matches');
+    var names = findNamespaces(input.value.trim().toLowerCase());
+    matches.innerHTML = '';
+    for (var i = 0; i < names.length; i++) {
+        var link = document.createElement('a');
+        link.href = namespace_home_url + encodeURIComponent(names[i]);
+        link.textContent = names[i];
+        matches.appendChild(link);
+    }
+    matches.style.display = names.length > 0 ? 'block' : 'none';
+}
+
+function openNamespace() {
+    var text = document.getElementById('namespace_filter').value.trim();
+    if (text === '') {
+        window.location.href = namespace_home_url;
+        return;
+    }
+    var names = findNamespaces(text.toLowerCase());
+    if (namespaceNames.indexOf(text) === -1 && names.length > 0) {
+        text = names[0];
+    }
+    window.location.href = namespace_home_url + encodeURIComponent(text);
+}
+
+window.addEventListener('load', function() {
+    var input = document.getElementById('namespace_filter');
+    var matches = document.getElementById('namespace_matches');
+
+    fetch(namespace_names_url).then(function(response) {
+        return response.json();
+    }).then(function(names) {
+        namespaceNames = names;
+        if (document.activeElement === input) {
+            showNamespaceMatches();
+        }
+    });
+
+    input.addEventListener('input', showNamespaceMatches);
+    input.addEventListener('focus', function() {
+        input.select();
+        showNamespaceMatches();
+    });
+    input.addEventListener('blur', function() {
+        // after a click on a match
+        setTimeout(function() { matches.style.display = 'none'; }, 200);
+    });
+    input.addEventListener('keydown', function(evt) {
+        if (evt.key === 'Enter') {
+            openNamespace();
+        } else if (evt.key === 'Escape') {
+            matches.style.display = 'none';
+        }
+    });
+});
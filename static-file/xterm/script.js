@@ -71,7 +71,7 @@ function openTerminal() {
     term.write('Connecting...\r\n');
     
     var wsProtocol = location.protocol === 'http:' ? 'ws' : 'wss';
-    var endpoint = wsProtocol + '://' + location.host + '/wssh' + location.search;
+    var endpoint = wsProtocol + '://' + location.host + wssh_url + location.search;
     client.connect({
         ws: new WebSocket(endpoint),
         onError: function(error) {
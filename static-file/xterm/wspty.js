@@ -1,23 +1,35 @@
-
 function WsptyClient() {
     this._connection = null;
+    this._decoder = new TextDecoder('utf-8');
+    this._encoder = new TextEncoder();
+    this._unacknowledged = 0;
+    this._ackTimer = null;
 };
 
+// the server stops sending output when 1MB are not acknowledged; acknowledge in batches.
+WsptyClient.ACK_BYTES = 65536;
+WsptyClient.ACK_DELAY_MS = 50;
+
 WsptyClient.prototype.connect = function(options) {
+    var self = this;
     this._connection = options.ws;
+    // terminal output arrives in binary frames, errors in text frames.
+    this._connection.binaryType = 'arraybuffer';
 
     this._connection.onopen = function() {
         options.onConnect();
     };
 
     this._connection.onmessage = function(evt) {
-        var data = JSON.parse(evt.data);
-        if (data.error !== undefined) {
-            options.onError(data.error);
-        }
-        if (data.data !== undefined) {
-            options.onData(data.data);
+        if (typeof evt.data === 'string') {
+            var control = JSON.parse(evt.data);
+            if (control.error !== undefined) {
+                options.onError(control.error);
+            }
+            return;
         }
+        options.onData(self._decoder.decode(new Uint8Array(evt.data), {stream: true}));
+        self._acknowledge(evt.data.byteLength);
     };
 
     this._connection.onclose = function(evt) {
@@ -25,8 +37,29 @@ WsptyClient.prototype.connect = function(options) {
     };
 };
 
+WsptyClient.prototype._acknowledge = function(length) {
+    var self = this;
+    this._unacknowledged += length;
+    if (this._unacknowledged >= WsptyClient.ACK_BYTES) {
+        this._sendAck();
+    } else if (this._ackTimer === null) {
+        this._ackTimer = setTimeout(function() { self._sendAck(); }, WsptyClient.ACK_DELAY_MS);
+    }
+};
+
+WsptyClient.prototype._sendAck = function() {
+    if (this._ackTimer !== null) {
+        clearTimeout(this._ackTimer);
+        this._ackTimer = null;
+    }
+    if (this._unacknowledged > 0 && this._connection.readyState === WebSocket.OPEN) {
+        this._connection.send(JSON.stringify({ack: this._unacknowledged}));
+    }
+    this._unacknowledged = 0;
+};
+
 WsptyClient.prototype.send = function(data) {
-    this._connection.send(JSON.stringify({'data': data}));
+    this._connection.send(this._encoder.encode(data));
 };
 
 WsptyClient.prototype.resize = function(cols, rows) {
@@ -0,0 +1,71 @@
+# Fixtures of the smoke tests: s9k servers with the fake kubectl (fake/fake_kubectl.py), started once per test run.
+import html
+import os
+import re
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bench"))
+from bench_util import fake_kubectl_env, free_port, start_s9k  # pylint: disable=wrong-import-position
+
+NUM_PODS = 100
+
+
+class S9kServer:
+    def __init__(self, s9k_args, env, log_file):
+        self.port = free_port()
+        self.process, _ = start_s9k(self.port, env, s9k_args, log_file=log_file)
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.port, path)
+
+    def request(self, path, data=None, headers=None):
+        # returns the status, the headers and the body of the response
+        if data is not None:
+            data = urllib.parse.urlencode(data, doseq=True).encode("utf-8")
+        request = urllib.request.Request(self.url(path), data, headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.headers, response.read().decode("utf-8")
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read().decode("utf-8", "replace")
+
+    def stop(self):
+        self.process.kill()
+        self.process.wait()
+
+
+def get_rows(body):
+    # the cells of the rows of an object list (all cells link to the object), without the html
+    return [[html.unescape(cell) for cell in re.findall(r'<a href="[^"]*">([^<]*)</a>', row)] \
+            for row in re.findall(r'<tr[^>]*>(?:<td><input type="checkbox"[^>]*></td>)?<td><a href=.*?</tr>', body)]
+
+
+def get_link(body, title):
+    # the url of the first link with this title, None if there is none
+    match = re.search(r'<a href="([^"]*)">{}</a>'.format(re.escape(title)), body)
+    return html.unescape(match.group(1)) if match else None
+
+
+def start_server(request, tmp_path_factory, s9k_args, env):
+    server = S9kServer(s9k_args, env, str(tmp_path_factory.mktemp("s9k") / "s9k.log"))
+    request.addfinalizer(server.stop)
+    return server
+
+
+@pytest.fixture(scope="session")
+def server(request, tmp_path_factory):
+    # lists come from kubectl, page by page; the log screen has 3 pages of 20 lines
+    return start_server(request, tmp_path_factory, "--log-lines 20 --log-pages 3", fake_kubectl_env(NUM_PODS, 200))
+
+
+@pytest.fixture(scope="session")
+def cached_server(request, tmp_path_factory):
+    # lists come from the watch cache; a second context is served under /context/other
+    env = fake_kubectl_env(NUM_PODS, 200)
+    env["FAKE_KUBECTL_CONTEXTS"] = "fake,other"
+    return start_server(request, tmp_path_factory, "--watch-cache --contexts other", env)
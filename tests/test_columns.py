@@ -0,0 +1,146 @@
+# The columns of object lists, and lists parsed while kubectl writes them.
+import json
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import s9k  # pylint: disable=wrong-import-position
+
+FAKE_KUBECTL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fake", "fake_kubectl.py")
+
+RESOURCE_TITLES = ["NAME", "SHORTNAMES", "APIVERSION", "NAMESPACED", "KIND"]
+RESOURCES = [
+    ["deployments", "deploy", "apps/v1", "true", "Deployment"],
+    ["events", "ev", "v1", "true", "Event"],
+    ["events", "ev", "events.k8s.io/v1", "true", "Event"],
+    ["pods", "po", "v1", "true", "Pod"],
+    ["pods", "", "metrics.k8s.io/v1beta1", "true", "PodMetrics"],
+    ["widgets", "", "example.com/v2", "true", "Widget"],
+    ["gadgets", "", "example.com/v1", "false", "Gadget"],
+]
+
+WIDGET_CRD = {"spec": {"versions": [
+    {"name": "v1", "additionalPrinterColumns": [{"name": "Old", "type": "string", "jsonPath": ".spec.old"}]},
+    {"name": "v2", "additionalPrinterColumns": [
+        {"name": "Replicas", "type": "integer", "jsonPath": ".spec.replicas"},
+        {"name": "Ready", "type": "string", "jsonPath": '.status.conditions[?(@.type=="Ready")].status'},
+        {"name": "Image", "type": "string", "jsonPath": ".spec.containers[*].image", "priority": 1},
+        {"name": "Created", "type": "date", "jsonPath": ".metadata.creationTimestamp"}]}]}}
+GADGET_CRD = {"spec": {"versions": [{"name": "v1"}]}}
+
+WIDGET = {"metadata": {"name": "w1", "namespace": "ns-1", "labels": {"app": "w"},
+                       "creationTimestamp": "2024-01-01T00:00:00Z"},
+          "spec": {"replicas": 3, "containers": [{"image": "nginx"}, {"image": "envoy"}]},
+          "status": {"conditions": [{"type": "Synced", "status": "False"}, {"type": "Ready", "status": "True"}]}}
+
+
+class FakeBackend:
+    # answers the requests for the definitions of the custom resources
+    def __init__(self):
+        self.requests = []
+
+    def get_raw(self, path):
+        self.requests.append(path)
+        name = path.rsplit("/", 1)[1]
+        crds = {"widgets.example.com": WIDGET_CRD, "gadgets.example.com": GADGET_CRD}
+        if name not in crds:
+            return None, "NotFound"
+        return json.dumps(crds[name]), None
+
+
+def make_api_resources():
+    api_resources = s9k.ApiResources(types.SimpleNamespace(backend=FakeBackend(), url_prefix=""))
+    api_resources.set_resources(RESOURCE_TITLES, RESOURCES)
+    return api_resources
+
+
+def test_full_names():
+    api_resources = make_api_resources()
+    # the name alone is the core resource, not the one of another group with the same name
+    assert api_resources.get_api_path("pods") == "/api/v1/pods"
+    assert api_resources.get_api_path("pods.metrics.k8s.io") == "/apis/metrics.k8s.io/v1beta1/pods"
+    assert api_resources.get_api_path("events") == "/api/v1/events"
+    assert api_resources.get_api_path("events.events.k8s.io") == "/apis/events.k8s.io/v1/events"
+    assert api_resources.get_kind("pods") == ("v1", "Pod")
+    assert api_resources.get_resource_name("pod") == "pods"
+    assert api_resources.get_resource_name("podmetrics.metrics.k8s.io") == "pods.metrics.k8s.io"
+    assert api_resources.get_resource_name("deployment.apps") == "deployments"
+
+
+def test_built_in_columns():
+    api_resources = make_api_resources()
+    for oname in ("deployments", "deployments.apps"):
+        assert api_resources.get_list_columns(oname, False).titles[:3] == ["NAME", "READY", "UP-TO-DATE"]
+    assert api_resources.get_list_columns("pods", True).titles[:3] == ["NAMESPACE", "NAME", "READY"]
+    assert "MESSAGE" in api_resources.get_list_columns("events", False).titles
+    # types of other groups with the name of a core type don't get its columns
+    for oname in ("pods.metrics.k8s.io", "events.events.k8s.io"):
+        assert api_resources.get_list_columns(oname, False).titles == ["NAME", "AGE", "LABELS"]
+    assert api_resources.cluster.backend.requests[-1].endswith("/customresourcedefinitions/events.events.k8s.io")
+
+
+def test_printer_columns():
+    api_resources = make_api_resources()
+    columns = api_resources.get_list_columns("widgets", True)
+    assert columns.titles == ["NAMESPACE", "NAME", "REPLICAS", "READY", "IMAGE", "CREATED", "LABELS"]
+    line = columns.make_line(WIDGET)
+    assert line[:5] == ["ns-1", "w1", "3", "True", "nginx"]
+    assert line[5] == s9k.format_age("2024-01-01T00:00:00Z")
+    assert line[6] == "app=w"
+    assert columns.make_line({"metadata": {"name": "w2"}})[2:5] == ["<none>", "<none>", "<none>"]
+
+    # the definition is read once for each version of the api resources
+    assert api_resources.get_list_columns("widgets.example.com", True) is columns
+    assert len(api_resources.cluster.backend.requests) == 1
+
+    # without printer columns a custom resource shows its age
+    assert api_resources.get_list_columns("gadgets", False).titles == ["NAME", "AGE", "LABELS"]
+
+
+def test_json_path():
+    assert s9k.parse_json_path(".metadata.labels['app.kubernetes.io/name']") == \
+        [("field", "metadata"), ("field", "labels"), ("field", "app.kubernetes.io/name")]
+    assert s9k.parse_json_path("{.spec.items[-1]}") == [("field", "spec"), ("field", "items"), ("index", -1)]
+    assert s9k.parse_json_path(".spec[?(@.count>1)]") is None
+    steps = s9k.parse_json_path(".spec.containers[*].image")
+    assert list(s9k.select_json_path(WIDGET, steps)) == ["nginx", "envoy"]
+
+
+def test_stream_list_command():
+    columns = s9k.get_list_columns("pods", True)
+    object_list, error_message = s9k.KubectlBackend.run_list_command( \
+        "{} {} get pods -A -o json".format(sys.executable, FAKE_KUBECTL), columns)
+    assert error_message is None
+    assert len(object_list.items) == 100
+    assert object_list.items[0][:2] == ["ns-0", "app-5d9c8-000000"]
+
+    _, error_message = s9k.KubectlBackend.run_list_command( \
+        "{} {} get unknown -o json".format(sys.executable, FAKE_KUBECTL), columns)
+    assert "exit status" in error_message
+
+
+def test_stream_output_in_chunks():
+    chunks = []
+    script = "import sys; sys.stdout.write('x' * 1000000)"
+    run_command = s9k.RunCommand("{} -c \"{}\"".format(sys.executable, script), split_lines=False,
+                                 consume_output=chunks.append)
+    assert run_command.exit_code == 0
+    assert run_command.output == ""
+    assert len(chunks) > 1
+    assert b"".join(chunks) == b"x" * 1000000
+
+
+def test_stream_output_timeout():
+    timeout = s9k.params.default_command_timeout
+    s9k.params.default_command_timeout = 1
+    try:
+        chunks = []
+        script = "import sys, time; print('x', flush=True); time.sleep(30)"
+        run_command = s9k.RunCommand("{} -c \"{}\"".format(sys.executable, script), split_lines=False,
+                                     consume_output=chunks.append)
+    finally:
+        s9k.params.default_command_timeout = timeout
+    assert run_command.exit_code != 0
+    assert b"".join(chunks) == b"x\n"
+    assert b"timed out" in run_command.error_out
@@ -0,0 +1,193 @@
+# Smoke tests of the pages, against s9k with the fake kubectl: python3 -m pytest -q tests
+import re
+
+from conftest import NUM_PODS, get_link, get_rows
+
+PODS = "/objectinstances/pods/true/-None"
+POD_NAME = "app-5d9c8-000001"
+POD_NAMESPACE = "ns-1"
+
+
+def get_names(body):
+    # NAMESPACE and NAME are the first columns of a list of all namespaces
+    return [tuple(row[:2]) for row in get_rows(body)]
+
+
+def get_log_lines(body):
+    return [int(pos) for pos in re.findall(r"log line (\d+)", body)]
+
+
+def read_all_pages(server, path):
+    names = []
+    while path is not None:
+        status, _, body = server.request(path)
+        assert status == 200
+        names.extend(get_names(body))
+        path = get_link(body, "next page")
+    return names
+
+
+def test_home_page(server):
+    status, _, body = server.request("/")
+    assert status == 200
+    assert "pods" in body
+
+
+def test_list_pages_follow_continue_token(server):
+    status, _, body = server.request(PODS + "?limit=30")
+    assert status == 200
+    assert len(get_rows(body)) == 30
+    assert "continue=" in get_link(body, "next page")
+
+    names = read_all_pages(server, PODS + "?limit=30")
+    assert len(names) == NUM_PODS
+    assert len(set(names)) == NUM_PODS
+
+
+def test_cached_list_pages_follow_continue_token(cached_server):
+    names = read_all_pages(cached_server, PODS + "?limit=30")
+    assert len(names) == NUM_PODS
+    assert len(set(names)) == NUM_PODS
+
+
+def test_unpaged_list(server):
+    status, _, body = server.request(PODS + "?limit=0")
+    assert status == 200
+    assert len(get_rows(body)) == NUM_PODS
+    assert get_link(body, "next page") is None
+
+
+def test_namespace_list(server):
+    status, _, body = server.request("/objectinstances/pods/true/{}?limit=0".format(POD_NAMESPACE))
+    assert status == 200
+    rows = get_rows(body)
+    assert len(rows) == NUM_PODS // 10
+    assert all(row[0].startswith("app-") for row in rows)
+
+
+def test_cached_list_etag(cached_server):
+    status, headers, _ = cached_server.request(PODS)
+    assert status == 200
+    etag = headers["ETag"]
+    assert etag
+
+    status, _, body = cached_server.request(PODS, headers={"If-None-Match": etag})
+    assert status == 304
+    assert body == ""
+
+    status, _, _ = cached_server.request(PODS + "?limit=10", headers={"If-None-Match": etag})
+    assert status == 200
+
+
+def test_compressed_list(cached_server):
+    status, headers, _ = cached_server.request(PODS + "?limit=0", headers={"Accept-Encoding": "identity"})
+    assert status == 200
+    assert "Content-Encoding" not in headers
+
+
+def test_label_selector(cached_server):
+    status, _, body = cached_server.request(PODS + "?limit=0&labelsel=pod-pos%3D7")
+    assert status == 200
+    assert [name for _, name in get_names(body)] == ["app-5d9c8-000007"]
+
+
+def test_invalid_label_selector(cached_server):
+    status, _, body = cached_server.request(PODS + "?labelsel=app+in+%28")
+    assert status == 200
+    assert "invalid label selector" in body
+    assert get_rows(body) == []
+
+
+def test_object_detail(server):
+    for screen in ("get-yaml", "get-json", "describe"):
+        status, _, body = server.request("/objectinfo/{}/pods/{}/{}/true/-None".format(screen, POD_NAME, POD_NAMESPACE))
+        assert status == 200, screen
+        assert POD_NAME in body
+
+
+def test_cached_object_detail_source(cached_server):
+    # the source of an object from the watch cache is the command, like for a fetched one
+    path = "/objectinfo/get-yaml/pods/{}/{}/true/-None".format(POD_NAME, POD_NAMESPACE)
+    status, _, body = cached_server.request(path)
+    assert status == 200
+    assert re.search(r"get pods {} -n {}".format(POD_NAME, POD_NAMESPACE), body)
+
+
+def test_log_page(server):
+    path = "/objectinfo/logs/pods/{}/{}/true/-None".format(POD_NAME, POD_NAMESPACE)
+    status, _, body = server.request(path)
+    assert status == 200
+    assert "log line" in body
+    assert get_log_lines(body) == list(range(180, 200))
+    assert get_link(body, "older") is not None
+
+    status, _, body = server.request(path + "?page=1")
+    assert get_log_lines(body) == list(range(160, 180))
+
+    for page in ("x", "-1"):
+        status, _, body = server.request(path + "?page=" + page)
+        assert status == 200, page
+        assert get_log_lines(body) == list(range(180, 200))
+
+
+def test_log_page_limit(server):
+    # the pages go back --log-pages pages, a page further back shows the last one
+    path = "/objectinfo/logs/pods/{}/{}/true/-None".format(POD_NAME, POD_NAMESPACE)
+    for page in ("2", "1000000"):
+        status, _, body = server.request(path + "?page=" + page)
+        assert status == 200
+        assert get_log_lines(body) == list(range(140, 160))
+        assert get_link(body, "older") is None
+        assert get_link(body, "newer") is not None
+
+
+def test_pod_logs_regex(server):
+    status, _, body = server.request("/podlogs/{}?labelsel=app%3Dapp&regex=log+line+199%24".format(POD_NAMESPACE))
+    assert status == 200
+    lines = re.findall(r"app-5d9c8-\d+ (log line \d+)", body)
+    assert len(lines) == NUM_PODS // 10
+    assert set(lines) == {"log line 199"}
+
+
+def test_pod_logs_invalid_regex(server):
+    status, _, body = server.request("/podlogs/{}?labelsel=app%3Dapp&regex=%28".format(POD_NAMESPACE))
+    assert status == 200
+    assert "regular expression" in body
+    assert "log line" not in body
+
+
+def test_bulk_delete_dry_run(server):
+    objects = ["{}/{}".format(POD_NAMESPACE, POD_NAME), "ns-2/app-5d9c8-000002"]
+    status, _, body = server.request("/bulk/pods", {"action": "delete", "dryrun": "1", "namespaced": "true",
+                                                    "current_ns": "-None", "obj": objects})
+    assert status == 200
+    assert len(re.findall(r"<td>pod/app-5d9c8-\d+</td><td>deleted \(server dry run\)</td>", body)) == 2
+    assert "2 objects deleted (server dry run), 0 failed" in body
+
+
+def test_bulk_unknown_action(server):
+    status, _, _ = server.request("/bulk/pods", {"action": "restart", "obj": "{}/{}".format(POD_NAMESPACE, POD_NAME)})
+    assert status == 400
+
+
+def test_context_routes(cached_server):
+    for path in ("/context/other/", "/context/other/-None", "/context/other/" + POD_NAMESPACE,
+                 "/context/other" + PODS):
+        status, _, _ = cached_server.request(path)
+        assert status == 200, path
+
+    status, _, body = cached_server.request("/context/other" + PODS + "?limit=10")
+    assert "/context/other/objectinfo/get-yaml/pods/" in body
+
+    for path in ("/context/other/favicon.ico", "/context/other/ns_1", "/context/unknown/"):
+        status, _, _ = cached_server.request(path)
+        assert status == 404, path
+
+
+def test_static_file(server):
+    status, headers, _ = server.request("/static-file/css.css")
+    assert status == 200
+    status, _, _ = server.request("/static-file/css.css", headers={"If-None-Match": headers["ETag"]})
+    assert status == 304
+    status, _, _ = server.request("/static-file/missing.css")
+    assert status == 404
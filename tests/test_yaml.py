@@ -0,0 +1,50 @@
+# The yaml text of the get-yaml page is saved with kubectl apply: it has to read back as the same object.
+import os
+import sys
+
+import pytest
+
+yaml = pytest.importorskip("yaml")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import s9k  # pylint: disable=wrong-import-position
+
+# strings that a yaml 1.1 parser reads as another type, or changes, if they are not quoted
+STRINGS = [
+    "", " ", "plain", "with space", "path/to/file", "_underscore", "a=b", "user@host", "x:y", "http://host:80/path",
+    ".5", ".inf", ".Inf", "-.inf", ".NaN", ".nan", "1", "-1", "+1", "1.0", "1e3", "12E-3", "0x1F", "0o17", "017",
+    "0b101", "1_000", "190:20:30", "1:20", "2024-01-01", "2024-01-01T00:00:00Z", "2024-01-01 10:00:00 +01:00",
+    "yes", "No", "ON", "off", "y", "N", "true", "False", "null", "Null", "~", "=", "<<", "a: b", "a:", "a #b", "#a",
+    "*ref", "&anchor", "!tag", "%directive", "@at", "`tick", "[a]", "{a}", "- a", "? a", "|", ">", "'quoted'",
+    '"double"', " leading", "trailing ", "tab\there", "ümlaut", "a\nb", "a\nb\n", "a\n b\n", "\n  x\n", "\n\nx\n",
+    "\n", "\n\n", "x\n\n", "  indented\nblock\n", "line \ntrailing space\n", "crlf\r\n", "last line", "a\n\nb\n",
+    "\tx\ny\n", "a\n\tb\n", "x\n \n", "#c\nd\n", "- a\nb\n",
+]
+
+
+def read_back(obj):
+    return yaml.safe_load(s9k.format_yaml(obj))
+
+
+@pytest.mark.parametrize("value", STRINGS)
+def test_string_values(value):
+    obj = {"data": {"value": value}, "list": [value, {"key": value}]}
+    assert read_back(obj) == obj
+
+
+@pytest.mark.parametrize("value", STRINGS)
+def test_string_keys(value):
+    obj = {"data": {value: "value"}}
+    assert read_back(obj) == obj
+
+
+def test_other_values():
+    obj = {"int": 1, "negative": -3, "float": 0.5, "large": 1e300, "true": True, "false": False, "none": None,
+           "empty_dict": {}, "empty_list": [], "nested": [[1, 2], [], [{"a": [{}]}]],
+           "items": [{"name": "a", "ports": [{"port": 80}]}, {"name": "b"}]}
+    assert read_back(obj) == obj
+
+
+def test_top_level_values():
+    for obj in ("text", ".5", 1, None, [], {}):
+        assert read_back(obj) == obj